@@ -9,6 +9,8 @@ import aws_cdk.aws_rds as rds
 import aws_cdk.aws_ec2 as ec2
 import aws_cdk.aws_lambda as lambda_
 import aws_cdk.aws_apigateway as apigw
+import aws_cdk.aws_iam as iam
+import aws_cdk.aws_secretsmanager as secretsmanager
 
 class AgentSqlStack(Stack):
 
@@ -95,6 +97,16 @@ class AgentSqlStack(Stack):
             debug_logging=False
         )
 
+        # Key signing the pagination cursors, shared by every instance of the Lambda function
+        cursor_secret = secretsmanager.Secret(
+            self,
+            "PaginationCursorSecret",
+            generate_secret_string=secretsmanager.SecretStringGenerator(
+                exclude_punctuation=True,
+                password_length=64
+            )
+        )
+
         # Lambda function for MCP server
         mcp_lambda = lambda_.DockerImageFunction(
             self,
@@ -108,6 +120,10 @@ class AgentSqlStack(Stack):
                 "AURORA_CLUSTER_ARN": cluster.cluster_arn,
                 "AURORA_SECRET_ARN": cluster.secret.secret_arn,
                 "DATABASE_NAME": "postgres",
+                # Set DB_BACKEND to "postgres" to query through the RDS proxy instead of the Data API
+                "DB_BACKEND": "data_api",
+                "DB_PROXY_ENDPOINT": proxy.endpoint,
+                "PAGINATION_CURSOR_SECRET": cursor_secret.secret_value.unsafe_unwrap(),
             },
             vpc=vpc,
             vpc_subnets=ec2.SubnetSelection(
@@ -117,6 +133,14 @@ class AgentSqlStack(Stack):
         )
 
         cluster.grant_data_api_access(mcp_lambda)
+        # The postgres backend reads the database credentials from the cluster secret
+        cluster.secret.grant_read(mcp_lambda)
+        # SQL generation streams the completion (InvokeModelWithResponseStream) and falls back to
+        # InvokeModel when streaming isn't allowed
+        mcp_lambda.add_to_role_policy(iam.PolicyStatement(
+            actions=["bedrock:InvokeModel", "bedrock:InvokeModelWithResponseStream"],
+            resources=[f"arn:{self.partition}:bedrock:*::foundation-model/anthropic.*"]
+        ))
 
         # API gateway for MCP server
         api = apigw.RestApi(
@@ -1,16 +1,24 @@
 import logging
 import uvicorn
-import json
 from datetime import datetime
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
 from mcp_server import (
     query_sql_agent, 
     execute_sql_query, 
-    generate_sql_query
+    execute_sql_batch,
+    fetch_next_page,
+    generate_sql_query,
+    invalidate_cached_tables,
+    metrics,
+    serialize_result,
+    set_request_deadline
 )
+from serialization import dumps_bytes
+from tracing import start_trace
 
 logging.basicConfig(
     level=logging.INFO,
@@ -32,7 +40,9 @@ app.add_middleware(
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    # Lets browser clients read the request ID and the timings of a tool call
+    expose_headers=["X-Request-Id", "Server-Timing"]
 )
 
 # Model for MCP tool call request
@@ -49,6 +59,10 @@ class PromptCall(BaseModel):
     method: str
     params: dict
 
+# Model for a query cache invalidation request
+class CacheInvalidation(BaseModel):
+    tables: list[str]
+
 # Root endpoint for the MCP server
 @app.get("/")
 async def root():
@@ -59,6 +73,8 @@ async def root():
         "endpoints": [
             "GET /",
             "GET /health",
+            "GET /metrics",
+            "POST /cache/invalidate",
             "POST /tools/list",
             "POST /tools/call",
             "POST /prompts/list",
@@ -66,7 +82,9 @@ async def root():
         ],
         "mcp_tools": [
             "query_sql_agent",
-            "execute_sql_query"
+            "execute_sql_query",
+            "execute_sql_batch",
+            "fetch_next_page"
         ],
         "mcp_prompts": [
             "generate_sql_query"
@@ -83,6 +101,16 @@ async def health_check():
         "timestamp": datetime.now().isoformat()
     }
 
+# Metrics of the tool calls in the Prometheus text format
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Drops the cached query results that read from the given tables (call it after writing to them)
+@app.post("/cache/invalidate")
+async def invalidate_cache(request: CacheInvalidation):
+    return invalidate_cached_tables(request.tables)
+
 # List all MCP tools available
 @app.post("/tools/list")
 async def list_tools():
@@ -117,21 +145,95 @@ async def list_tools():
                         "user_query": {
                             "type": "string",
                             "description": "Original user query for context"
+                        },
+                        "use_cache": {
+                            "type": "boolean",
+                            "description": "Set to false to bypass the query result cache (default: true)"
+                        },
+                        "page_size": {
+                            "type": "integer",
+                            "description": "Number of rows per page; returns a next_cursor for fetch_next_page (default: 0, no pagination)"
+                        },
+                        "page_key": {
+                            "type": "string",
+                            "description": "Comma separated column(s) that uniquely identify a row, used for keyset pagination (e.g., id)"
+                        },
+                        "format": {
+                            "type": "string",
+                            "enum": ["json", "columns"],
+                            "description": "Row encoding: json (objects keyed by column, default) or columns (compact arrays of values)"
                         }
                     },
                     "required": ["sql_query", "user_query"]
                 }
+            },
+            {
+                "name": "execute_sql_batch",
+                "description": "Execute several independent SQL queries on the database at once and return all of their results.",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "sql_queries": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "SQL queries to execute, results are returned in the same order"
+                        },
+                        "user_query": {
+                            "type": "string",
+                            "description": "Original user query for context"
+                        },
+                        "use_cache": {
+                            "type": "boolean",
+                            "description": "Set to false to bypass the query result cache (default: true)"
+                        },
+                        "format": {
+                            "type": "string",
+                            "enum": ["json", "columns"],
+                            "description": "Row encoding: json (objects keyed by column, default) or columns (compact arrays of values)"
+                        }
+                    },
+                    "required": ["sql_queries", "user_query"]
+                }
+            },
+            {
+                "name": "fetch_next_page",
+                "description": "Fetch the next page of results of a paginated SQL query.",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "cursor": {
+                            "type": "string",
+                            "description": "The next_cursor value from the previous page"
+                        },
+                        "user_query": {
+                            "type": "string",
+                            "description": "Original user query for context"
+                        }
+                    },
+                    "required": ["cursor"]
+                }
             }
         ]
     }
 
-# Call a specific MCP tool by name and matching arguments
+# Call a specific MCP tool by name and matching arguments. Each call is traced under a request ID
+# (the client's X-Request-Id, or the Lambda request ID): the time spent in each stage comes back in
+# the Server-Timing header, and in a "timings" block of the result when params has "timings": true
 @app.post("/tools/call")
-async def call_tool(request: ToolCall):
+async def call_tool(request: ToolCall, http_request: Request):
+    lambda_context = http_request.scope.get("aws.context")
+    trace = start_trace(
+        request_id=http_request.headers.get("x-request-id") or getattr(lambda_context, "aws_request_id", None),
+        trace_id=http_request.headers.get("x-amzn-trace-id")
+    )
     try:
+        # On Lambda (Mangum), database work stops before the invocation times out
+        if lambda_context is not None:
+            set_request_deadline(lambda_context.get_remaining_time_in_millis() / 1000)
+
         tool_name = request.params.get("name")
         tool_args = request.params.get("arguments", {})
-        logger.info(f"Calling tool: {tool_name} with args: {tool_args}")
+        logger.info(f"[{trace.request_id}] Calling tool: {tool_name} with args: {tool_args}")
         
         # Directly run the MCP tool functions here
         if tool_name == "query_sql_agent":
@@ -139,34 +241,55 @@ async def call_tool(request: ToolCall):
         elif tool_name == "execute_sql_query":
             result = await execute_sql_query(
                 sql_query=tool_args.get("sql_query", ""),
+                user_query=tool_args.get("user_query", ""),
+                use_cache=tool_args.get("use_cache", True),
+                page_size=tool_args.get("page_size", 0),
+                page_key=tool_args.get("page_key", ""),
+                format=tool_args.get("format", "json")
+            )
+        elif tool_name == "execute_sql_batch":
+            result = await execute_sql_batch(
+                sql_queries=tool_args.get("sql_queries", []),
+                user_query=tool_args.get("user_query", ""),
+                use_cache=tool_args.get("use_cache", True),
+                format=tool_args.get("format", "json")
+            )
+        elif tool_name == "fetch_next_page":
+            result = await fetch_next_page(
+                cursor=tool_args.get("cursor", ""),
                 user_query=tool_args.get("user_query", "")
             )
         else:
-            return {
+            return JSONResponse({
                 "jsonrpc": "2.0",
                 "id": request.id,
                 "error": {
                     "code": -32601,
                     "message": f"Unknown tool: {tool_name}"
                 }
-            }
-        
-        # Return the result of the MCP tool call
-        return {
+            }, headers=trace.headers())
+
+        # The timings block is built before the result is serialized, so only the header has that span
+        if request.params.get("timings"):
+            result = dict(result, timings=trace.timings())
+
+        # Return the result of the MCP tool call (serialized once, here)
+        content = serialize_result(tool_name, {
             "jsonrpc": "2.0",
             "id": request.id,
-            "result": json.loads(result) if isinstance(result, str) else result
-        }
+            "result": result
+        }, dumps_bytes)
+        return Response(content=content, media_type="application/json", headers=trace.headers())
     except Exception as error:
-        logger.error(f"Error calling tool: {str(error)}")
-        return {
+        logger.error(f"[{trace.request_id}] Error calling tool: {str(error)}")
+        return JSONResponse({
             "jsonrpc": "2.0",
             "id": request.id,
             "error": {
                 "code": -32603,
                 "message": f"Internal server error: {str(error)}"
             }
-        }
+        }, headers=trace.headers())
 
 # List all MCP prompts available
 @app.post("/prompts/list")
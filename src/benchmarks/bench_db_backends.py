@@ -0,0 +1,97 @@
+import argparse
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from data_api_emulator import DataAPIEmulator
+from rds_client import RDSClient
+from pg_backend import PostgresBackend
+
+# Small queries that don't need any table (so they run on any PostgreSQL database), then a larger result
+DEFAULT_QUERIES = [
+    "SELECT 1 AS test",
+    "SELECT g AS id, md5(g::text) AS subject, now() AS created_at FROM generate_series(1, 20) g",
+    "SELECT g AS id, md5(g::text) AS subject, now() AS created_at FROM generate_series(1, 5000) g"
+]
+
+# Builds the clients of the backends that are configured (Data API: AURORA_CLUSTER_ARN and
+# AURORA_SECRET_ARN, postgres: --dsn / DATABASE_URL or DB_PROXY_ENDPOINT and AURORA_SECRET_ARN,
+# emulator: the Data API code path against the local emulator on --dsn, with the given latency per call)
+def build_clients(backends: list, dsn: str, emulator_latency: float = 0.0) -> dict:
+    cluster_arn = os.getenv("AURORA_CLUSTER_ARN")
+    secret_arn = os.getenv("AURORA_SECRET_ARN")
+    db_name = os.getenv("DATABASE_NAME", "postgres")
+
+    clients = {}
+    for name in backends:
+        if name == "data_api":
+            if not cluster_arn or not secret_arn:
+                print("skipping data_api: AURORA_CLUSTER_ARN and AURORA_SECRET_ARN are not set")
+                continue
+            clients[name] = RDSClient(cluster_arn=cluster_arn, secret_arn=secret_arn, db_name=db_name)
+        elif name == "postgres":
+            proxy_endpoint = os.getenv("DB_PROXY_ENDPOINT")
+            if not dsn and not (proxy_endpoint and secret_arn):
+                print("skipping postgres: pass --dsn (or set DATABASE_URL, or DB_PROXY_ENDPOINT and AURORA_SECRET_ARN)")
+                continue
+            backend = PostgresBackend(host=proxy_endpoint, db_name=db_name, secret_arn=secret_arn, dsn=dsn)
+            clients[name] = RDSClient(cluster_arn=cluster_arn, secret_arn=secret_arn, db_name=db_name, backend=backend)
+        elif name == "emulator":
+            if not dsn:
+                print("skipping emulator: pass --dsn (the emulator runs the queries on PostgreSQL)")
+                continue
+            emulator = DataAPIEmulator(dsn=dsn, schema_path=None, latency=emulator_latency)
+            clients[name] = RDSClient(cluster_arn="emulator", secret_arn="emulator", db_name=db_name, client=emulator)
+        else:
+            raise ValueError(f"Unknown backend: {name}")
+    return clients
+
+# Runs the query repeatedly and returns the latencies in seconds (sorted)
+def time_query(client: RDSClient, sql_query: str, runs: int, max_rows: int, max_bytes: int) -> list:
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = client.execute_query(sql_query, max_rows=max_rows, max_bytes=max_bytes)
+        latencies.append(time.perf_counter() - start)
+        if not result["success"]:
+            raise RuntimeError(result["error"])
+    return sorted(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the per-query latency of the Data API and PostgreSQL backends")
+    parser.add_argument("--backends", nargs="+", default=["data_api", "postgres"], help="Backends to measure (data_api, postgres, emulator)")
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="PostgreSQL connection string (e.g. a local database)")
+    parser.add_argument("--queries", nargs="+", default=DEFAULT_QUERIES, help="SQL queries to run")
+    parser.add_argument("--emulator-latency", type=float, default=0.0, help="Seconds each emulated Data API call takes")
+    parser.add_argument("--runs", type=int, default=30, help="Runs per query (after one warm-up run)")
+    parser.add_argument("--max-rows", type=int, default=1000, help="Row budget of each query (0 for no limit)")
+    parser.add_argument("--max-bytes", type=int, default=1024 * 1024, help="Byte budget of each query (0 for no limit)")
+    args = parser.parse_args()
+
+    clients = build_clients(args.backends, args.dsn, args.emulator_latency)
+    if not clients:
+        sys.exit("No backend configured")
+
+    print(f"{'backend':<10} {'first ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}  query")
+    for sql_query in args.queries:
+        for name, client in clients.items():
+            # The first run includes the connection (or HTTPS session) setup of a cold start
+            first = time_query(client, sql_query, 1, args.max_rows, args.max_bytes)[0]
+            latencies = time_query(client, sql_query, args.runs, args.max_rows, args.max_bytes)
+            p50 = latencies[len(latencies) // 2]
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            mean = sum(latencies) / len(latencies)
+            print(
+                f"{name:<10} {first * 1000:>9.1f} {p50 * 1000:>8.1f} {p95 * 1000:>8.1f} {mean * 1000:>8.1f}  "
+                f"{sql_query[:60]}"
+            )
+
+    for client in clients.values():
+        client.backend.close()
+
+if __name__ == "__main__":
+    main()
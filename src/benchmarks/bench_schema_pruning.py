@@ -0,0 +1,58 @@
+import argparse
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from prompt import DATABASE_SCHEMA, build_prompt_prefix, create_query_prompt
+from schema_index import SchemaIndex
+
+# Questions shaped like the few-shot examples of the prompt
+DEFAULT_QUESTIONS = [
+    "Show all open tickets along with their subject, priority, and status name.",
+    "List all messages sent via email that are public and were created in the last 7 days.",
+    "Find the number of tickets created per category for organization ID 101.",
+    "Get the latest message for each ticket, along with the ticket subject.",
+    "Retrieve unresolved high-priority tickets assigned to an agent, sorted by due date.",
+    "Which message types are used the most?"
+]
+
+# Returns the size of the full prompt built with the given schema, in bytes and estimated tokens
+def prompt_size(schema: str, user_query: str) -> tuple[int, int]:
+    text = build_prompt_prefix(schema) + create_query_prompt(user_query)
+    return len(text.encode("utf-8")), len(text) // 4
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the prompt size reduction of schema pruning")
+    parser.add_argument("--schema", help="Path of a schema.sql file (default: the bundled schema)")
+    parser.add_argument("--questions", nargs="+", default=DEFAULT_QUESTIONS, help="User questions to measure")
+    args = parser.parse_args()
+
+    schema = DATABASE_SCHEMA
+    if args.schema:
+        with open(args.schema, "r") as file:
+            schema = file.read()
+
+    start = time.perf_counter()
+    index = SchemaIndex(schema)
+    print(f"indexed {len(index.tables)} tables ({len(schema)} bytes) in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(f"{'full bytes':>10} {'pruned':>8} {'tokens':>7} {'saved':>6}  tables")
+
+    total_full = total_pruned = 0
+    for question in args.questions:
+        full_bytes, _ = prompt_size(schema, question)
+        tables = index.relevant_tables(question)
+        pruned_bytes, pruned_tokens = prompt_size(index.prune(question), question)
+        total_full += full_bytes
+        total_pruned += pruned_bytes
+        print(
+            f"{full_bytes:>10} {pruned_bytes:>8} {pruned_tokens:>7} {1 - pruned_bytes / full_bytes:>6.0%}  "
+            f"{', '.join(tables) or '(all)'}"
+        )
+    print(f"average prompt size reduction: {1 - total_pruned / total_full:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from serialization import JSON_BACKEND, dumps_bytes
+
+try:
+    from fastapi.encoders import jsonable_encoder
+except ImportError:
+    jsonable_encoder = None
+
+DEFAULT_ROWS = [100, 1000, 5000]
+
+# Builds an execute_sql_query response with rows shaped like the tickets table
+def build_response(rows: int) -> dict:
+    data = [
+        {
+            "id": i,
+            "ticket_number": f"TCK-{100000 + i}",
+            "subject": f"Customer cannot log in after password reset #{i}",
+            "status": ("open", "pending", "resolved")[i % 3],
+            "priority": ("low", "medium", "high", "urgent")[i % 4],
+            "category": "account",
+            "created_at": f"2024-05-{1 + i % 28:02d} 10:{i % 60:02d}:00",
+            "resolved_at": None if i % 3 else f"2024-06-{1 + i % 28:02d} 12:00:00",
+            "sort_order": i % 5,
+            "is_escalated": i % 7 == 0,
+            "satisfaction": round((i % 50) / 10, 1),
+            "assignee": f"agent{i % 25}@example.com"
+        }
+        for i in range(rows)
+    ]
+    return {
+        "success": True,
+        "user_query": "Show me all open tickets",
+        "generated_sql": "SELECT * FROM tickets",
+        "validation_passed": True,
+        "data": data,
+        "columns": list(data[0].keys()) if data else [],
+        "row_count": rows,
+        "total_row_count": rows,
+        "truncated": False,
+        "cache": "miss"
+    }
+
+# Previous pipeline: the tool dumps its result, the adapter loads it back, FastAPI encodes the
+# JSON-RPC response again and the Lambda handler dumps the whole response once more to log it
+def legacy_pipeline(response: dict) -> bytes:
+    tool_output = json.dumps(response, indent=2, default=str)
+    payload = {"jsonrpc": "2.0", "id": 1, "result": json.loads(tool_output)}
+    if jsonable_encoder is not None:
+        payload = jsonable_encoder(payload)
+    body = json.dumps(payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"))
+    json.dumps({"statusCode": 200, "headers": {"content-type": "application/json"}, "body": body})
+    return body.encode("utf-8")
+
+# Current pipeline: the result is serialized once by the adapter
+def single_pass_pipeline(response: dict) -> bytes:
+    return dumps_bytes({"jsonrpc": "2.0", "id": 1, "result": response})
+
+# Same as single_pass_pipeline, always with the standard library backend
+def single_pass_stdlib_pipeline(response: dict) -> bytes:
+    payload = {"jsonrpc": "2.0", "id": 1, "result": response}
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+# Runs the pipeline repeatedly and returns the best CPU time per call in seconds
+def time_pipeline(pipeline, response: dict, min_seconds: float) -> float:
+    best = float("inf")
+    elapsed = 0.0
+    runs = 0
+    while elapsed < min_seconds or runs < 3:
+        start = time.process_time()
+        pipeline(response)
+        duration = time.process_time() - start
+        best = min(best, duration)
+        elapsed += duration
+        runs += 1
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CPU cost of serializing tool results")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="Result sizes in rows")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="Minimum time spent per measurement")
+    args = parser.parse_args()
+
+    pipelines = [("legacy", legacy_pipeline), ("stdlib", single_pass_stdlib_pipeline)]
+    if JSON_BACKEND != "json":
+        pipelines.append((JSON_BACKEND, single_pass_pipeline))
+
+    header = f"{'rows':>6} {'MB':>7}" + "".join(f" {name + ' ms/MB':>14}" for name, _ in pipelines)
+    header += f" {'saved ms/MB':>12}"
+    print(header)
+
+    for rows in args.rows:
+        response = build_response(rows)
+        megabytes = len(single_pass_pipeline(response)) / 1e6
+
+        costs = [time_pipeline(pipeline, response, args.min_seconds) * 1000 / megabytes for _, pipeline in pipelines]
+        line = f"{rows:>6} {megabytes:>7.2f}" + "".join(f" {cost:>14.2f}" for cost in costs)
+        line += f" {costs[0] - costs[-1]:>12.2f}"
+        print(line)
+
+if __name__ == "__main__":
+    main()
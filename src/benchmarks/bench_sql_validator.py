@@ -0,0 +1,101 @@
+import argparse
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from sql_validator import validate_sql
+
+# The old sqlparse validator lives with the tests, which compare the lexer with it
+try:
+    import sqlparse.exceptions
+    from tests.legacy_validator import legacy_validate_sql
+except ImportError:
+    sqlparse = None
+
+DEFAULT_SIZES = [1024, 10 * 1024, 100 * 1024]
+
+# Builds a SELECT with a large IN list, the typical shape of LLM generated lookups
+def build_in_list_query(target_bytes: int) -> str:
+    head = "SELECT t.id, t.ticket_number, t.subject FROM tickets t WHERE t.id IN ("
+    tail = ") ORDER BY t.created_at DESC;"
+    values = []
+    size = len(head) + len(tail)
+    i = 0
+    while size < target_bytes:
+        value = str(100000 + i)
+        values.append(value)
+        size += len(value) + 2
+        i += 1
+    return head + ", ".join(values) + tail
+
+# Builds an analytic query with many CTEs, joins, string literals and comments
+def build_cte_query(target_bytes: int) -> str:
+    ctes = []
+    size = 0
+    i = 0
+    while size < target_bytes:
+        cte = (
+            f"c{i} AS (\n"
+            f"    -- per-status counts for bucket {i}\n"
+            f"    SELECT s.name AS status, COUNT(*) AS total, AVG(EXTRACT(EPOCH FROM t.resolved_at - t.created_at)) AS secs\n"
+            f"    FROM tickets t\n"
+            f"    JOIN ticket_statuses s ON s.id = t.status_id\n"
+            f"    LEFT JOIN ticket_priorities p ON p.id = t.priority_id\n"
+            f"    WHERE t.subject ILIKE '%bucket {i}%' AND p.sort_order <= {i % 5}\n"
+            f"    GROUP BY s.name\n"
+            f")"
+        )
+        ctes.append(cte)
+        size += len(cte) + 2
+        i += 1
+    return "WITH " + ",\n".join(ctes) + "\nSELECT * FROM c0 ORDER BY total DESC LIMIT 100;"
+
+# Runs the validator repeatedly and returns the best time per call in seconds
+def time_validator(validator, sql_query: str, min_seconds: float) -> float:
+    best = float("inf")
+    elapsed = 0.0
+    runs = 0
+    while elapsed < min_seconds or runs < 3:
+        start = time.perf_counter()
+        validator(sql_query)
+        duration = time.perf_counter() - start
+        best = min(best, duration)
+        elapsed += duration
+        runs += 1
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQL validation throughput")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Query sizes in bytes")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="Minimum time spent per measurement")
+    parser.add_argument("--no-legacy", action="store_true", help="Skip the sqlparse baseline")
+    args = parser.parse_args()
+
+    run_legacy = sqlparse is not None and not args.no_legacy
+    header = f"{'query':<10} {'bytes':>8} {'ms/query':>10} {'MB/s':>8}"
+    if run_legacy:
+        header += f" {'legacy ms':>10} {'speedup':>8}"
+    print(header)
+
+    for name, builder in (("in_list", build_in_list_query), ("cte", build_cte_query)):
+        for size in args.sizes:
+            sql_query = builder(size)
+            assert validate_sql(sql_query) == (True, None), f"{name} query should be valid"
+
+            seconds = time_validator(validate_sql, sql_query, args.min_seconds)
+            line = f"{name:<10} {len(sql_query):>8} {seconds * 1000:>10.3f} {len(sql_query) / seconds / 1e6:>8.1f}"
+            if run_legacy:
+                try:
+                    legacy_seconds = time_validator(legacy_validate_sql, sql_query, args.min_seconds)
+                    line += f" {legacy_seconds * 1000:>10.3f} {legacy_seconds / seconds:>7.1f}x"
+                except sqlparse.exceptions.SQLParseError as e:
+                    # sqlparse refuses statements with too many tokens, which used to reject the query
+                    line += f" {'error':>10}  ({e})"
+            print(line)
+
+if __name__ == "__main__":
+    main()
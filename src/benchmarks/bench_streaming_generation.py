@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from sql_agent import SQLAgent
+
+# Completion shaped like the prompt's examples: a short preamble, the SQL statement, then an explanation
+DEFAULT_COMPLETION = (
+    "Here is the SQL query that answers the question:\n\n"
+    "<sql_statement>\n"
+    "SELECT t.id, t.subject, tp.name AS priority, ts.name AS status\n"
+    "FROM tickets t\n"
+    "JOIN ticket_priorities tp ON t.priority_id = tp.id\n"
+    "JOIN ticket_statuses ts ON t.status_id = ts.id\n"
+    "WHERE ts.is_closed = false\n"
+    "ORDER BY t.created_at DESC;\n"
+    "</sql_statement>\n\n"
+    "Explanation:\n"
+    + "".join(
+        f"{i}. This part of the query joins the ticket with its priority and status so the names can be shown, "
+        "and filters out closed tickets using the is_closed flag of the status.\n"
+        for i in range(1, 9)
+    )
+)
+
+# Local stand-in for the Bedrock runtime client that generates a canned completion at a fixed rate
+class StubBedrockClient:
+    def __init__(self, completion: str, chunk_chars: int, chunk_delay: float, first_chunk_delay: float):
+        self.chunks = [completion[i:i + chunk_chars] for i in range(0, len(completion), chunk_chars)]
+        self.chunk_delay = chunk_delay
+        self.first_chunk_delay = first_chunk_delay
+        self.usage = {"input_tokens": 120, "cache_read_input_tokens": 2758, "cache_creation_input_tokens": 0}
+
+    # Returns once the whole completion has been generated
+    def invoke_model(self, modelId: str, body: str) -> dict:
+        time.sleep(self.first_chunk_delay + self.chunk_delay * len(self.chunks))
+        payload = {"content": [{"type": "text", "text": "".join(self.chunks)}], "usage": self.usage}
+        return {"body": StubBody(json.dumps(payload).encode("utf-8"))}
+
+    # Returns right away, the events arrive as the completion is generated
+    def invoke_model_with_response_stream(self, modelId: str, body: str) -> dict:
+        return {"body": StubEventStream(self)}
+
+class StubBody:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def read(self) -> bytes:
+        return self.data
+
+class StubEventStream:
+    def __init__(self, client: StubBedrockClient):
+        self.client = client
+        self.closed = False
+
+    def __iter__(self):
+        yield self.event({"type": "message_start", "message": {"usage": self.client.usage}})
+        time.sleep(self.client.first_chunk_delay)
+        for chunk in self.client.chunks:
+            time.sleep(self.client.chunk_delay)
+            if self.closed:
+                return
+            yield self.event({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}})
+        yield self.event({"type": "message_stop"})
+
+    def close(self) -> None:
+        self.closed = True
+
+    @staticmethod
+    def event(message: dict) -> dict:
+        return {"chunk": {"bytes": json.dumps(message).encode("utf-8")}}
+
+# Runs generate_sql repeatedly and returns the median latency in seconds
+def time_generation(agent: SQLAgent, runs: int) -> float:
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        sql_query, error = agent.generate_sql("Show all open tickets along with their priority and status name.")
+        durations.append(time.perf_counter() - start)
+        if error:
+            raise RuntimeError(error)
+    return sorted(durations)[len(durations) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare generate_sql latency with and without streaming on a stub model")
+    parser.add_argument("--chunk-chars", type=int, default=12, help="Characters per streamed chunk (about 3 tokens)")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="Seconds between chunks")
+    parser.add_argument("--first-chunk-delay", type=float, default=0.3, help="Seconds before the first chunk")
+    parser.add_argument("--runs", type=int, default=5, help="Calls per mode")
+    args = parser.parse_args()
+
+    client = StubBedrockClient(DEFAULT_COMPLETION, args.chunk_chars, args.chunk_delay, args.first_chunk_delay)
+    sql_end = DEFAULT_COMPLETION.find("</sql_statement>") + len("</sql_statement>")
+    print(f"completion: {len(DEFAULT_COMPLETION)} chars in {len(client.chunks)} chunks, SQL statement ends at char {sql_end}")
+
+    latencies = {}
+    for mode, streaming in (("invoke_model", False), ("streaming", True)):
+        agent = SQLAgent(streaming=streaming)
+        agent._bedrock_agent = client
+        latencies[mode] = time_generation(agent, args.runs)
+        print(f"{mode:<14} {latencies[mode] * 1000:>8.1f} ms")
+    print(f"latency saved: {1 - latencies['streaming'] / latencies['invoke_model']:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, current_dir)
+
+from bench_serialization import build_response
+from bench_sql_validator import build_cte_query, build_in_list_query
+from errors import generate_error_response
+from prompt import create_error_prompt, create_system_prompt
+from rds_client import parse_records
+from serialization import JSON_BACKEND, dumps
+from sql_agent import SQLAgent
+
+# Sizes of the generated inputs of each benchmark (bytes of SQL, words of question, rows of result)
+DEFAULT_SIZES = {
+    "validate_sql": [1024, 10 * 1024, 100 * 1024],
+    "system_prompt": [10, 100, 1000],
+    "error_prompt": [1024, 10 * 1024, 100 * 1024],
+    "error_response": [1024, 10 * 1024, 100 * 1024],
+    "parse_records": [100, 1000, 5000],
+    "serialization": [100, 1000, 5000],
+    "execute_sql_query": [10, 100, 1000]
+}
+
+# Words questions are made of, so prompts go through schema pruning like real questions
+QUESTION_WORDS = (
+    "show me the open tickets with high priority created last week for the billing category "
+    "and the number of messages per ticket sorted by the most recent customer reply"
+).split()
+
+# A benchmark input: the call to time and the size of its input
+class Case:
+    __slots__ = ("benchmark", "size", "input_bytes", "call")
+
+    def __init__(self, benchmark: str, size: int, input_bytes: int, call):
+        self.benchmark = benchmark
+        self.size = size
+        self.input_bytes = input_bytes
+        self.call = call
+
+# Returns a question of the given number of words
+def build_question(words: int) -> str:
+    return " ".join(QUESTION_WORDS[i % len(QUESTION_WORDS)] for i in range(words))
+
+# Returns the error response context of a query of about the given size that failed
+def build_error_context(sql_bytes: int) -> dict:
+    sql_query = build_cte_query(sql_bytes)
+    return {
+        "generated_sql": sql_query,
+        "database_error": "ERROR: column t.resolved_at does not exist",
+        "error_code": "BadRequestException",
+        "query_type": "SELECT",
+        "sql_length": len(sql_query)
+    }
+
+def validate_sql_cases(sizes: list) -> list:
+    # The memo would answer every call after the first one, only the validation itself is timed
+    agent = SQLAgent(validation_cache_size=0)
+    cases = []
+    for size in sizes:
+        for builder in (build_in_list_query, build_cte_query):
+            sql_query = builder(size)
+            assert agent.validate_sql(sql_query) == (True, None)
+            name = f"validate_sql[{builder.__name__[6:-6]}]"
+            cases.append(Case(name, size, len(sql_query), lambda sql_query=sql_query: agent.validate_sql(sql_query)))
+    return cases
+
+def system_prompt_cases(sizes: list) -> list:
+    cases = []
+    for words in sizes:
+        question = build_question(words)
+        cases.append(Case("system_prompt", words, len(question), lambda question=question: create_system_prompt(question)))
+    return cases
+
+def error_prompt_cases(sizes: list) -> list:
+    cases = []
+    for size in sizes:
+        context = build_error_context(size)
+        error_context = {"error_type": "database_error", "error_message": context["database_error"], "context": context}
+        cases.append(Case(
+            "error_prompt", size, len(context["generated_sql"]),
+            lambda error_context=error_context, sql_query=context["generated_sql"]: create_error_prompt(
+                build_question(20), error_context, sql_query
+            )
+        ))
+    return cases
+
+def error_response_cases(sizes: list) -> list:
+    cases = []
+    for size in sizes:
+        context = build_error_context(size)
+        cases.append(Case(
+            "error_response", size, len(context["generated_sql"]),
+            lambda context=context: generate_error_response(
+                "database_error", f"Database query failed: {context['database_error']}", build_question(20), context
+            )
+        ))
+    return cases
+
+def parse_records_cases(sizes: list) -> list:
+    cases = []
+    for rows in sizes:
+        formatted_records = json.dumps(build_response(rows)["data"])
+        cases.append(Case(
+            "parse_records", rows, len(formatted_records),
+            lambda formatted_records=formatted_records: parse_records(formatted_records)
+        ))
+    return cases
+
+def serialization_cases(sizes: list) -> list:
+    cases = []
+    for rows in sizes:
+        response = build_response(rows)
+        cases.append(Case("serialization", rows, len(dumps(response)), lambda response=response: dumps(response)))
+    return cases
+
+# Stands in for the boto3 rds-data client, answering every statement with the same records
+class StubDataAPI:
+    def __init__(self, formatted_records: str):
+        self.formatted_records = formatted_records
+
+    def begin_transaction(self, **request):
+        return {"transactionId": "tx"}
+
+    def rollback_transaction(self, **request):
+        return {"transactionStatus": "Rollback Complete"}
+
+    def execute_statement(self, **request):
+        return {"formattedRecords": self.formatted_records}
+
+# Whole execute_sql_query calls (validation, rewrite, Data API response parsing, serialization)
+# against a stub Data API client, with the result cache bypassed
+def execute_sql_query_cases(sizes: list) -> list:
+    import mcp_server
+
+    mcp_server.connection_success = True
+    loop = asyncio.new_event_loop()
+    sql_query = "SELECT t.id, t.ticket_number, t.subject, t.created_at FROM tickets t ORDER BY t.created_at DESC"
+    cases = []
+    for rows in sizes:
+        formatted_records = json.dumps(build_response(rows)["data"])
+
+        def call(formatted_records=formatted_records):
+            mcp_server.rds_client.rds_client = StubDataAPI(formatted_records)
+            result = loop.run_until_complete(mcp_server.execute_sql_query(sql_query, use_cache=False))
+            return dumps(result)
+
+        cases.append(Case("execute_sql_query", rows, len(formatted_records), call))
+    return cases
+
+BENCHMARKS = {
+    "validate_sql": validate_sql_cases,
+    "system_prompt": system_prompt_cases,
+    "error_prompt": error_prompt_cases,
+    "error_response": error_response_cases,
+    "parse_records": parse_records_cases,
+    "serialization": serialization_cases,
+    "execute_sql_query": execute_sql_query_cases
+}
+
+# Runs the call repeatedly for at least min_seconds (and 5 runs) and returns the durations in seconds
+def measure(call, min_seconds: float) -> list:
+    call()
+    durations = []
+    elapsed = 0.0
+    while elapsed < min_seconds or len(durations) < 5:
+        start = time.perf_counter()
+        call()
+        duration = time.perf_counter() - start
+        durations.append(duration)
+        elapsed += duration
+    return durations
+
+# Returns the commit the benchmarks ran on, or None outside of a git checkout
+def git_commit() -> str:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=current_dir, capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+def run(benchmarks: list, min_seconds: float) -> dict:
+    results = []
+    print(f"{'benchmark':<26} {'size':>7} {'bytes':>9} {'runs':>6} {'best ms':>9} {'median ms':>10} {'MB/s':>8}")
+    for name in benchmarks:
+        for case in BENCHMARKS[name](DEFAULT_SIZES[name]):
+            durations = measure(case.call, min_seconds)
+            best, median = min(durations), statistics.median(durations)
+            results.append({
+                "benchmark": case.benchmark,
+                "size": case.size,
+                "input_bytes": case.input_bytes,
+                "runs": len(durations),
+                "best_ms": round(best * 1000, 4),
+                "median_ms": round(median * 1000, 4)
+            })
+            print(
+                f"{case.benchmark:<26} {case.size:>7} {case.input_bytes:>9} {len(durations):>6} "
+                f"{best * 1000:>9.3f} {median * 1000:>10.3f} {case.input_bytes / median / 1e6:>8.1f}"
+            )
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "json_backend": JSON_BACKEND,
+        "min_seconds": min_seconds,
+        "results": results
+    }
+
+# Prints the change of the median time of every case found in both runs. Returns the number of
+# cases slower than the baseline by more than the threshold (a fraction)
+def compare(baseline: dict, current: dict, threshold: float) -> int:
+    previous = {(result["benchmark"], result["size"]): result for result in baseline["results"]}
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('created_at', '?')}):")
+    print(f"{'benchmark':<26} {'size':>7} {'before ms':>10} {'after ms':>10} {'change':>8}")
+    regressions = 0
+    for result in current["results"]:
+        before = previous.get((result["benchmark"], result["size"]))
+        if before is None:
+            continue
+        change = result["median_ms"] / before["median_ms"] - 1 if before["median_ms"] else 0.0
+        flag = ""
+        if change > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(
+            f"{result['benchmark']:<26} {result['size']:>7} {before['median_ms']:>10.3f} "
+            f"{result['median_ms']:>10.3f} {change * 100:>+7.1f}%{flag}"
+        )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CPU hot paths of the server on generated inputs (offline)")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument("--min-seconds", type=float, default=0.3, help="Minimum time spent per case")
+    parser.add_argument("--output", help="Path of the JSON file to save the results to")
+    parser.add_argument("--compare", help="Path of the JSON results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Slowdown reported as a regression (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    # The server logs every query, which would be timed along with it
+    logging.disable(logging.INFO)
+
+    current = run(args.benchmarks, args.min_seconds)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(current, file, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            sys.exit(f"{regressions} case(s) slower than the baseline by more than {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    main()
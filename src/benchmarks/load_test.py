@@ -0,0 +1,238 @@
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, current_dir)
+
+import httpx
+from botocore.exceptions import ClientError
+
+from bench_serialization import build_response
+
+DEFAULT_TRAFFIC = os.path.join(current_dir, "traffic.jsonl")
+
+# Plan returned for EXPLAIN statements, cheap enough for any cost gate setting
+EXPLAIN_RECORDS = json.dumps([{"QUERY PLAN": json.dumps([{"Plan": {"Node Type": "Seq Scan", "Total Cost": 1.0, "Plan Rows": 1}}])}])
+
+# Stands in for the boto3 rds-data client: every call blocks its worker thread for the injected
+# latency (like the HTTPS call it replaces) and queries return the same generated rows. A share
+# of the statements fail with the given error code
+class LatencyDataAPI:
+    def __init__(self, rows: int, latency: float, jitter: float = 0.0, error_rate: float = 0.0, error_code: str = "BadRequestException"):
+        data = build_response(rows)["data"]
+        self.formatted_records = json.dumps(data)
+        self.records = [[self.field(value) for value in row.values()] for row in data]
+        self.column_metadata = [{"name": name, "label": name, "typeName": "varchar"} for name in (data[0] if data else {})]
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.calls = 0
+
+    @staticmethod
+    def field(value) -> dict:
+        if value is None:
+            return {"isNull": True}
+        if isinstance(value, bool):
+            return {"booleanValue": value}
+        if isinstance(value, int):
+            return {"longValue": value}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def wait(self) -> None:
+        self.calls += 1
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def begin_transaction(self, **request):
+        self.wait()
+        return {"transactionId": f"tx-{self.calls}"}
+
+    def rollback_transaction(self, **request):
+        self.wait()
+        return {"transactionStatus": "Rollback Complete"}
+
+    def execute_statement(self, **request):
+        self.wait()
+        sql_query = request["sql"]
+        if sql_query.startswith("EXPLAIN"):
+            return {"formattedRecords": EXPLAIN_RECORDS}
+        if "set_config" in sql_query or sql_query == "SELECT 1 as test":
+            return {"formattedRecords": "[{}]"}
+        if self.error_rate and random.random() < self.error_rate:
+            raise ClientError(
+                {"Error": {"Code": self.error_code, "Message": f"Injected {self.error_code}"}}, "ExecuteStatement"
+            )
+        if request.get("includeResultMetadata"):
+            return {"records": self.records, "columnMetadata": self.column_metadata}
+        return {"formattedRecords": self.formatted_records}
+
+# Replaces the Data API client of the server with a local stub (the tools never call Bedrock,
+# query_sql_agent only builds the prompt for the client's model)
+def install_stub(args) -> LatencyDataAPI:
+    import mcp_server
+
+    data_api = LatencyDataAPI(args.rows, args.db_latency, args.db_jitter, args.error_rate)
+    mcp_server.rds_client.rds_client = data_api
+    return data_api
+
+# Reads the JSON-RPC tool calls to replay, one per line
+def load_traffic(path: str) -> list:
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+# Returns the p-th percentile (0-100) of sorted values (nearest rank)
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+# Returns whether the response of a tool call is a failure: an HTTP or JSON-RPC error, or a
+# result with "success": false (e.g. a rejected query or a database error)
+def is_error(response: httpx.Response) -> bool:
+    if response.status_code != 200:
+        return True
+    body = response.json()
+    return "error" in body or body.get("result", {}).get("success") is False
+
+# Sends the calls from `concurrency` workers. With a rate, call i is due at i / rate seconds and
+# its latency counts from then, so a server falling behind shows up in the latencies (instead
+# of slowing down the load). Returns (tool name, latency in seconds, error) per call and the
+# duration of the run
+async def replay(client: httpx.AsyncClient, calls: list, concurrency: int, rate: float) -> tuple[list, float]:
+    results = []
+    next_call = iter(enumerate(calls))
+    start = time.perf_counter()
+
+    async def worker():
+        for index, call in next_call:
+            due = start + index / rate if rate else time.perf_counter()
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tool_name = call.get("params", {}).get("name", "unknown")
+            try:
+                response = await client.post("/tools/call", json=call)
+                error = is_error(response)
+            except httpx.HTTPError:
+                error = True
+            results.append((tool_name, time.perf_counter() - due, error))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results, time.perf_counter() - start
+
+# Returns the throughput, latency percentiles (ms) and error rate of the calls per tool, and overall
+def summarize(results: list, duration: float) -> dict:
+    groups = {}
+    for tool_name, latency, error in results:
+        groups.setdefault(tool_name, []).append((latency, error))
+    groups["all"] = [(latency, error) for _, latency, error in results]
+
+    summary = {}
+    for tool_name, calls in groups.items():
+        latencies = sorted(latency for latency, _ in calls)
+        errors = sum(1 for _, error in calls if error)
+        summary[tool_name] = {
+            "requests": len(calls),
+            "throughput": round(len(calls) / duration, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "error_rate": round(errors / len(calls), 4)
+        }
+    return summary
+
+def print_summary(summary: dict, duration: float) -> None:
+    print(f"{'tool':<20} {'requests':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for tool_name, stats in summary.items():
+        print(
+            f"{tool_name:<20} {stats['requests']:>8} {stats['throughput']:>8.1f} {stats['p50_ms']:>9.1f} "
+            f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['error_rate']:>7.1%}"
+        )
+    print(f"duration: {duration:.2f}s")
+
+# Runs the adapter with uvicorn on a free localhost port in a background thread and returns the
+# server (set should_exit to stop it) and its URL
+def serve_localhost(app):
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}"
+
+async def run(args, calls: list) -> tuple[list, float]:
+    limits = httpx.Limits(max_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+            return await replay(client, calls, args.concurrency, args.rate)
+
+    from adapter import app
+    server = None
+    if args.localhost:
+        server, url = serve_localhost(app)
+        client = httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout)
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://adapter", timeout=timeout)
+    try:
+        async with client:
+            # Warm-up call: imports, clients and the connection test stay out of the measurements
+            await client.post("/tools/call", json=calls[0])
+            return await replay(client, calls, args.concurrency, args.rate)
+    finally:
+        if server is not None:
+            server.should_exit = True
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay JSON-RPC tool calls against the HTTP adapter with a stub Data API client")
+    parser.add_argument("--traffic", default=DEFAULT_TRAFFIC, help="JSONL file of JSON-RPC tools/call requests, replayed in a loop")
+    parser.add_argument("--requests", type=int, default=200, help="Number of calls to send")
+    parser.add_argument("--concurrency", type=int, default=10, help="Calls in flight at once")
+    parser.add_argument("--rate", type=float, default=0, help="Calls started per second (0 = as fast as the workers go)")
+    parser.add_argument("--localhost", action="store_true", help="Serve the adapter with uvicorn on localhost instead of calling it in-process")
+    parser.add_argument("--url", help="Base URL of an adapter that is already running (its own backends are used, no stubs)")
+    parser.add_argument("--rows", type=int, default=100, help="Rows returned by the stub Data API per query")
+    parser.add_argument("--db-latency", type=float, default=0.02, help="Seconds each stub Data API call takes")
+    parser.add_argument("--db-jitter", type=float, default=0.005, help="Random variation of the Data API latency (+/- seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of queries the stub Data API fails")
+    parser.add_argument("--timeout", type=float, default=60, help="HTTP timeout per call in seconds")
+    parser.add_argument("--output", help="Path of the JSON file to save the summary to")
+    args = parser.parse_args()
+
+    # The server logs every call and failure, the log lines would bury the report
+    logging.disable(logging.ERROR)
+
+    traffic = load_traffic(args.traffic)
+    calls = [traffic[i % len(traffic)] for i in range(args.requests)]
+    data_api = None if args.url else install_stub(args)
+
+    results, duration = asyncio.run(run(args, calls))
+    summary = summarize(results, duration)
+    print_summary(summary, duration)
+    if data_api is not None:
+        print(f"stub Data API calls: {data_api.calls}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"args": vars(args), "duration": round(duration, 3), "tools": summary}, file, indent=2)
+        print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+
+DEFAULT_MODULES = ["lambda_handler"]
+
+# One line of python -X importtime output: self and cumulative microseconds, then the module name
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+# Imports the module in a fresh interpreter (like a Lambda cold start) and returns the wall time
+# of the import in seconds along with the (self us, cumulative us, module) timings of every import
+def profile_import(module: str) -> tuple[float, list]:
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=parent_dir,
+        capture_output=True,
+        text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+
+    timings = []
+    for line in completed.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            timings.append((int(match.group(1)), int(match.group(2)), match.group(4)))
+    return float(completed.stdout.strip().splitlines()[-1]), timings
+
+# Sums the self time of the imports by top-level package
+def group_by_package(timings: list) -> dict:
+    packages = {}
+    for self_us, _, module in timings:
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    return packages
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the import time (cold start) of the server modules")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES, help="Modules to import")
+    parser.add_argument("--top", type=int, default=15, help="Number of packages to list")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters started per module")
+    args = parser.parse_args()
+
+    local_modules = {name[:-3] for name in os.listdir(parent_dir) if name.endswith(".py")}
+    for module in args.modules:
+        # Keep the fastest run, the others mostly measure a cold file system cache
+        wall, timings = min((profile_import(module) for _ in range(args.runs)), key=lambda run: run[0])
+        print(f"{module}: {wall * 1000:.1f} ms")
+
+        print(f"  {'package':<28} {'self ms':>8}")
+        packages = group_by_package(timings)
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {package:<28} {self_us / 1000:>8.1f}")
+
+        print(f"  {'project module':<28} {'self ms':>8} {'total ms':>9}")
+        for self_us, cumulative_us, name in timings:
+            if name in local_modules:
+                print(f"  {name:<28} {self_us / 1000:>8.1f} {cumulative_us / 1000:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from query_cache import QueryCache
+
+# Plan node fields reported for the hot nodes of a plan (when present)
+HOT_NODE_FIELDS = (
+    "Node Type", "Join Type", "Relation Name", "Alias", "Index Name",
+    "Filter", "Join Filter", "Hash Cond", "Merge Cond", "Total Cost", "Plan Rows"
+)
+
+# Summarizes an EXPLAIN (FORMAT JSON) plan: the estimated total cost and rows of the query, and
+# the nodes that contribute the most cost by themselves (their cost minus their children's)
+def summarize_plan(plan: Dict[str, Any], hot_node_count: int = 3) -> Dict[str, Any]:
+    nodes = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        children = node.get("Plans", [])
+        self_cost = node.get("Total Cost", 0.0) - sum(child.get("Total Cost", 0.0) for child in children)
+        nodes.append((self_cost, node))
+        stack.extend(children)
+
+    nodes.sort(key=lambda item: -item[0])
+    hot_nodes = []
+    for self_cost, node in nodes[:hot_node_count]:
+        hot_node = {field: node[field] for field in HOT_NODE_FIELDS if field in node}
+        hot_node["Self Cost"] = round(max(self_cost, 0.0), 2)
+        hot_nodes.append(hot_node)
+    return {
+        "total_cost": plan.get("Total Cost", 0.0),
+        "plan_rows": plan.get("Plan Rows", 0),
+        "hot_nodes": hot_nodes
+    }
+
+# Admission gate rejecting queries whose estimated plan is too expensive (0 disables a threshold).
+# Plan summaries are cached per normalized query for ttl_seconds (bounded, LRU) so repeated
+# queries skip the EXPLAIN round trip
+class CostGate:
+    def __init__(self, max_cost: float = 0.0, max_rows: float = 0, cache_size: int = 1024, ttl_seconds: float = 300.0):
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.cache_size = cache_size
+        self.ttl_seconds = ttl_seconds
+        self._plans: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_cost > 0 or self.max_rows > 0
+
+    # Returns the cached plan summary of the query, or None
+    def get(self, sql_query: str) -> Optional[Dict[str, Any]]:
+        key = QueryCache.normalize_sql(sql_query)
+        with self._lock:
+            entry = self._plans.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._plans[key]
+                self.misses += 1
+                return None
+            self._plans.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    # Caches the plan summary of the query
+    def put(self, sql_query: str, summary: Dict[str, Any]) -> None:
+        if self.cache_size <= 0 or self.ttl_seconds <= 0:
+            return
+        key = QueryCache.normalize_sql(sql_query)
+        with self._lock:
+            self._plans[key] = (time.monotonic() + self.ttl_seconds, summary)
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.cache_size:
+                self._plans.popitem(last=False)
+
+    # Returns why the plan is rejected, or None when it is within the thresholds
+    def check(self, summary: Dict[str, Any]) -> Optional[str]:
+        reasons: List[str] = []
+        if self.max_cost > 0 and summary["total_cost"] > self.max_cost:
+            reasons.append(f"estimated cost {summary['total_cost']:.0f} is above the limit of {self.max_cost:.0f}")
+        if self.max_rows > 0 and summary["plan_rows"] > self.max_rows:
+            reasons.append(f"estimated {summary['plan_rows']:.0f} rows is above the limit of {self.max_rows:.0f}")
+        if not reasons:
+            return None
+        with self._lock:
+            self.rejected += 1
+        return " and ".join(reasons)
+
+    # Returns counters describing the plan cache and the rejections
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "max_cost": self.max_cost,
+                "max_rows": self.max_rows,
+                "cached_plans": len(self._plans),
+                "hits": self.hits,
+                "misses": self.misses,
+                "rejected": self.rejected
+            }
@@ -0,0 +1,429 @@
+import base64
+import datetime
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from botocore.exceptions import ClientError
+from typing import Dict, Any, Optional
+
+from rds_client import STATEMENT_TIMEOUT_SQL
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+
+# Table definitions and foreign keys of a schema file
+CREATE_TABLE_PATTERN = re.compile(r"CREATE TABLE(?: IF NOT EXISTS)? (\w+)", re.IGNORECASE)
+REFERENCES_PATTERN = re.compile(r"\s+REFERENCES (\w+)\s*\([^)]*\)", re.IGNORECASE)
+
+# Message of the Data API while an auto-paused cluster resumes
+RESUMING_MESSAGE = "The Aurora DB instance is resuming after being auto-paused. Please wait a few seconds and try again."
+
+# Plan answered to EXPLAIN (FORMAT JSON) on SQLite, which has no cost estimates
+SQLITE_PLAN = [{"Plan": {"Node Type": "Result", "Startup Cost": 0.0, "Total Cost": 0.0, "Plan Rows": 0, "Plan Width": 0}}]
+
+# PostgreSQL type names reported for the Python types of SQLite values
+SQLITE_TYPE_NAMES = {int: "int8", float: "float8", str: "text", bytes: "bytea"}
+
+# Returns the statements of a schema file without the foreign keys to tables it doesn't define
+# (schema.sql references organizations, users and agents, which belong to another schema)
+def load_schema(path: str = SCHEMA_PATH) -> str:
+    with open(path) as file:
+        schema = file.read()
+    tables = {name.lower() for name in CREATE_TABLE_PATTERN.findall(schema)}
+
+    def replace(match: re.Match) -> str:
+        return match.group() if match.group(1).lower() in tables else ""
+
+    return REFERENCES_PATTERN.sub(replace, schema)
+
+# Converts PostgreSQL DDL into the SQLite dialect (auto-incremented keys, arrays stored as text)
+def sqlite_schema(schema: str) -> str:
+    schema = re.sub(r"\bBIGSERIAL PRIMARY KEY\b", "INTEGER PRIMARY KEY", schema, flags=re.IGNORECASE)
+    return re.sub(r"\b(\w+)\[\]", r"\1", schema)
+
+# Converts a Data API SQL parameter value (e.g. {"longValue": 1}) into a Python value
+def parameter_value(field: Dict[str, Any]) -> Any:
+    if field.get("isNull"):
+        return None
+    if "arrayValue" in field:
+        raise ValueError("Array parameters are not supported")
+    for value in field.values():
+        return value
+    return None
+
+# Converts a database value into the value of a JSON formatted record
+def record_value(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (bytes, memoryview)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, list):
+        return [record_value(item) for item in value]
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return str(value)
+
+# Converts a database value into a Data API field (e.g. {"stringValue": "open"})
+def field(value: Any) -> Dict[str, Any]:
+    if value is None:
+        return {"isNull": True}
+    if isinstance(value, bool):
+        return {"booleanValue": value}
+    if isinstance(value, int):
+        return {"longValue": value}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (bytes, memoryview)):
+        return {"blobValue": bytes(value)}
+    if isinstance(value, list):
+        values = [record_value(item) for item in value]
+        if all(isinstance(item, bool) for item in values):
+            return {"arrayValue": {"booleanValues": values}}
+        if all(isinstance(item, int) and not isinstance(item, bool) for item in values):
+            return {"arrayValue": {"longValues": values}}
+        if all(isinstance(item, float) for item in values):
+            return {"arrayValue": {"doubleValues": values}}
+        return {"arrayValue": {"stringValues": [str(item) for item in values]}}
+    return {"stringValue": str(record_value(value))}
+
+# Raises the ClientError the Data API would return
+def client_error(code: str, message: str, operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+# SQLite connection carrying the deadline of its statement timeout
+class TimedConnection(sqlite3.Connection):
+    deadline: Optional[float] = None
+
+# SQLite database the emulator runs statements on: in memory (shared by the connections of the
+# emulator) or in a file. Statement timeouts are enforced with a progress handler
+class SQLiteEngine:
+    name = "sqlite"
+    errors = (sqlite3.Error,)
+
+    def __init__(self, path: str = ":memory:"):
+        if path == ":memory:":
+            self.uri = f"file:data-api-emulator-{uuid.uuid4().hex}?mode=memory&cache=shared"
+        else:
+            self.uri = f"file:{path}"
+        # An in-memory database lives as long as one of its connections is open
+        self._anchor = self.connect()
+
+    def connect(self):
+        connection = sqlite3.connect(self.uri, uri=True, check_same_thread=False, factory=TimedConnection)
+        connection.set_progress_handler(
+            lambda: 1 if connection.deadline is not None and time.monotonic() > connection.deadline else 0, 1000
+        )
+        return connection
+
+    def release(self, connection) -> None:
+        connection.close()
+
+    def load(self, schema: str) -> None:
+        self._anchor.executescript(sqlite_schema(schema))
+
+    def execute(self, connection, sql_query: str, parameters: Dict[str, Any]):
+        cursor = connection.cursor()
+        cursor.execute(sql_query, parameters)
+        return cursor
+
+    # Set by the statement_timeout call of a transaction, SQLite has no such setting
+    def set_timeout(self, connection, timeout: str) -> None:
+        milliseconds = float(timeout[:-2]) if timeout.endswith("ms") else float(timeout) * 1000
+        connection.deadline = time.monotonic() + milliseconds / 1000
+
+    # SQLite doesn't report the types of result columns, they are named after the first value found
+    @staticmethod
+    def column_types(cursor, rows: list) -> list:
+        types = []
+        for index in range(len(cursor.description)):
+            value = next((row[index] for row in rows if row[index] is not None), None)
+            types.append(SQLITE_TYPE_NAMES.get(type(value), "unknown"))
+        return types
+
+    @staticmethod
+    def error(error: Exception) -> tuple[str, str]:
+        message = str(error)
+        if message == "interrupted":
+            return "BadRequestException", "ERROR: canceling statement due to statement timeout; SQLState: 57014"
+        return "BadRequestException", f"ERROR: {message}"
+
+    def close(self) -> None:
+        self._anchor.close()
+
+# PostgreSQL database the emulator runs statements on (e.g. a local server started for the
+# tests), through a pool of connections
+class PostgresEngine:
+    name = "postgres"
+
+    def __init__(self, dsn: str, max_connections: int = 10):
+        import psycopg2
+        from psycopg2.pool import ThreadedConnectionPool
+        self.errors = (psycopg2.Error,)
+        self.pool = ThreadedConnectionPool(0, max_connections, dsn=dsn)
+
+    def connect(self):
+        return self.pool.getconn()
+
+    def release(self, connection) -> None:
+        if not connection.closed:
+            connection.rollback()
+        self.pool.putconn(connection, close=bool(connection.closed))
+
+    def load(self, schema: str) -> None:
+        connection = self.connect()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(schema)
+            connection.commit()
+        finally:
+            self.release(connection)
+
+    def execute(self, connection, sql_query: str, parameters: Dict[str, Any]):
+        from pg_backend import convert_placeholders
+        cursor = connection.cursor()
+        if parameters:
+            sql_query = convert_placeholders(sql_query, parameters)
+        cursor.execute(sql_query, parameters or None)
+        return cursor
+
+    # Passed on to the database, which enforces it
+    def set_timeout(self, connection, timeout: str) -> None:
+        pass
+
+    @staticmethod
+    def column_types(cursor, rows: list) -> list:
+        from pg_backend import TYPE_NAMES
+        return [TYPE_NAMES.get(column.type_code, str(column.type_code)) for column in cursor.description]
+
+    @staticmethod
+    def error(error: Exception) -> tuple[str, str]:
+        message = (getattr(error, "pgerror", None) or str(error)).strip()
+        pgcode = getattr(error, "pgcode", None)
+        return "BadRequestException", f"{message}; SQLState: {pgcode}" if pgcode else message
+
+    def close(self) -> None:
+        self.pool.closeall()
+
+# Local stand-in for the boto3 rds-data client (execute_statement, batch_execute_statement and the
+# transaction calls), running statements on SQLite (in memory by default, for simple queries) or
+# on a PostgreSQL database given by its dsn (postgresql://...), loaded from schema.sql. Responses
+# are shaped like the service's: formattedRecords with formatRecordsAs JSON, records otherwise,
+# and columnMetadata with includeResultMetadata. Errors are raised as the same ClientErrors.
+# For performance and failure testing, every call can take an injected latency, the cluster can
+# be paused (calls fail as resuming until resume_seconds after the first one), a share of the
+# calls can be throttled, and the next calls can be made to fail with any error
+class DataAPIEmulator:
+    def __init__(
+        self,
+        dsn: str = ":memory:",
+        schema_path: Optional[str] = SCHEMA_PATH,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        resume_seconds: float = 0.0,
+        throttle_rate: float = 0.0
+    ):
+        if dsn.startswith(("postgres://", "postgresql://")) or "dbname=" in dsn:
+            self.engine = PostgresEngine(dsn)
+        else:
+            self.engine = SQLiteEngine(dsn)
+        if schema_path:
+            self.engine.load(load_schema(schema_path))
+        self.latency = latency
+        self.jitter = jitter
+        self.resume_seconds = resume_seconds
+        self.throttle_rate = throttle_rate
+        self.calls = 0
+        self._resumed_at = None
+        self._failures = []
+        self._transactions: Dict[str, Any] = {}
+        self._transaction_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    # Makes the next `count` calls fail with the given Data API error
+    def fail_next(self, error_code: str, message: str = "", count: int = 1) -> None:
+        with self._lock:
+            self._failures.extend([(error_code, message or f"Injected {error_code}")] * count)
+
+    # Pauses the cluster: the next call starts the resume, and calls fail until it is done
+    def pause(self, resume_seconds: Optional[float] = None) -> None:
+        with self._lock:
+            if resume_seconds is not None:
+                self.resume_seconds = resume_seconds
+            self._resumed_at = None
+
+    # Waits for the injected latency and raises the injected failures of the call
+    def _call(self, operation: str) -> None:
+        with self._lock:
+            self.calls += 1
+            failure = self._failures.pop(0) if self._failures else None
+            if self.resume_seconds and self._resumed_at is None:
+                self._resumed_at = time.monotonic() + self.resume_seconds
+            resuming = self.resume_seconds and time.monotonic() < self._resumed_at
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if failure is not None:
+            raise client_error(failure[0], failure[1], operation)
+        if resuming:
+            raise client_error("DatabaseResumingException", RESUMING_MESSAGE, operation)
+        if self.throttle_rate and random.random() < self.throttle_rate:
+            raise client_error("ThrottlingException", "Rate exceeded", operation)
+
+    def _transaction(self, transaction_id: str, operation: str):
+        with self._lock:
+            connection = self._transactions.get(transaction_id)
+        if connection is None:
+            raise client_error("TransactionNotFoundException", f"Transaction {transaction_id} is not found", operation)
+        return connection
+
+    def begin_transaction(self, resourceArn: str = None, secretArn: str = None, database: str = None, **request) -> Dict[str, Any]:
+        self._call("BeginTransaction")
+        transaction_id = f"emulator-tx-{next(self._transaction_ids)}"
+        connection = self.engine.connect()
+        with self._lock:
+            self._transactions[transaction_id] = connection
+        return {"transactionId": transaction_id}
+
+    def commit_transaction(self, resourceArn: str = None, secretArn: str = None, transactionId: str = None, **request) -> Dict[str, Any]:
+        self._call("CommitTransaction")
+        connection = self._transaction(transactionId, "CommitTransaction")
+        with self._lock:
+            del self._transactions[transactionId]
+        try:
+            connection.commit()
+        finally:
+            self.engine.release(connection)
+        return {"transactionStatus": "Transaction Committed"}
+
+    def rollback_transaction(self, resourceArn: str = None, secretArn: str = None, transactionId: str = None, **request) -> Dict[str, Any]:
+        self._call("RollbackTransaction")
+        connection = self._transaction(transactionId, "RollbackTransaction")
+        with self._lock:
+            del self._transactions[transactionId]
+        try:
+            connection.rollback()
+        finally:
+            self.engine.release(connection)
+        return {"transactionStatus": "Rollback Complete"}
+
+    # Runs one statement, in its transaction or on its own (committed right away)
+    def execute_statement(
+        self,
+        sql: str,
+        resourceArn: str = None,
+        secretArn: str = None,
+        database: str = None,
+        parameters: list = None,
+        transactionId: str = None,
+        includeResultMetadata: bool = False,
+        formatRecordsAs: str = "NONE",
+        **request
+    ) -> Dict[str, Any]:
+        self._call("ExecuteStatement")
+        values = {parameter["name"]: parameter_value(parameter["value"]) for parameter in parameters or []}
+        return self._run("ExecuteStatement", transactionId, lambda connection: self._execute(
+            connection, sql, values, includeResultMetadata, formatRecordsAs == "JSON"
+        ))
+
+    # Runs a statement once per parameter set, all in the same transaction. generatedFields holds
+    # the row returned by each statement (e.g. INSERT ... RETURNING id)
+    def batch_execute_statement(
+        self,
+        sql: str,
+        resourceArn: str = None,
+        secretArn: str = None,
+        database: str = None,
+        parameterSets: list = None,
+        transactionId: str = None,
+        **request
+    ) -> Dict[str, Any]:
+        self._call("BatchExecuteStatement")
+
+        def run(connection) -> Dict[str, Any]:
+            results = []
+            for parameter_set in parameterSets or [[]]:
+                values = {parameter["name"]: parameter_value(parameter["value"]) for parameter in parameter_set}
+                cursor = self.engine.execute(connection, sql, values)
+                row = cursor.fetchone() if cursor.description else None
+                results.append({"generatedFields": [field(value) for value in row] if row else []})
+            return {"updateResults": results}
+
+        return self._run("BatchExecuteStatement", transactionId, run)
+
+    # Runs the statements on the connection of the transaction, or on a connection of their own
+    # whose work is committed (or rolled back on error)
+    def _run(self, operation: str, transaction_id: Optional[str], run) -> Dict[str, Any]:
+        connection = self._transaction(transaction_id, operation) if transaction_id else self.engine.connect()
+        try:
+            response = run(connection)
+            if not transaction_id:
+                connection.commit()
+            return response
+        except self.engine.errors + (ValueError,) as error:
+            raise self._database_error(error, operation, connection, transaction_id)
+        finally:
+            if not transaction_id:
+                self.engine.release(connection)
+
+    def _database_error(self, error: Exception, operation: str, connection, transaction_id: Optional[str]) -> ClientError:
+        if not transaction_id:
+            connection.rollback()
+        error_code, message = self.engine.error(error)
+        logger.info(f"Emulated {operation} failed: {message}")
+        return client_error(error_code, message, operation)
+
+    # Runs a statement and builds the Data API response of its result
+    def _execute(self, connection, sql_query: str, values: Dict[str, Any], metadata: bool, formatted: bool) -> Dict[str, Any]:
+        if sql_query == STATEMENT_TIMEOUT_SQL and self.engine.name == "sqlite":
+            self.engine.set_timeout(connection, values["timeout"])
+            return self._response(["set_config"], ["text"], [[values["timeout"]]], metadata, formatted)
+        if sql_query.startswith("EXPLAIN") and self.engine.name == "sqlite":
+            return self._response(["QUERY PLAN"], ["json"], [[json.dumps(SQLITE_PLAN)]], metadata, formatted)
+
+        cursor = self.engine.execute(connection, sql_query, values)
+        if cursor.description is None:
+            return {"numberOfRecordsUpdated": max(cursor.rowcount, 0), "generatedFields": []}
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+        return self._response(columns, self.engine.column_types(cursor, rows), rows, metadata, formatted)
+
+    @staticmethod
+    def _response(columns: list, column_types: list, rows: list, metadata: bool, formatted: bool) -> Dict[str, Any]:
+        response: Dict[str, Any] = {"numberOfRecordsUpdated": 0}
+        if formatted:
+            response["formattedRecords"] = json.dumps(
+                [{column: record_value(value) for column, value in zip(columns, row)} for row in rows]
+            )
+        else:
+            response["records"] = [[field(value) for value in row] for row in rows]
+        if metadata:
+            response["columnMetadata"] = [
+                {"name": column, "label": column, "typeName": column_type}
+                for column, column_type in zip(columns, column_types)
+            ]
+        return response
+
+    # Rolls back the open transactions and closes the database
+    def close(self) -> None:
+        with self._lock:
+            transactions, self._transactions = self._transactions, {}
+        for connection in transactions.values():
+            connection.rollback()
+            self.engine.release(connection)
+        self.engine.close()
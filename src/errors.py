@@ -1,12 +1,13 @@
 import json
 from typing import Dict, List
 
-def generate_error_response(
+# Builds the error response returned by the MCP tools (serialized once, when sent to the client)
+def build_error_response(
     error_type: str, 
     error_message: str, 
     user_query: str,
     context: Dict = None
-) -> str:
+) -> Dict:
     error_templates = {
         "sql_generation_error": {
             "title": "SQL Generation Failed",
@@ -53,11 +54,95 @@ def generate_error_response(
                 "Ensure data types match in comparisons",
                 "Simplify the query to focus on one table at a time"
             ]
+        },
+        # Transient: the SQL query is fine and must be run again as it is, not rewritten
+        "database_resuming": {
+            "title": "Database Is Resuming",
+            "common_causes": [
+                "The Aurora Serverless cluster scaled down while idle and is starting up again",
+                "The cluster is scaling up to handle more load"
+            ],
+            "recovery_steps": [
+                "Wait a few seconds, then run the same SQL query again",
+                "Do not rewrite the SQL query, it did not cause this error"
+            ],
+            "retry_advice": "The database is resuming. Wait a few seconds and run the same SQL query again without changing it.",
+            "retry_instructions": """
+    TO RETRY:
+    Wait a few seconds, then call the same tool again with the same SQL query and user_query.
+    Do NOT call query_sql_agent to rewrite the SQL query, it did not cause this error.
+    """
+        },
+        "query_cost_exceeded": {
+            "title": "Query Too Expensive",
+            "common_causes": [
+                "A JOIN without a join condition (cross join) between large tables",
+                "A filter on a column without an index, scanning a whole large table (e.g., messages)",
+                "No WHERE clause or LIMIT on a query over a large table"
+            ],
+            "recovery_steps": [
+                "Look at the hot_nodes in the context: they are the most expensive steps of the plan",
+                "Add the missing JOIN conditions between the tables",
+                "Filter on indexed columns (ids, foreign keys, dates) and narrow the time range",
+                "Aggregate with GROUP BY or add a LIMIT instead of returning every row"
+            ]
+        },
+        # The query ran out of time: running it again as it is would fail the same way
+        "query_timeout": {
+            "title": "Query Timed Out",
+            "common_causes": [
+                "The query scans a large table (e.g., messages) without a selective filter",
+                "A JOIN without a join condition, or on columns without an index",
+                "The query returns or sorts many more rows than the answer needs"
+            ],
+            "recovery_steps": [
+                "Narrow the query: filter on indexed columns (ids, foreign keys, dates) and shorten the time range",
+                "Aggregate with GROUP BY or COUNT instead of returning every row",
+                "Add a LIMIT and only select the columns that are needed",
+                "Split the question into smaller queries over fewer tables"
+            ],
+            "retry_advice": "The query was cancelled because it ran out of time. Rewrite it to read less data (more selective filters, aggregates, a LIMIT) instead of running it again as it is."
+        },
+        "pagination_error": {
+            "title": "Pagination Failed",
+            "common_causes": [
+                "The cursor was modified, truncated or created by another server (its signature does not match)",
+                "The page size is not a positive number",
+                "The page key is not a plain column name",
+                "The query's own LIMIT, OFFSET or FETCH is not a plain row count"
+            ],
+            "recovery_steps": [
+                "Pass the next_cursor value exactly as it was returned",
+                "Call execute_sql_query again with page_size to restart from the first page",
+                "Use a page_key column that uniquely identifies each row (e.g., id)"
+            ]
+        },
+        "batch_error": {
+            "title": "Batch Execution Failed",
+            "common_causes": [
+                "The batch contains no SQL queries",
+                "The batch contains more SQL queries than the server accepts at once"
+            ],
+            "recovery_steps": [
+                "Pass at least one SQL query in sql_queries",
+                "Split the queries into several smaller batches",
+                "Combine related queries into one query using GROUP BY"
+            ]
+        },
+        "format_error": {
+            "title": "Unsupported Result Format",
+            "common_causes": [
+                "The format argument is not one of the supported result formats"
+            ],
+            "recovery_steps": [
+                "Use format \"json\" for rows as objects keyed by column name",
+                "Use format \"columns\" for rows as arrays of values"
+            ]
         }
     }
 
     error_template = error_templates.get(error_type, error_templates["sql_generation_error"])
-    retry_instructions = f"""
+    retry_instructions = error_template.get("retry_instructions") or f"""
     TO RETRY WITH ERROR CONTEXT:
     Call the query_sql_agent tool with the following parameters:
     - user_query: "{user_query}"
@@ -73,8 +158,17 @@ def generate_error_response(
         "context": context or {},
         "recovery_steps": error_template["recovery_steps"],
         "common_causes": error_template["common_causes"],
-        "retry_advice": f"Try rephrasing your query to be more specific about: {', '.join(error_template['recovery_steps'])}",
+        "retry_advice": error_template.get("retry_advice") or f"Try rephrasing your query to be more specific about: {', '.join(error_template['recovery_steps'])}",
         "retry_instructions": retry_instructions
     }
 
-    return json.dumps(response, indent=2)
\ No newline at end of file
+    return response
+
+# Builds the error response as a JSON string
+def generate_error_response(
+    error_type: str,
+    error_message: str,
+    user_query: str,
+    context: Dict = None
+) -> str:
+    return json.dumps(build_error_response(error_type, error_message, user_query, context), indent=2)
\ No newline at end of file
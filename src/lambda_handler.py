@@ -1,7 +1,9 @@
 import json
 import logging
+import os
 from mangum import Mangum
 from adapter import app
+from mcp_server import metrics
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -9,12 +11,24 @@ logger.setLevel(logging.INFO)
 # Create a Lambda entry point for the FastAPI app (HTTP adapter for MCP server)
 handler = Mangum(app)
 
+# Passes the X-Ray trace ID of the invocation to the app as the X-Amzn-Trace-Id request header
+# when API Gateway didn't send one, so the request's timings can be matched with the trace
+def add_trace_header(event: dict) -> None:
+    trace_id = os.getenv("_X_AMZN_TRACE_ID")
+    if not trace_id or not isinstance(event, dict):
+        return
+    names = set(event.get("headers") or {}) | set(event.get("multiValueHeaders") or {})
+    if "x-amzn-trace-id" not in {name.lower() for name in names}:
+        event["headers"] = dict(event.get("headers") or {}, **{"X-Amzn-Trace-Id": trace_id})
+
 # Lambda handler for the FastAPI app (HTTP adapter for MCP server)
 def lambda_handler(event, context):
     try:
         logger.info(f"Received event: {json.dumps(event)}")
+        add_trace_header(event)
         response = handler(event, context)
-        logger.info(f"Event response: {json.dumps(response)}")
+        # Only the size of the body is logged, re-encoding the whole response would double the work
+        logger.info(f"Event response: status {response.get('statusCode')}, {len(response.get('body') or '')} bytes")
         return response
     except Exception as error:
         logger.error(f"Error in lambda handler: {str(error)}")
@@ -29,4 +43,7 @@ def lambda_handler(event, context):
                 'message': str(error)
             })
         }
+    finally:
+        # Embedded metric format log lines, turned into CloudWatch metrics
+        metrics.flush_emf()
 
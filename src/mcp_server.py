@@ -1,13 +1,37 @@
 import os
+import asyncio
+import functools
+import inspect
 import logging
 import json
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
 from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
 
-from prompt import create_system_prompt, create_error_prompt
+from prompt import PROMPT_PREFIX_BYTES, PROMPT_PREFIX_TOKENS, SCHEMA_HASH, create_system_prompt, create_error_prompt
 from sql_agent import SQLAgent
-from rds_client import RDSClient
-from errors import generate_error_response
+from rate_limiter import RateLimiter
+from rds_client import RDSClient, RESULT_FORMATS
+from pg_backend import PostgresBackend
+from errors import build_error_response
+from serialization import dumps
+from query_cache import QueryCache
+from nl_cache import NLQueryCache
+from cost_gate import CostGate, summarize_plan
+from metrics import MetricsRegistry, ROW_BUCKETS, BYTE_BUCKETS, stats_values
+from tracing import span
+from pagination import (
+    start_pagination,
+    pagination_mode,
+    encode_cursor,
+    decode_cursor,
+    build_page_query,
+    paginate_rows
+)
 
 load_dotenv()
 
@@ -16,6 +40,77 @@ CLUSTER_ARN = os.getenv("AURORA_CLUSTER_ARN")
 SECRET_ARN = os.getenv("AURORA_SECRET_ARN")
 DB_NAME = os.getenv("DATABASE_NAME")
 
+# Backend the queries are executed with: "data_api" (HTTP), "postgres" (pooled connections
+# through the RDS Proxy at DB_PROXY_ENDPOINT, or to DATABASE_URL when set, e.g. a local database)
+# or "emulator" (the Data API code path against a local emulator of the service, running on the
+# PostgreSQL database at DATABASE_URL or on an in-memory SQLite database loaded from schema.sql)
+DB_BACKEND = os.getenv("DB_BACKEND", "data_api")
+DB_PROXY_ENDPOINT = os.getenv("DB_PROXY_ENDPOINT")
+DB_PORT = int(os.getenv("DB_PORT", "5432"))
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Query result cache settings (set QUERY_CACHE_TTL_SECONDS=0 to disable the cache)
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "60"))
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Natural language query cache settings (set NL_CACHE_MAX_ENTRIES=0 to disable the cache, and
+# NL_CACHE_SIMILARITY between 0 and 1 to also reuse SQL for questions that are worded alike)
+NL_CACHE_MAX_ENTRIES = int(os.getenv("NL_CACHE_MAX_ENTRIES", "512"))
+NL_CACHE_SIMILARITY = float(os.getenv("NL_CACHE_SIMILARITY", "0"))
+
+# Largest page size accepted for paginated query execution
+QUERY_MAX_PAGE_SIZE = int(os.getenv("QUERY_MAX_PAGE_SIZE", "1000"))
+
+# Key signing the pagination cursors, so clients can't change the SQL query a cursor carries. Without
+# it a random key is made per process and cursors only work on the process that created them (set it
+# when several instances serve the same clients, e.g. Lambda)
+PAGINATION_CURSOR_SECRET = os.getenv("PAGINATION_CURSOR_SECRET", "").encode("utf-8") or secrets.token_bytes(32)
+
+# Budgets for the rows returned by a single query (0 disables a budget); larger results are truncated
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "1000"))
+QUERY_MAX_BYTES = int(os.getenv("QUERY_MAX_BYTES", str(1024 * 1024)))
+
+# Queries are rewritten to return at most this many rows (an outer LIMIT is added, or a larger
+# top-level LIMIT lowered) before they run; 0 leaves queries as they are
+QUERY_LIMIT_ROWS = int(os.getenv("QUERY_LIMIT_ROWS", "1000"))
+
+# Queries whose estimated plan (EXPLAIN) goes over these thresholds are rejected before they run
+# (0 disables a threshold, the gate is off unless one is set); plans are cached per query for the TTL
+QUERY_MAX_COST = float(os.getenv("QUERY_MAX_COST", "0"))
+QUERY_MAX_PLAN_ROWS = float(os.getenv("QUERY_MAX_PLAN_ROWS", "0"))
+QUERY_PLAN_CACHE_TTL_SECONDS = float(os.getenv("QUERY_PLAN_CACHE_TTL_SECONDS", "300"))
+
+# Most Data API calls in flight at once and the time a single call may take (0 disables the timeout:
+# the request deadline and the Data API's own 45 s call timeout still apply). A timeout under the
+# Data API's makes every query a transaction with a statement_timeout, three more Data API calls
+RDS_MAX_CONCURRENCY = int(os.getenv("RDS_MAX_CONCURRENCY", "10"))
+RDS_QUERY_TIMEOUT_SECONDS = float(os.getenv("RDS_QUERY_TIMEOUT_SECONDS", "0"))
+
+# Time spent retrying statements while Aurora Serverless resumes, and how long after the last
+# successful call query_sql_agent skips waking the database up again
+RDS_RESUME_TIMEOUT_SECONDS = float(os.getenv("RDS_RESUME_TIMEOUT_SECONDS", "30"))
+RDS_PREWARM_INTERVAL_SECONDS = float(os.getenv("RDS_PREWARM_INTERVAL_SECONDS", "60"))
+
+# Time a tool call may spend on the database when the caller sets no deadline of its own (stdio;
+# 0 for no limit), and the time kept from a Lambda invocation's remaining time to send the response.
+# Statements still running at the deadline are cancelled by the database (statement_timeout)
+REQUEST_TIME_BUDGET_SECONDS = float(os.getenv("REQUEST_TIME_BUDGET_SECONDS", "60"))
+REQUEST_DEADLINE_MARGIN_SECONDS = float(os.getenv("REQUEST_DEADLINE_MARGIN_SECONDS", "1"))
+
+# Most queries accepted by execute_sql_batch and how many of them run at the same time
+QUERY_BATCH_MAX_QUERIES = int(os.getenv("QUERY_BATCH_MAX_QUERIES", "10"))
+QUERY_BATCH_CONCURRENCY = int(os.getenv("QUERY_BATCH_CONCURRENCY", "4"))
+
+# Limits of the Bedrock calls made by the server-side SQL generation (0 for no per-minute limit)
+BEDROCK_REQUESTS_PER_MINUTE = float(os.getenv("BEDROCK_REQUESTS_PER_MINUTE", "0"))
+BEDROCK_TOKENS_PER_MINUTE = float(os.getenv("BEDROCK_TOKENS_PER_MINUTE", "0"))
+BEDROCK_MAX_CONCURRENCY = int(os.getenv("BEDROCK_MAX_CONCURRENCY", "4"))
+BEDROCK_QUEUE_TIMEOUT_SECONDS = float(os.getenv("BEDROCK_QUEUE_TIMEOUT_SECONDS", "30"))
+BEDROCK_MAX_RETRIES = int(os.getenv("BEDROCK_MAX_RETRIES", "4"))
+
+# Namespace of the CloudWatch metrics written as embedded metric format log lines (on Lambda)
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "SQLAgentMCP")
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -24,21 +119,182 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 mcp = FastMCP("sql-agent")
-sql_agent = SQLAgent()
+sql_agent = SQLAgent(
+    rate_limiter=RateLimiter(
+        requests_per_minute=BEDROCK_REQUESTS_PER_MINUTE,
+        tokens_per_minute=BEDROCK_TOKENS_PER_MINUTE,
+        max_concurrency=BEDROCK_MAX_CONCURRENCY,
+        queue_timeout=BEDROCK_QUEUE_TIMEOUT_SECONDS,
+        max_retries=BEDROCK_MAX_RETRIES
+    ),
+    max_limit=QUERY_LIMIT_ROWS
+)
+# Logged once per process: the prefix is what each prompt cache write costs
+logger.info(f"Static prompt prefix: {PROMPT_PREFIX_BYTES} bytes (~{PROMPT_PREFIX_TOKENS} tokens)")
+query_cache = QueryCache(ttl_seconds=QUERY_CACHE_TTL_SECONDS, max_bytes=QUERY_CACHE_MAX_BYTES)
+cost_gate = CostGate(
+    max_cost=QUERY_MAX_COST,
+    max_rows=QUERY_MAX_PLAN_ROWS,
+    ttl_seconds=QUERY_PLAN_CACHE_TTL_SECONDS
+)
+nl_cache = NLQueryCache(
+    max_entries=NL_CACHE_MAX_ENTRIES,
+    similarity_threshold=NL_CACHE_SIMILARITY,
+    schema_hash=SCHEMA_HASH
+)
 
-# Test the connection to the RDS instance before starting the MCP server
+# The connection to the RDS instance is checked on first use rather than at import time (cold starts)
 connection_success, connection_error = None, None
-try:
-    rds_client = RDSClient(cluster_arn=CLUSTER_ARN, secret_arn=SECRET_ARN, db_name=DB_NAME)
-    connection_success, connection_error = rds_client.test_connection()
-    if not connection_success:
+if DB_BACKEND == "postgres":
+    db_backend = PostgresBackend(
+        host=DB_PROXY_ENDPOINT,
+        port=DB_PORT,
+        db_name=DB_NAME or "postgres",
+        secret_arn=SECRET_ARN,
+        dsn=DATABASE_URL,
+        max_concurrency=RDS_MAX_CONCURRENCY
+    )
+elif DB_BACKEND in ("data_api", "emulator"):
+    db_backend = None
+else:
+    raise ValueError(f"Unknown DB_BACKEND: {DB_BACKEND} (expected data_api, postgres or emulator)")
+if DB_BACKEND == "emulator":
+    from data_api_emulator import DataAPIEmulator
+    data_api_client = DataAPIEmulator(dsn=DATABASE_URL or ":memory:")
+else:
+    data_api_client = None
+rds_client = RDSClient(
+    cluster_arn=CLUSTER_ARN,
+    secret_arn=SECRET_ARN,
+    db_name=DB_NAME,
+    max_concurrency=RDS_MAX_CONCURRENCY,
+    query_timeout=RDS_QUERY_TIMEOUT_SECONDS or None,
+    resume_timeout=RDS_RESUME_TIMEOUT_SECONDS,
+    prewarm_interval=RDS_PREWARM_INTERVAL_SECONDS,
+    backend=db_backend,
+    client=data_api_client
+)
+
+# Metrics of the tool calls, served by the HTTP adapter on /metrics. On Lambda, nothing scrapes
+# the endpoint, so they are also written as embedded metric format log lines after each invocation
+metrics = MetricsRegistry(namespace=METRICS_NAMESPACE, emf=bool(os.getenv("AWS_LAMBDA_FUNCTION_NAME")))
+tool_calls = metrics.counter("sql_agent_tool_calls_total", "Tool calls", ("tool",))
+tool_errors = metrics.counter(
+    "sql_agent_tool_errors_total", "Failed tool calls (and queries of a batch) by error type", ("tool", "error_type")
+)
+tool_seconds = metrics.histogram("sql_agent_tool_seconds", "Time spent in the tool calls", ("tool",))
+stage_seconds = metrics.histogram(
+    "sql_agent_stage_seconds",
+    "Time spent in each stage of the tool calls (validation, prompt, explain, database, serialization)",
+    ("tool", "stage")
+)
+result_row_counts = metrics.histogram(
+    "sql_agent_result_rows", "Rows returned per query", ("tool",), buckets=ROW_BUCKETS, unit="Count"
+)
+response_bytes = metrics.histogram(
+    "sql_agent_response_bytes", "Size of the serialized tool results", ("tool",), buckets=BYTE_BUCKETS, unit="Bytes"
+)
+cache_lookups = metrics.counter(
+    "sql_agent_cache_lookups_total", "Lookups of the result and question caches by status (hit, miss, bypass)", ("cache", "status")
+)
+# State of the rate limiter, caches and cost gate (their stats(), read on each scrape)
+metrics.gauge(
+    "sql_agent_rate_limiter", "Bedrock rate limiter: calls, throttling, queue and wait times",
+    lambda: stats_values(sql_agent.rate_limiter.stats()), ("stat",)
+)
+metrics.gauge("sql_agent_query_cache", "Query result cache: entries, bytes, hits, misses, evictions", lambda: stats_values(query_cache.stats()), ("stat",))
+metrics.gauge("sql_agent_cost_gate", "Cost gate: limits, cached plans, hits, misses, rejections", lambda: stats_values(cost_gate.stats()), ("stat",))
+metrics.gauge("sql_agent_nl_cache", "Question cache: entries, hits, similar hits, misses", lambda: stats_values(nl_cache.stats()), ("stat",))
+
+# Name of the tool being called, the label of the metrics recorded while it runs
+current_tool: ContextVar[str] = ContextVar("current_tool", default="")
+
+# Times the with block as a stage of the current tool call (or of the given tool), recorded in the
+# stage metrics and as a span of the request's trace
+@contextmanager
+def stage(name: str, tool: Optional[str] = None):
+    with span(name), stage_seconds.time(tool=tool or current_tool.get(), stage=name):
+        yield
+
+# Counts a tool call, its errors (or those of the queries of a batch) and the rows it returned
+def record_result(tool_name: str, result: dict) -> None:
+    tool_calls.inc(tool=tool_name)
+    for item in result.get("results") or [result]:
+        if not item.get("success"):
+            tool_errors.inc(tool=tool_name, error_type=item.get("error_type") or "unknown")
+        elif "row_count" in item:
+            result_row_counts.observe(item["row_count"], tool=tool_name)
+
+# Serializes the result of a tool with the encode function, timing it and recording the output size
+def serialize_result(tool_name: str, result: dict, encode):
+    with stage("serialization", tool=tool_name):
+        output = encode(result)
+    response_bytes.observe(len(output), tool=tool_name)
+    return output
+
+# Deadline (a time.monotonic() value) of the tool call being handled, set by the HTTP adapter from
+# the remaining time of the Lambda invocation
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+# Sets the deadline of the current tool call from the seconds the caller has left, keeping
+# REQUEST_DEADLINE_MARGIN_SECONDS to send the response
+def set_request_deadline(remaining_seconds: float) -> None:
+    request_deadline.set(time.monotonic() + remaining_seconds - REQUEST_DEADLINE_MARGIN_SECONDS)
+
+# Returns the deadline of the current tool call: the one set by the caller, or the time budget
+# from now (None when there is neither)
+def current_deadline() -> Optional[float]:
+    deadline = request_deadline.get()
+    if deadline is None and REQUEST_TIME_BUDGET_SECONDS > 0:
+        deadline = time.monotonic() + REQUEST_TIME_BUDGET_SECONDS
+    return deadline
+
+# Tests the connection to the RDS instance the first time a tool needs it (a failed test is
+# retried by the next call). Returns whether the database is available and the error if not
+async def check_connection() -> tuple[bool, str]:
+    global connection_success, connection_error
+    if connection_success:
+        return connection_success, connection_error
+
+    try:
+        loop = asyncio.get_running_loop()
+        connection_success, connection_error = await loop.run_in_executor(
+            rds_client.executor, rds_client.test_connection
+        )
+        if not connection_success:
+            logger.error(f"Failed to connect to RDS: {connection_error}")
+        else:
+            logger.info("Connection to RDS successful")
+    except Exception as error:
+        connection_success = False
+        connection_error = f"Failed to connect to RDS: {str(error)}"
         logger.error(f"Failed to connect to RDS: {connection_error}")
-    else:
-        logger.info("Connection to RDS successful")
-except Exception as error:
-    connection_success = False
-    connection_error = f"Failed to connect to RDS: {str(error)}"
-    logger.error(f"Failed to connect to RDS: {connection_error}")
+    return connection_success, connection_error
+
+# Registers a coroutine returning a result dict as an MCP tool whose output is the result serialized
+# once to compact JSON. The coroutine itself is returned (with the metrics of its calls recorded) so
+# the HTTP adapter can serialize it at its own edge
+def json_tool(function):
+    name = function.__name__
+
+    @functools.wraps(function)
+    async def instrumented(*args, **kwargs) -> dict:
+        token = current_tool.set(name)
+        try:
+            with tool_seconds.time(tool=name):
+                result = await function(*args, **kwargs)
+        finally:
+            current_tool.reset(token)
+        record_result(name, result)
+        return result
+
+    @functools.wraps(function)
+    async def tool(*args, **kwargs) -> str:
+        return serialize_result(name, await instrumented(*args, **kwargs), dumps)
+
+    tool.__signature__ = inspect.signature(function).replace(return_annotation=str)
+    mcp.tool()(tool)
+    return instrumented
 
 # MCP prompt used to generate valid SQL queries given the user's query 
 # (uses the system prompt)
@@ -77,12 +333,12 @@ async def fix_sql_query_error(user_query: str, error_context: dict, generated_sq
 
 # MCP tool used to convert a user's natural language query into a SQL query 
 # (uses the generate_sql_query prompt)
-@mcp.tool()
+@json_tool
 async def query_sql_agent(
     user_query: str,
     previous_error: str = None,
     error_context: str = None
-) -> str:
+) -> dict:
     """Convert a natural language query into a valid SQL query to be executed on the database.
 
     This tool is used to convert a natural language query related to the following
@@ -92,6 +348,8 @@ async def query_sql_agent(
 
     IMPORTANT WORKFLOW:
     - FIRST ATTEMPT: Call this tool with the user_query parameter only to get the initial system prompt.
+    - CACHE HIT: If the response has "cache_hit": true, it already contains a "sql_query" that answered the same
+      question before; call execute_sql_query with it directly instead of generating SQL.
     - IF ERROR OCCURS: Use the retry_instructions from the error response to call this tool again.
     - RETRY ATTEMPT: Call this tool with the previous_error and error_context parameters to generate an error-aware prompt.
     - FINAL STEP: Call execute_sql_query with the generated SQL query to execute it on the database and return the results.
@@ -105,31 +363,28 @@ async def query_sql_agent(
         previous_error: (optional) the error message from the previous attempt to generate a SQL query - use this for retries
         error_context: (optional) a dictionary containing detailed error context from the previous attempt to generate a SQL query - use this for retries
     """
-    # Verify the connection to the RDS instance
-    if not connection_success:
-        logger.error(f"Database connection not available: {connection_error}")
-        return json.dumps({
-            "success": False,
-            "error": f"Database service unavailable: {connection_error}",
-            "user_query": user_query,
-            "retry_advice": "The database service is currently unavailable. Please try again later.",
-            "error_type": "connection_error"
-        }, indent=2)
+    # This tool doesn't need the database: wake it up in the background instead of waiting for it,
+    # so an Aurora resume or scale-up overlaps with the time the client spends generating SQL
+    # (the connection is verified by execute_sql_query)
+    rds_client.prewarm()
 
     # Check if this is a retry attempt and handle it accordingly
     if previous_error and error_context:
+        # The SQL cached for this question (if any) may be the one that failed
+        nl_cache.discard(user_query)
         try:
             # Parse the error context from the previous error response
             parsed_error_context = json.loads(error_context)
             generated_sql = parsed_error_context.get("context", {}).get("generated_sql", "")
 
             # Generate an error-aware prompt using the fix_sql_query_error prompt
-            system_prompt = create_error_prompt(
-                user_query=user_query,
-                error_context=parsed_error_context,
-                generated_sql=generated_sql
-            )
-            return json.dumps({
+            with stage("prompt"):
+                system_prompt = create_error_prompt(
+                    user_query=user_query,
+                    error_context=parsed_error_context,
+                    generated_sql=generated_sql
+                )
+            return {
                 "success": True,
                 "message": "Error-aware prompt generated successfully. Use this prompt to generate a new SQL query that fixes the previous SQL generation issue.",
                 "system_prompt": system_prompt,
@@ -143,16 +398,39 @@ async def query_sql_agent(
                     "3. Extract the SQL from the <sql_statement> tags",
                     "4. Call execute_sql_query with the corrected SQL and user_query"
                 ]
-            }, indent=2)
+            }
         except Exception as error:
             logger.error(f"Error generating an error-aware prompt: {str(error)}")
             pass
     
+    # Reuse the SQL query that answered the same question before, skipping generation entirely
+    cached = None
+    if not previous_error:
+        cached = nl_cache.get(user_query)
+        cache_lookups.inc(cache="question", status="miss" if cached is None else "hit")
+    if cached is not None:
+        return {
+            "success": True,
+            "cache_hit": True,
+            "message": "This question was answered before. Call execute_sql_query with the following SQL query:",
+            "sql_query": cached["sql_query"],
+            "match": cached["match"],
+            "similarity": cached["similarity"],
+            "next_step": "Call execute_sql_query with the sql_query above",
+            "user_query": user_query,
+            "instructions": [
+                "1. Call execute_sql_query with the sql_query above and user_query",
+                "2. If it fails, call this tool again with previous_error and error_context to generate new SQL"
+            ]
+        }
+
     # Generate the system prompt and return it to the MCP client
     try:
-        system_prompt = create_system_prompt(user_query=user_query)
-        return json.dumps({
+        with stage("prompt"):
+            system_prompt = create_system_prompt(user_query=user_query)
+        return {
             "success": True,
+            "cache_hit": False,
             "message": "Please use the following prompt to generate SQL, then call execute_sql_query with the result:",
             "system_prompt": system_prompt,
             "next_step": "Call execute_sql_query with the generated SQL",
@@ -162,10 +440,10 @@ async def query_sql_agent(
                 "2. Extract the SQL from the <sql_statement> tags",
                 "3. Call execute_sql_query with the generated SQL and user_query"
             ]
-        }, indent=2)
+        }
     except Exception as error:
         logger.error(f"Error generating system prompt: {str(error)}")
-        return generate_error_response(
+        return build_error_response(
             error_type="sql_generation_error",
             error_message=f"Failed to generate system prompt: {str(error)}",
             user_query=user_query
@@ -173,36 +451,68 @@ async def query_sql_agent(
 
 # MCP tool used to execute a SQL query on the RDS instance and return 
 # the results (uses the generate_sql_query prompt)
-@mcp.tool()
-async def execute_sql_query(sql_query: str, user_query: str = "") -> str:
+@json_tool
+async def execute_sql_query(
+    sql_query: str,
+    user_query: str = "",
+    use_cache: bool = True,
+    page_size: int = 0,
+    page_key: str = "",
+    format: str = "json"
+) -> dict:
     """Execute a SQL query on the database and return the results.
 
     This tool is used to execute pre-generated SQL queries on the database.
     The SQL query should be generated by Claude using the generate_sql_query prompt,
-    based on the database schema and the user's query.
+    based on the database schema and the user's query. Results of identical queries are
+    served from a short-lived cache; the "cache" field of the response reports "hit", "miss" or "bypass".
+
+    Results are limited to a maximum number of rows and bytes. When a result is cut off, "truncated" is
+    true and "total_row_count" is null; use page_size (or a more selective query) to read the rest.
+    Queries without a LIMIT get one (and larger LIMITs are lowered) before they run: "rewritten_sql" is
+    the query that actually ran and "rewrite" describes the change (both null when the query was kept).
+    Queries still running when the request runs out of time are cancelled and fail with a "query_timeout"
+    error: make the query more selective instead of running it again as it is.
+
+    For large results, pass page_size to only return the first page of rows. The response then
+    includes a "next_cursor" (null on the last page) to pass to fetch_next_page for the next page.
+
+    With format "columns", rows are returned as arrays of values under "rows" (in the order of "columns",
+    with the database type of each column in "column_types"), which is much smaller for wide results.
 
     Args:
         sql_query: the SQL query to execute on the database
         user_query: the original natural language query that generated the SQL query for context (optional)
+        use_cache: (optional) set to false to skip the result cache and always query the database for fresh data
+        page_size: (optional) number of rows per page; enables paginated results when greater than 0
+        page_key: (optional) comma separated result column(s) that uniquely identify a row (e.g., "id"), used
+            to page by key instead of by offset when the query has no ORDER BY/LIMIT/OFFSET of its own
+        format: (optional) "json" for rows as objects keyed by column name (default) or "columns" for rows as arrays
     """
-    # Verify the connection to the RDS instance
+    # Verify the connection to the RDS instance (connecting on first use)
+    connection_success, connection_error = await check_connection()
     if not connection_success:
         logger.error(f"Database connection not available: {connection_error}")
-        return json.dumps({
+        return {
             "success": False,
             "error": f"Database service unavailable: {connection_error}",
             "sql_query": sql_query,
             "user_query": user_query,
             "retry_advice": "The database service is currently unavailable. Please try again later.",
             "error_type": "connection_error"
-        }, indent=2)
+        }
+
+    if format not in RESULT_FORMATS:
+        return format_error_response(format, user_query)
 
+    deadline = current_deadline()
     try:
         # Validate the generated SQL query from the query_sql_agent tool
-        is_valid, error = sql_agent.validate_sql(sql_query)
+        with stage("validation"):
+            is_valid, error = sql_agent.validate_sql(sql_query)
         if not is_valid:
             logger.error(f"Invalid SQL query: {error}")
-            return generate_error_response(
+            return build_error_response(
                 error_type="sql_validation_error",
                 error_message=f"Invalid SQL query: {error}",
                 user_query=user_query,
@@ -212,36 +522,70 @@ async def execute_sql_query(sql_query: str, user_query: str = "") -> str:
                     "sql_length": len(sql_query)
                 }
             )
+
+        # Bound the rows the query returns (paginated queries are read a page at a time instead)
+        executed_sql, rewrite = (sql_query, None) if page_size else sql_agent.rewrite_sql(sql_query)
+        if rewrite is not None:
+            logger.info(f"Rewrote SQL query: {rewrite}")
+
+        # Reject queries the database estimates to be too expensive before running them
+        rejection = await check_query_cost(executed_sql, deadline)
+        if rejection is not None:
+            return remember_sql(user_query, sql_query, build_error_response(
+                error_type=rejection["error_type"],
+                error_message=rejection["error"],
+                user_query=user_query,
+                context={"generated_sql": sql_query, "rewritten_sql": executed_sql if rewrite else None, **rejection["context"]}
+            ))
         
-        # Execute the SQL query on the RDS instance and return the results
-        result = rds_client.execute_query(sql_query)
+        # Paginated results are read one page at a time (and aren't cached)
+        if page_size:
+            try:
+                state = start_pagination(sql_query, min(page_size, QUERY_MAX_PAGE_SIZE), page_key, format)
+            except ValueError as error:
+                return build_error_response(
+                    error_type="pagination_error",
+                    error_message=f"Invalid pagination settings: {str(error)}",
+                    user_query=user_query,
+                    context={
+                        "generated_sql": sql_query,
+                        "page_size": page_size,
+                        "page_key": page_key
+                    }
+                )
+            return remember_sql(user_query, sql_query, await execute_page(state, user_query, deadline))
+
+        result, cache_status = await run_query(executed_sql, use_cache, result_format=format, deadline=deadline)
         if not result['success']:
             logger.error(f"Database query failed: {result['error']}")
-            return generate_error_response(
-                error_type="database_error",
+            return remember_sql(user_query, sql_query, build_error_response(
+                error_type=database_error_type(result),
                 error_message=f"Database query failed: {result['error']}",
                 user_query=user_query,
                 context={
                     "generated_sql": sql_query,
+                    "rewritten_sql": executed_sql if rewrite else None,
                     "database_error": result['error'],
                     "error_code": result.get('error_code', 'unknown'),
                     "query_type": "SELECT"
                 }
-            )
+            ))
         
         # Return the results of the SQL query to the MCP client
-        return json.dumps({
+        return remember_sql(user_query, sql_query, {
             "success": True,
             "user_query": user_query,
             "generated_sql": sql_query,
+            "rewritten_sql": executed_sql if rewrite else None,
+            "rewrite": rewrite,
             "validation_passed": True,
-            "data": result['data'],
-            "row_count": result['row_count'],
-            "columns": result['columns'],
-        }, indent=2, default=str)
+            **result_rows(result),
+            **result_counts(result, rewrite),
+            "cache": cache_status,
+        })
     except Exception as error:
         logger.error(f"Unexpected error in execute_sql_query: {str(error)}")
-        return generate_error_response(
+        return build_error_response(
             error_type="sql_generation_error",
             error_message=f"Unexpected error: {str(error)}",
             user_query=user_query,
@@ -252,6 +596,365 @@ async def execute_sql_query(sql_query: str, user_query: str = "") -> str:
             }
         )
 
+# MCP tool used to read the next page of a paginated SQL query
+@json_tool
+async def fetch_next_page(cursor: str, user_query: str = "") -> dict:
+    """Fetch the next page of results of a paginated SQL query.
+
+    This tool is used after execute_sql_query was called with a page_size. Pass the "next_cursor"
+    value from the previous response to get the following page of rows; the SQL query is not
+    generated again. A response with a null "next_cursor" contains the last page.
+
+    Args:
+        cursor: the next_cursor value returned by execute_sql_query or by a previous fetch_next_page call
+        user_query: the original natural language query that generated the SQL query for context (optional)
+    """
+    # Verify the connection to the RDS instance (connecting on first use)
+    connection_success, connection_error = await check_connection()
+    if not connection_success:
+        logger.error(f"Database connection not available: {connection_error}")
+        return {
+            "success": False,
+            "error": f"Database service unavailable: {connection_error}",
+            "user_query": user_query,
+            "retry_advice": "The database service is currently unavailable. Please try again later.",
+            "error_type": "connection_error"
+        }
+
+    try:
+        state = decode_cursor(cursor, PAGINATION_CURSOR_SECRET)
+    except ValueError as error:
+        logger.error(f"Invalid pagination cursor: {error}")
+        return build_error_response(
+            error_type="pagination_error",
+            error_message=f"Invalid pagination cursor: {str(error)}",
+            user_query=user_query,
+            context={"cursor_length": len(cursor or "")}
+        )
+
+    try:
+        # The SQL query of a signed cursor passed validation and the cost gate on the first page;
+        # both run again (memoized) in case the validator or the limits changed since
+        with stage("validation"):
+            is_valid, error = sql_agent.validate_sql(state["sql"])
+        if not is_valid:
+            logger.error(f"Invalid SQL query in pagination cursor: {error}")
+            return build_error_response(
+                error_type="sql_validation_error",
+                error_message=f"Invalid SQL query: {error}",
+                user_query=user_query,
+                context={
+                    "generated_sql": state["sql"],
+                    "validation_error": error,
+                    "sql_length": len(state["sql"])
+                }
+            )
+
+        # Plans are cached: a query that already passed the cost gate isn't explained again for the
+        # following pages
+        deadline = current_deadline()
+        rejection = await check_query_cost(state["sql"], deadline)
+        if rejection is not None:
+            return build_error_response(
+                error_type=rejection["error_type"],
+                error_message=rejection["error"],
+                user_query=user_query,
+                context={"generated_sql": state["sql"], **rejection["context"]}
+            )
+
+        state["size"] = min(state["size"], QUERY_MAX_PAGE_SIZE)
+        return await execute_page(state, user_query, deadline)
+    except Exception as error:
+        logger.error(f"Unexpected error in fetch_next_page: {str(error)}")
+        return build_error_response(
+            error_type="sql_generation_error",
+            error_message=f"Unexpected error: {str(error)}",
+            user_query=user_query,
+            context={
+                "generated_sql": state["sql"],
+                "error_details": str(error),
+                "operation": "sql_query_pagination"
+            }
+        )
+
+# MCP tool used to execute several independent SQL queries concurrently in a single call
+@json_tool
+async def execute_sql_batch(
+    sql_queries: list[str],
+    user_query: str = "",
+    use_cache: bool = True,
+    format: str = "json"
+) -> dict:
+    """Execute several independent SQL queries on the database at once and return all of their results.
+
+    Use this tool instead of repeated execute_sql_query calls when answering a question needs multiple
+    queries that don't depend on each other (e.g., counts per status, per priority and per category).
+    Every query is validated and the valid ones run concurrently. The "results" list follows the order of
+    sql_queries, and each entry has either the rows of its query or the error it failed with.
+
+    Args:
+        sql_queries: the SQL queries to execute on the database
+        user_query: the original natural language query that generated the SQL queries for context (optional)
+        use_cache: (optional) set to false to skip the result cache and always query the database for fresh data
+        format: (optional) "json" for rows as objects keyed by column name (default) or "columns" for rows as arrays
+    """
+    # Verify the connection to the RDS instance (connecting on first use)
+    connection_success, connection_error = await check_connection()
+    if not connection_success:
+        logger.error(f"Database connection not available: {connection_error}")
+        return {
+            "success": False,
+            "error": f"Database service unavailable: {connection_error}",
+            "sql_queries": sql_queries,
+            "user_query": user_query,
+            "retry_advice": "The database service is currently unavailable. Please try again later.",
+            "error_type": "connection_error"
+        }
+
+    if format not in RESULT_FORMATS:
+        return format_error_response(format, user_query)
+
+    if not sql_queries or len(sql_queries) > QUERY_BATCH_MAX_QUERIES:
+        return build_error_response(
+            error_type="batch_error",
+            error_message=f"A batch must contain between 1 and {QUERY_BATCH_MAX_QUERIES} SQL queries",
+            user_query=user_query,
+            context={"query_count": len(sql_queries or [])}
+        )
+
+    # The queries share the byte budget so the combined response stays within the response size limits
+    semaphore = asyncio.Semaphore(QUERY_BATCH_CONCURRENCY)
+    max_bytes = QUERY_MAX_BYTES // len(sql_queries)
+    deadline = current_deadline()
+
+    async def run_batch_query(sql_query: str) -> dict:
+        try:
+            with stage("validation"):
+                is_valid, error = sql_agent.validate_sql(sql_query)
+            if not is_valid:
+                logger.error(f"Invalid SQL query in batch: {error}")
+                return {
+                    "success": False,
+                    "sql_query": sql_query,
+                    "error_type": "sql_validation_error",
+                    "error": f"Invalid SQL query: {error}"
+                }
+
+            executed_sql, rewrite = sql_agent.rewrite_sql(sql_query)
+            async with semaphore:
+                rejection = await check_query_cost(executed_sql, deadline)
+                if rejection is not None:
+                    return {
+                        "success": False,
+                        "sql_query": sql_query,
+                        "rewritten_sql": executed_sql if rewrite else None,
+                        "error_type": rejection["error_type"],
+                        "error": rejection["error"],
+                        **rejection["context"]
+                    }
+                result, cache_status = await run_query(
+                    executed_sql, use_cache, max_bytes=max_bytes, result_format=format, deadline=deadline
+                )
+            if not result['success']:
+                logger.error(f"Database query failed: {result['error']}")
+                return {
+                    "success": False,
+                    "sql_query": sql_query,
+                    "rewritten_sql": executed_sql if rewrite else None,
+                    "error_type": database_error_type(result),
+                    "error": f"Database query failed: {result['error']}",
+                    "error_code": result.get('error_code', 'unknown')
+                }
+
+            return {
+                "success": True,
+                "sql_query": sql_query,
+                "rewritten_sql": executed_sql if rewrite else None,
+                "rewrite": rewrite,
+                **result_rows(result),
+                **result_counts(result, rewrite),
+                "cache": cache_status
+            }
+        except Exception as error:
+            logger.error(f"Unexpected error in execute_sql_batch: {str(error)}")
+            return {
+                "success": False,
+                "sql_query": sql_query,
+                "error_type": "sql_generation_error",
+                "error": f"Unexpected error: {str(error)}"
+            }
+
+    results = await asyncio.gather(*(run_batch_query(sql_query) for sql_query in sql_queries))
+    failed_count = sum(1 for result in results if not result["success"])
+    return {
+        "success": failed_count == 0,
+        "user_query": user_query,
+        "query_count": len(results),
+        "failed_count": failed_count,
+        "results": results,
+    }
+
+# Executes a validated SQL query, serving the results from the cache when possible. Only complete
+# (untruncated) results are cached. Returns the result and the cache status ("hit", "miss" or "bypass")
+async def run_query(
+    sql_query: str,
+    use_cache: bool,
+    max_bytes: int = QUERY_MAX_BYTES,
+    result_format: str = "json",
+    deadline: Optional[float] = None
+) -> tuple[dict, str]:
+    if use_cache:
+        result = query_cache.get(sql_query, variant=result_format)
+        if result is not None:
+            cache_lookups.inc(cache="result", status="hit")
+            return result, "hit"
+
+    cache_status = "miss" if use_cache else "bypass"
+    cache_lookups.inc(cache="result", status=cache_status)
+    with stage("database"):
+        result = await rds_client.execute_query_async(
+            sql_query, max_rows=QUERY_MAX_ROWS, max_bytes=max_bytes, result_format=result_format, deadline=deadline
+        )
+    if use_cache and result['success'] and not result['truncated']:
+        query_cache.put(sql_query, result, tables=sql_agent.extract_tables(sql_query), variant=result_format)
+    return result, cache_status
+
+# Drops the cached results of every query reading from any of the given tables. The server only
+# reads, so this is the hook for whatever writes to the database (e.g. a data load calling
+# POST /cache/invalidate of the HTTP adapter)
+def invalidate_cached_tables(tables: list) -> dict:
+    removed = query_cache.invalidate_tables(tables)
+    logger.info(f"Invalidated {removed} cached results of tables {sorted(tables)}")
+    return {"success": True, "tables": sorted(tables), "invalidated_count": removed}
+
+# Returns the response fields holding the rows of a query result in its format
+def result_rows(result: dict) -> dict:
+    if result['format'] == "columns":
+        return {"columns": result['columns'], "column_types": result['column_types'], "rows": result['data']}
+    return {"data": result['data'], "columns": result['columns']}
+
+# Returns the row counts of a result. A result that fills the LIMIT added by the rewrite is reported
+# as truncated, since the query may have had more rows
+def result_counts(result: dict, rewrite: Optional[str]) -> dict:
+    limited = rewrite is not None and 0 < sql_agent.max_limit <= result['row_count']
+    return {
+        "row_count": result['row_count'],
+        "total_row_count": None if limited else result['total_row_count'],
+        "truncated": result['truncated'] or limited
+    }
+
+# Returns the error response for an unknown result format
+def format_error_response(result_format: str, user_query: str) -> dict:
+    logger.error(f"Invalid result format: {result_format}")
+    return build_error_response(
+        error_type="format_error",
+        error_message=f"Invalid result format: {result_format}",
+        user_query=user_query,
+        context={"format": result_format, "supported_formats": list(RESULT_FORMATS)}
+    )
+
+# Remembers the SQL query that answered the question (or forgets it when the database rejected
+# it), so the next query_sql_agent call for the same question can reuse it. Returns the response
+def remember_sql(user_query: str, sql_query: str, response: dict) -> dict:
+    if user_query:
+        if response["success"]:
+            nl_cache.put(user_query, sql_query)
+        elif response.get("error_type") in ("database_error", "query_cost_exceeded", "query_timeout"):
+            nl_cache.discard(user_query)
+    return response
+
+# Runs the cost gate on a validated SQL query when it is enabled. Returns None when the query may
+# run, or {"error_type", "error", "context"} when it is rejected (or can't be planned, in which
+# case it would have failed anyway)
+async def check_query_cost(sql_query: str, deadline: Optional[float] = None) -> Optional[dict]:
+    if not cost_gate.enabled:
+        return None
+
+    summary = cost_gate.get(sql_query)
+    if summary is None:
+        with stage("explain"):
+            result = await rds_client.explain_query_async(sql_query, deadline=deadline)
+        if not result['success']:
+            logger.error(f"Query planning failed: {result['error']}")
+            return {
+                "error_type": database_error_type(result),
+                "error": f"Database query failed: {result['error']}",
+                "context": {
+                    "database_error": result['error'],
+                    "error_code": result.get('error_code', 'unknown'),
+                    "query_type": "SELECT"
+                }
+            }
+        summary = summarize_plan(result['plan'])
+        cost_gate.put(sql_query, summary)
+
+    reason = cost_gate.check(summary)
+    if reason is None:
+        return None
+    logger.warning(f"Query rejected by the cost gate: {reason}")
+    return {
+        "error_type": "query_cost_exceeded",
+        "error": f"Query rejected before execution: {reason}",
+        "context": {
+            "estimated_cost": summary["total_cost"],
+            "estimated_rows": summary["plan_rows"],
+            "max_cost": cost_gate.max_cost or None,
+            "max_rows": cost_gate.max_rows or None,
+            "hot_nodes": summary["hot_nodes"]
+        }
+    }
+
+# Returns the error type of a failed query: failures while the database resumes are reported
+# apart from SQL errors so the client runs the same query again instead of rewriting it, and
+# queries cancelled at the deadline so the client narrows them down
+def database_error_type(result: dict) -> str:
+    if result.get("timed_out"):
+        return "query_timeout"
+    return "database_resuming" if result.get("resuming") else "database_error"
+
+# Executes one page of a validated SQL query and returns the page along with the cursor of the next one
+async def execute_page(state: dict, user_query: str, deadline: Optional[float] = None) -> dict:
+    page_query, parameters = build_page_query(state)
+    # Pages are already bounded by their size, so only the byte budget applies
+    with stage("database"):
+        result = await rds_client.execute_query_async(
+            page_query, parameters=parameters, max_bytes=QUERY_MAX_BYTES, result_format=state["format"], deadline=deadline
+        )
+    if not result['success']:
+        logger.error(f"Database query failed: {result['error']}")
+        return build_error_response(
+            error_type=database_error_type(result),
+            error_message=f"Database query failed: {result['error']}",
+            user_query=user_query,
+            context={
+                "generated_sql": state["sql"],
+                "database_error": result['error'],
+                "error_code": result.get('error_code', 'unknown'),
+                "query_type": "SELECT"
+            }
+        )
+
+    rows, next_state = paginate_rows(
+        state, result['data'], truncated=result['truncated'], columns=result['columns']
+    )
+    return {
+        "success": True,
+        "user_query": user_query,
+        "generated_sql": state["sql"],
+        "validation_passed": True,
+        **result_rows(dict(result, data=rows)),
+        "row_count": len(rows),
+        "truncated": result['truncated'],
+        "cache": "bypass",
+        "page": {
+            "offset": state["offset"],
+            "size": state["size"],
+            "mode": pagination_mode(state),
+            "has_more": next_state is not None
+        },
+        "next_cursor": encode_cursor(next_state, PAGINATION_CURSOR_SECRET) if next_state else None,
+    }
+
 # Run the MCP server on local machine using stdio transport
 if __name__ == "__main__":
     logger.info("Starting MCP server...")
@@ -0,0 +1,259 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, TextIO
+
+# Histogram buckets (upper bounds) for durations in seconds, row counts and sizes in bytes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 250, 500, 1000, 5000)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Most values a metric may hold in one embedded metric format record (a CloudWatch limit)
+EMF_MAX_VALUES = 100
+
+# Escapes a label value for the Prometheus text format
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+# Formats a number for the Prometheus text format (integers without a decimal point)
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+# Formats the labels of a sample, e.g. {tool="execute_sql_query",stage="database"}
+def format_labels(names: tuple, values: tuple, extra: Optional[tuple] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(str(value))}"' for name, value in pairs) + "}"
+
+# A named metric with a fixed set of label names. Values are kept per label values for the
+# Prometheus endpoint, and handed to the registry for the embedded metric format when enabled
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, label_names: tuple = (), unit: str = "None"):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.unit = unit
+        self._lock = threading.Lock()
+
+    # Returns the label values of a sample in the order of the label names (missing labels are empty)
+    def label_values(self, labels: Dict[str, str]) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    # Returns the lines of the metric in the Prometheus text format
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+# Monotonic counter (e.g. cache lookups or errors per type)
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self.label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self.registry.record(self, key, amount)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self.label_values(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{format_labels(self.label_names, key)} {format_value(value)}" for key, value in values]
+
+# Distribution of observed values over fixed buckets, with their sum and count
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: tuple = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: [count per bucket (not cumulative, the last one is +Inf), sum, count]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self.label_values(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+        self.registry.record(self, key, value)
+
+    # Observes the time spent in the with block, in seconds
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    # Returns the number of values observed and their sum
+    def totals(self, **labels) -> tuple[int, float]:
+        with self._lock:
+            state = self._values.get(self.label_values(labels))
+            return (state[2], state[1]) if state else (0, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, [list(state[0]), state[1], state[2]]) for key, state in self._values.items())
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = format_labels(self.label_names, key, ("le", format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+# Current values read from a callback each time the metrics are rendered (e.g. the stats() of a
+# cache), as {label values: value}. They aren't observed, so none go to the embedded metric format
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, collect: Callable[[], Dict[tuple, float]], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        values = sorted(self.collect().items())
+        return [f"{self.name}{format_labels(self.label_names, key)} {format_value(value)}" for key, value in values]
+
+# Returns the numbers of a stats() dict keyed on their name, for a gauge with a single "stat" label.
+# Nested dicts are flattened (e.g. {"queue_wait": {"avg_ms": 1}} gives "queue_wait_avg_ms"),
+# booleans count as 0/1 and other values (None, strings) are left out
+def stats_values(stats: Dict[str, Any], prefix: str = "") -> Dict[tuple, float]:
+    values = {}
+    for name, value in stats.items():
+        if isinstance(value, dict):
+            values.update(stats_values(value, f"{prefix}{name}_"))
+        elif isinstance(value, (int, float)):
+            values[(prefix + name,)] = float(value)
+    return values
+
+# In-process metrics of the server. render() returns every metric in the Prometheus text format
+# (for a scraper of the /metrics endpoint); with emf enabled, the values observed since the last
+# flush_emf() are also written as CloudWatch embedded metric format log lines (on Lambda, where
+# nothing scrapes the endpoint), one line per set of dimensions
+class MetricsRegistry:
+    def __init__(self, namespace: str = "SQLAgentMCP", emf: bool = False):
+        self.namespace = namespace
+        self.emf = emf
+        self._metrics: Dict[str, Metric] = {}
+        self._pending: Dict[tuple, Dict[str, list]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, label_names: tuple = (), unit: str = "Count") -> Counter:
+        return self._add(Counter(self, name, help, label_names, unit=unit))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        label_names: tuple = (),
+        buckets: tuple = LATENCY_BUCKETS,
+        unit: str = "Seconds"
+    ) -> Histogram:
+        return self._add(Histogram(self, name, help, label_names, unit=unit, buckets=buckets))
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        collect: Callable[[], Dict[tuple, float]],
+        label_names: tuple = (),
+        unit: str = "None"
+    ) -> Gauge:
+        return self._add(Gauge(self, name, help, label_names, unit=unit, collect=collect))
+
+    def _add(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    # Keeps a value of the metric for the next embedded metric format flush
+    def record(self, metric: Metric, label_values: tuple, value: float) -> None:
+        if not self.emf:
+            return
+        dimensions = tuple(zip(metric.label_names, label_values))
+        with self._lock:
+            values = self._pending.setdefault(dimensions, {}).setdefault(metric.name, [])
+            values.append(value)
+
+    # Returns every metric in the Prometheus text exposition format
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    # Returns the embedded metric format records of the values observed since the last flush and
+    # forgets them. Metrics with more values than a record can hold are split over several records
+    def emf_records(self) -> List[dict]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            units = {name: metric.unit for name, metric in self._metrics.items()}
+
+        timestamp = int(time.time() * 1000)
+        records = []
+        for dimensions, values in pending.items():
+            for start in range(0, max(len(v) for v in values.values()), EMF_MAX_VALUES):
+                chunk = {name: v[start:start + EMF_MAX_VALUES] for name, v in values.items() if len(v) > start}
+                record = {
+                    "_aws": {
+                        "Timestamp": timestamp,
+                        "CloudWatchMetrics": [{
+                            "Namespace": self.namespace,
+                            "Dimensions": [[name for name, _ in dimensions]],
+                            "Metrics": [{"Name": name, "Unit": units.get(name, "None")} for name in chunk]
+                        }]
+                    }
+                }
+                record.update(dimensions)
+                record.update({name: v[0] if len(v) == 1 else v for name, v in chunk.items()})
+                records.append(record)
+        return records
+
+    # Writes the pending embedded metric format records as JSON lines (CloudWatch Logs extracts
+    # the metrics from them) and returns how many were written
+    def flush_emf(self, stream: Optional[TextIO] = None) -> int:
+        if not self.emf:
+            return 0
+        records = self.emf_records()
+        stream = stream or sys.stdout
+        for record in records:
+            stream.write(json.dumps(record, separators=(",", ":")) + "\n")
+        stream.flush()
+        return len(records)
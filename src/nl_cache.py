@@ -0,0 +1,202 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from schema_index import extract_words
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# Literals of a question that can change between otherwise identical questions (dates first,
+# so their digits aren't taken for numbers)
+LITERAL_PATTERN = re.compile(
+    r"(?P<date>\b\d{4}-\d{2}-\d{2}\b)"
+    r"|(?P<str>'[^']*'|\"[^\"]*\")"
+    r"|(?P<num>(?<![\w.])\d+(?:\.\d+)?(?![\w.]))"
+)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+GUARD_WORD_PATTERN = re.compile(r"[a-z]+(?:'t)?")
+
+# Words that flip or bound the meaning of a question without changing its other words (negations,
+# comparisons, orderings, quantities): two questions are only similar if they use the same ones
+GUARD_WORDS = frozenset([
+    "not", "no", "non", "never", "none", "nor", "without", "except", "excluding", "exclude", "cannot", "unless",
+    "more", "less", "fewer", "greater", "smaller", "than", "above", "below", "over", "under", "between",
+    "before", "after", "since", "until", "older", "newer", "earlier", "later", "higher", "lower",
+    "most", "least", "top", "bottom", "first", "last", "min", "max", "minimum", "maximum", "earliest", "latest",
+    "oldest", "newest", "highest", "lowest", "asc", "desc", "ascending", "descending", "only", "all", "any",
+    "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "eleven", "twelve", "twenty",
+    "hundred", "thousand", "million", "dozen", "single", "double", "half", "once", "twice"
+])
+
+# A question turned into a template (literals replaced by their kind) along with its literals
+class QuestionTemplate:
+    __slots__ = ("key", "words", "guards", "kinds", "values")
+
+    def __init__(self, question: str):
+        text = WHITESPACE_PATTERN.sub(" ", question.strip()).strip(" ?.!;")
+        self.kinds = []
+        self.values = []
+
+        # Literals keep their case, the rest of the question is case-insensitive
+        def replace(match: re.Match) -> str:
+            self.kinds.append(match.lastgroup)
+            self.values.append(match.group())
+            return f"<{match.lastgroup}>"
+
+        self.key = LITERAL_PATTERN.sub(replace, text).lower()
+        self.words = frozenset(extract_words(LITERAL_PATTERN.sub(" ", text)))
+        self.guards = frozenset(
+            word for word in GUARD_WORD_PATTERN.findall(text.lower()) if word in GUARD_WORDS or word.endswith("n't")
+        )
+
+# A cached SQL query; literals of the question that appear exactly once in the SQL are stored
+# as {slotN} markers and filled with the literals of the new question on a hit
+class NLCacheEntry:
+    __slots__ = ("key", "schema_hash", "template", "sql_template", "slotted")
+
+    def __init__(self, key: str, schema_hash: str, template: QuestionTemplate, sql_template: str, slotted: List[int]):
+        self.key = key
+        self.schema_hash = schema_hash
+        self.template = template
+        self.sql_template = sql_template
+        self.slotted = slotted
+
+# In-process cache mapping normalized user questions to the last SQL query that validated and
+# executed successfully for them. Questions are matched exactly (modulo IDs, dates and quoted
+# values) first, then by word similarity when a threshold is set (off by default: a bag of words
+# can't tell a question from its opposite, so similar questions must also share every negation,
+# comparison and number word). Entries are keyed on the hash of the schema too, so SQL generated
+# for another schema is never reused. Bounded in entries (LRU)
+class NLQueryCache:
+    def __init__(self, max_entries: int = 512, similarity_threshold: float = 0.0, schema_hash: str = ""):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.schema_hash = schema_hash
+        self._entries: "OrderedDict[str, NLCacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    # Returns the cached SQL query for the question as {"sql_query", "match", "similarity"}
+    # (match is "exact" or "similar"), or None when there is no usable entry
+    def get(self, question: str) -> Optional[Dict[str, Any]]:
+        if self.max_entries <= 0 or not question:
+            return None
+
+        template = QuestionTemplate(question)
+        with self._lock:
+            entry = self._entries.get(self._key(template))
+            match, similarity = "exact", 1.0
+            if entry is None and 0 < self.similarity_threshold <= 1:
+                entry, similarity = self._most_similar(template)
+                match = "similar"
+            if entry is None:
+                self.misses += 1
+                return None
+
+            sql_query = self._fill(entry, template)
+            if sql_query is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry.key)
+            if match == "exact":
+                self.hits += 1
+            else:
+                self.similar_hits += 1
+        return {"sql_query": sql_query, "match": match, "similarity": round(similarity, 3)}
+
+    # Stores the SQL query that answered the question successfully
+    def put(self, question: str, sql_query: str) -> bool:
+        if self.max_entries <= 0 or not question or not sql_query:
+            return False
+
+        template = QuestionTemplate(question)
+        sql_template = sql_query.replace("{", "{{").replace("}", "}}")
+        slotted = []
+        for i, value in enumerate(template.values):
+            literal = value[1:-1] if template.kinds[i] == "str" else value
+            pattern = re.compile(rf"(?<![\w.]){re.escape(literal)}(?![\w.])") if literal else None
+            if pattern is not None and len(pattern.findall(sql_template)) == 1:
+                sql_template = pattern.sub(f"{{slot{i}}}", sql_template)
+                slotted.append(i)
+
+        with self._lock:
+            key = self._key(template)
+            self._entries[key] = NLCacheEntry(key, self.schema_hash, template, sql_template, slotted)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    # Drops the entry of the question (e.g. when its cached SQL query failed)
+    def discard(self, question: str) -> bool:
+        template = QuestionTemplate(question)
+        with self._lock:
+            return self._entries.pop(self._key(template), None) is not None
+
+    # Drops every entry
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    # Returns counters describing the current state of the cache
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "similarity_threshold": self.similarity_threshold,
+                "schema_hash": self.schema_hash[:12],
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses
+            }
+
+    # Returns the key of the question's entry for the current schema
+    def _key(self, template: QuestionTemplate) -> str:
+        return f"{self.schema_hash}:{template.key}"
+
+    # Returns the entry of the current schema whose question is most similar (Jaccard similarity of
+    # the words, with the same kinds of literals in the same order and the same guard words) if it
+    # reaches the threshold (caller must hold the lock)
+    def _most_similar(self, template: QuestionTemplate) -> tuple[Optional[NLCacheEntry], float]:
+        best, best_similarity = None, 0.0
+        for entry in self._entries.values():
+            if entry.schema_hash != self.schema_hash:
+                continue
+            if entry.template.kinds != template.kinds or entry.template.guards != template.guards:
+                continue
+            if not (entry.template.words or template.words):
+                continue
+            words = entry.template.words
+            similarity = len(words & template.words) / len(words | template.words)
+            if similarity > best_similarity:
+                best, best_similarity = entry, similarity
+        if best is None or best_similarity < self.similarity_threshold:
+            return None, 0.0
+        return best, best_similarity
+
+    # Builds the SQL query of the entry for the literals of the new question. Returns None when a
+    # literal that isn't a slot of the cached SQL differs, since the SQL doesn't depend on it visibly
+    @staticmethod
+    def _fill(entry: NLCacheEntry, template: QuestionTemplate) -> Optional[str]:
+        values = {}
+        for i, kind in enumerate(template.kinds):
+            value = template.values[i]
+            if i not in entry.slotted:
+                if value != entry.template.values[i]:
+                    return None
+                continue
+            if kind == "str":
+                # The value replaces the contents of a SQL string literal, so its quotes are escaped
+                value = value[1:-1].replace("'", "''")
+            values[f"slot{i}"] = value
+        return entry.sql_template.format(**values)
@@ -0,0 +1,212 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import re
+from typing import Dict, Any, Optional
+
+from rds_client import RESULT_FORMATS
+from sql_validator import analyze_sql
+
+CURSOR_VERSION = 2
+
+# Columns used as keyset pagination keys must be plain identifiers (they are quoted into the SQL)
+PAGE_KEY_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# Top-level LIMIT / OFFSET / FETCH clauses of a query paged by offset (read at the position the
+# analysis found the keyword at). Only plain counts can be combined with the page's own bounds,
+# and a clause only ends where the next one (or the statement) starts
+CLAUSE_END = r"(?=(?:\s+|--[^\n]*|/\*.*?\*/)*(?:\Z|LIMIT\b|OFFSET\b|FETCH\b))"
+LIMIT_CLAUSE_PATTERN = re.compile(r"LIMIT\s+(?P<count>\d+|ALL)" + CLAUSE_END, re.IGNORECASE | re.DOTALL)
+OFFSET_CLAUSE_PATTERN = re.compile(r"OFFSET\s+(?P<count>\d+)(?:\s+ROWS?)?" + CLAUSE_END, re.IGNORECASE | re.DOTALL)
+FETCH_CLAUSE_PATTERN = re.compile(
+    r"FETCH\s+(?:FIRST|NEXT)\s+(?P<count>\d+)?\s*ROWS?\s+ONLY" + CLAUSE_END, re.IGNORECASE | re.DOTALL
+)
+
+# Splits a validated query into its statement without the trailing semicolon and top-level
+# LIMIT/OFFSET/FETCH clauses, the most rows those clauses return (None for no limit) and the rows
+# they skip. Raises ValueError when a clause isn't a plain count (e.g. an expression or WITH TIES)
+def split_row_bounds(sql_query: str) -> tuple[str, Optional[int], int]:
+    analysis = analyze_sql(sql_query)
+    end = analysis.terminator if analysis.terminator is not None else len(sql_query)
+    body = sql_query[:end].rstrip()
+
+    limit, skip = None, 0
+    positions = [
+        analysis.top_level_clauses[keyword] for keyword in ("LIMIT", "OFFSET", "FETCH")
+        if keyword in analysis.top_level_clauses
+    ]
+    for position in positions:
+        match = (
+            LIMIT_CLAUSE_PATTERN.match(body, position)
+            or OFFSET_CLAUSE_PATTERN.match(body, position)
+            or FETCH_CLAUSE_PATTERN.match(body, position)
+        )
+        if match is None:
+            raise ValueError("The query's own LIMIT, OFFSET or FETCH must be a plain row count to paginate it")
+        count = match.group("count")
+        if match.re is OFFSET_CLAUSE_PATTERN:
+            skip = int(count)
+        elif count != "ALL":
+            limit = int(count or 1)
+    if positions:
+        body = body[:min(positions)].rstrip()
+    return body, limit, skip
+
+# Creates the pagination state for the first page of a validated SELECT query. Keyset pagination
+# is used when a unique key column is given and the query doesn't define its own ordering or
+# limits (so rows are ordered by the key); otherwise pages are read with LIMIT/OFFSET, which needs
+# the query's own ORDER BY
+def start_pagination(
+    sql_query: str,
+    page_size: int,
+    page_key: str = "",
+    result_format: str = "json"
+) -> Dict[str, Any]:
+    if page_size <= 0:
+        raise ValueError("Page size must be a positive number")
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Invalid result format: {result_format}")
+
+    key = [column.strip() for column in (page_key or "").split(",") if column.strip()]
+    for column in key:
+        if not PAGE_KEY_PATTERN.match(column):
+            raise ValueError(f"Invalid page key column: {column}")
+    clauses = analyze_sql(sql_query).top_level_clauses
+    if key and clauses:
+        key = []
+    # Without an order the database may return the rows differently for each page, so pages
+    # read by offset could repeat some rows and skip others
+    if not key and "ORDER" not in clauses:
+        raise ValueError(
+            "A query without a top-level ORDER BY can only be paginated by a unique page_key column "
+            "(and without a LIMIT, OFFSET or FETCH of its own)"
+        )
+    if not key:
+        split_row_bounds(sql_query)
+
+    return {
+        "v": CURSOR_VERSION,
+        "sql": sql_query,
+        "size": page_size,
+        "key": key,
+        "after": None,
+        "offset": 0,
+        "format": result_format
+    }
+
+# Returns "keyset" or "offset" depending on how the page described by the state is read
+def pagination_mode(state: Dict[str, Any]) -> str:
+    return "keyset" if state["key"] and (state["after"] is not None or state["offset"] == 0) else "offset"
+
+# Returns the base64 (URL-safe, unpadded) encoding of the bytes
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+# Decodes a base64 string of _b64encode
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode((text + "=" * (-len(text) % 4)).encode("ascii"))
+
+# Returns the HMAC-SHA256 signature of a cursor payload
+def _sign(payload: str, secret: bytes) -> str:
+    return _b64encode(hmac.new(secret, payload.encode("utf-8"), hashlib.sha256).digest())
+
+# Encodes the pagination state into an opaque, URL-safe cursor string, signed with the secret so
+# the SQL query it carries can't be changed by the client
+def encode_cursor(state: Dict[str, Any], secret: bytes) -> str:
+    payload = _b64encode(json.dumps(state, separators=(",", ":"), default=str).encode("utf-8"))
+    return f"{payload}.{_sign(payload, secret)}"
+
+# Decodes a cursor created by encode_cursor with the same secret (raises ValueError if it is
+# malformed or its signature doesn't match)
+def decode_cursor(cursor: str, secret: bytes) -> Dict[str, Any]:
+    payload, _, signature = (cursor or "").strip().partition(".")
+    if not hmac.compare_digest(_sign(payload, secret).encode("ascii"), signature.encode("utf-8")):
+        raise ValueError("Pagination cursor signature mismatch")
+    try:
+        state = json.loads(_b64decode(payload))
+    except (AttributeError, binascii.Error, UnicodeError, ValueError) as error:
+        raise ValueError("Malformed pagination cursor") from error
+
+    if not isinstance(state, dict) or state.get("v") != CURSOR_VERSION:
+        raise ValueError("Unsupported pagination cursor")
+
+    key = state.get("key")
+    after = state.get("after")
+    if (
+        not isinstance(state.get("sql"), str)
+        or not isinstance(state.get("size"), int) or state["size"] <= 0
+        or not isinstance(state.get("offset"), int) or state["offset"] < 0
+        or not isinstance(key, list)
+        or not all(isinstance(column, str) and PAGE_KEY_PATTERN.match(column) for column in key)
+        or not (after is None or (isinstance(after, list) and len(after) == len(key)))
+        or state.setdefault("format", "json") not in RESULT_FORMATS
+    ):
+        raise ValueError("Invalid pagination cursor")
+    return state
+
+# Builds the SQL (and its parameters) that reads the page described by the state. Pages read by
+# key wrap the query and order it by the key; pages read by offset add LIMIT/OFFSET to the query
+# itself so its own ORDER BY orders the rows (the bounds of the query's own LIMIT/OFFSET/FETCH
+# are combined with the page's)
+def build_page_query(state: Dict[str, Any]) -> tuple[str, Dict[str, Any]]:
+    # One extra row tells whether another page exists without counting the whole result
+    page_rows = state["size"] + 1
+
+    if not state["key"]:
+        body, limit, skip = split_row_bounds(state["sql"])
+        if limit is not None:
+            page_rows = max(min(page_rows, limit - state["offset"]), 0)
+        # A line comment at the end of the query would swallow the clauses
+        separator = "\n" if "--" in body.rsplit("\n", 1)[-1] else " "
+        page_query = f"{body}{separator}LIMIT {page_rows}"
+        if skip + state["offset"]:
+            page_query += f" OFFSET {skip + state['offset']}"
+        return page_query, {}
+
+    # The query is validated as a single statement, so a semicolon can only be trailing
+    body = state["sql"].strip()
+    if body.endswith(";"):
+        body = body[:-1]
+
+    # Line breaks keep a trailing "--" comment from swallowing the closing parenthesis
+    page_query = f"SELECT * FROM (\n{body}\n) AS page_source"
+    parameters = {}
+
+    key_columns = ", ".join(f'"{column}"' for column in state["key"])
+    if pagination_mode(state) == "keyset" and state["after"] is not None:
+        placeholders = ", ".join(f":page_key_{i}" for i in range(len(state["key"])))
+        page_query += f" WHERE ({key_columns}) > ({placeholders})"
+        parameters = {f"page_key_{i}": value for i, value in enumerate(state["after"])}
+    page_query += f" ORDER BY {key_columns} LIMIT {page_rows}"
+    if pagination_mode(state) == "offset" and state["offset"]:
+        page_query += f" OFFSET {state['offset']}"
+    return page_query, parameters
+
+# Splits the fetched rows into the current page and the state of the next page (None on the last page).
+# When the rows were truncated by the response budget, the next page starts after the last row read.
+# Rows of the "columns" format are arrays, so their result columns are needed to find the key values
+def paginate_rows(
+    state: Dict[str, Any],
+    rows: list,
+    truncated: bool = False,
+    columns: list = None
+) -> tuple[list, Optional[Dict[str, Any]]]:
+    if len(rows) <= state["size"] and not (truncated and rows):
+        return rows, None
+
+    page_rows = rows[:state["size"]]
+    next_state = dict(state, offset=state["offset"] + len(page_rows), after=None)
+
+    # Keep reading by key while the last row has a complete key (NULL keys fall back to offsets)
+    if pagination_mode(state) == "keyset":
+        last_row = page_rows[-1]
+        if isinstance(last_row, dict):
+            values = [last_row.get(column) for column in state["key"]]
+        else:
+            positions = {column: i for i, column in enumerate(columns or [])}
+            values = [last_row[positions[column]] if column in positions else None for column in state["key"]]
+        if all(value is not None for value in values):
+            next_state["after"] = values
+    return page_rows, next_state
@@ -0,0 +1,312 @@
+import base64
+import datetime
+import decimal
+import json
+import logging
+import re
+import threading
+import uuid
+from typing import Dict, Any, Optional
+
+from rds_client import (
+    QueryBackend, RESUMING_MESSAGE_PATTERN, STATEMENT_TIMEOUT_SQL, is_statement_timeout, plan_result,
+    remaining_ms, timeout_result
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# Parts of a query that may contain a :name placeholder or a % sign: quoted text and comments are
+# matched as a whole so placeholders are only found in the SQL itself (and "::" casts are skipped)
+PLACEHOLDER_PATTERN = re.compile(
+    r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/|::|(?<![:\w]):(?P<name>[A-Za-z_]\w*)|%",
+    re.DOTALL
+)
+
+# Type names of the most common PostgreSQL type OIDs (the names the Data API reports as typeName)
+TYPE_NAMES = {
+    16: "bool", 17: "bytea", 18: "char", 20: "int8", 21: "int2", 23: "int4", 25: "text", 114: "json",
+    700: "float4", 701: "float8", 1042: "bpchar", 1043: "varchar", 1082: "date", 1083: "time",
+    1114: "timestamp", 1184: "timestamptz", 1186: "interval", 1700: "numeric", 2950: "uuid", 3802: "jsonb"
+}
+
+# Converts the Data API :name placeholders of the query into psycopg2 %(name)s placeholders
+# (only for the given parameters) and escapes the other % signs
+def convert_placeholders(sql_query: str, parameters: Dict[str, Any]) -> str:
+    def replace(match: re.Match) -> str:
+        name = match.group("name")
+        if name is not None and name in parameters:
+            return f"%({name})s"
+        # psycopg2 formats the whole query, quoted text and comments included
+        return match.group().replace("%", "%%")
+
+    return PLACEHOLDER_PATTERN.sub(replace, sql_query)
+
+# Converts a value read by psycopg2 into the value the Data API would return for it
+def pg_value(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (memoryview, bytes)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID, datetime.timedelta)):
+        return str(value)
+    if isinstance(value, list):
+        return [pg_value(item) for item in value]
+    return value
+
+# Executes SQL queries over direct PostgreSQL connections (through the RDS Proxy in AWS). A pool
+# of up to max_concurrency connections is kept for the life of the process, so warm Lambda
+# invocations skip the connection setup and the Data API's HTTP overhead. Every query runs in a
+# read-only transaction and is read through a server-side cursor, fetch_size rows at a time, so
+# only the rows within the budgets are ever transferred. Queries with a deadline get a
+# statement_timeout for that transaction. Credentials come from the dsn, the user and password,
+# or the Secrets Manager secret of the cluster
+class PostgresBackend(QueryBackend):
+    name = "postgres"
+
+    def __init__(
+        self,
+        host: str = None,
+        port: int = 5432,
+        db_name: str = "postgres",
+        secret_arn: str = None,
+        user: str = None,
+        password: str = None,
+        dsn: str = None,
+        region: str = "us-east-1",
+        max_concurrency: int = 10,
+        fetch_size: int = 500,
+        connect_timeout: int = 5,
+        sslmode: str = "require"
+    ):
+        self.host = host
+        self.port = port
+        self.db_name = db_name
+        self.secret_arn = secret_arn
+        self.user = user
+        self.password = password
+        self.dsn = dsn
+        self.region = region
+        self.max_concurrency = max_concurrency
+        self.fetch_size = fetch_size
+        self.connect_timeout = connect_timeout
+        self.sslmode = sslmode
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._cursor_ids = iter(range(1, 1 << 62))
+
+    # Connection pool, created on first use (psycopg2 and the credentials are only loaded then)
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    from psycopg2.pool import ThreadedConnectionPool
+                    self._pool = ThreadedConnectionPool(0, self.max_concurrency, **self.connection_settings())
+        return self._pool
+
+    # Returns the psycopg2 connection settings
+    def connection_settings(self) -> Dict[str, Any]:
+        if self.dsn:
+            return {"dsn": self.dsn, "connect_timeout": self.connect_timeout}
+
+        user, password, host, port = self.user, self.password, self.host, self.port
+        if (not user or not password) and self.secret_arn:
+            import boto3
+            secrets = boto3.client("secretsmanager", region_name=self.region)
+            secret = json.loads(secrets.get_secret_value(SecretId=self.secret_arn)["SecretString"])
+            user, password = secret["username"], secret["password"]
+            host = host or secret.get("host")
+            port = port or secret.get("port", 5432)
+        return {
+            "host": host,
+            "port": port,
+            "dbname": self.db_name,
+            "user": user,
+            "password": password,
+            "connect_timeout": self.connect_timeout,
+            "sslmode": self.sslmode,
+            "application_name": "sql-agent-mcp"
+        }
+
+    # Executes a SQL query (optionally with named :parameters) in a read-only transaction, keeping
+    # at most max_rows rows / max_bytes bytes of records (0 = unlimited). Connections dropped while
+    # idle (e.g. by the proxy between invocations) are replaced and the query is run once more
+    def execute_query(
+        self,
+        sql_query: str,
+        parameters: Dict[str, Any] = None,
+        max_rows: int = 0,
+        max_bytes: int = 0,
+        result_format: str = "json",
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        return self._execute(sql_query, parameters, max_rows, max_bytes, result_format, server_cursor=True, deadline=deadline)
+
+    # Returns the estimated plan of the query (EXPLAIN can't run in a server-side cursor)
+    def explain_query(
+        self,
+        sql_query: str,
+        parameters: Dict[str, Any] = None,
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        result = self._execute(
+            f"EXPLAIN (FORMAT JSON) {sql_query}", parameters, 0, 0, "columns", server_cursor=False, deadline=deadline
+        )
+        if not result["success"]:
+            return result
+        return plan_result(result["data"])
+
+    # Runs the query on a pooled connection and builds its result (see execute_query)
+    def _execute(
+        self,
+        sql_query: str,
+        parameters: Optional[Dict[str, Any]],
+        max_rows: int,
+        max_bytes: int,
+        result_format: str,
+        server_cursor: bool,
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        import psycopg2
+
+        for attempt in range(2):
+            connection = None
+            try:
+                connection = self.pool.getconn()
+                if connection.readonly is not True:
+                    # Sent as BEGIN READ ONLY with each transaction, so no session state pins the proxy connection
+                    connection.set_session(readonly=True, autocommit=False)
+                if deadline is not None and not self._set_statement_timeout(connection, deadline):
+                    connection.rollback()
+                    self.pool.putconn(connection)
+                    return timeout_result("the request deadline passed before the query started")
+                rows, truncated, columns, column_types = self._fetch(
+                    connection, sql_query, parameters, max_rows, max_bytes, result_format, server_cursor
+                )
+                connection.rollback()
+                self.pool.putconn(connection)
+                connection = None
+            except psycopg2.Error as error:
+                closed = connection is None or bool(connection.closed)
+                if connection is not None:
+                    try:
+                        if not closed:
+                            connection.rollback()
+                    except psycopg2.Error:
+                        closed = True
+                    self.pool.putconn(connection, close=closed)
+                message = (getattr(error, "pgerror", None) or str(error)).strip()
+                if closed and attempt == 0 and not RESUMING_MESSAGE_PATTERN.search(message):
+                    logger.info(f"Database connection lost ({message}), reconnecting")
+                    continue
+                logger.error(f"PostgreSQL error: {error.pgcode} - {message}")
+                result = {
+                    "success": False,
+                    "error": f"Database error: {message}",
+                    "error_code": error.pgcode or type(error).__name__
+                }
+                if closed and RESUMING_MESSAGE_PATTERN.search(message):
+                    result["resuming"] = True
+                elif is_statement_timeout(error.pgcode, message):
+                    result["error"] = f"Database error: query cancelled at the request deadline ({message})"
+                    result["timed_out"] = True
+                return result
+            except Exception as error:
+                if connection is not None:
+                    self.pool.putconn(connection, close=True)
+                logger.error(f"Error executing query: {str(error)}")
+                return {
+                    "success": False,
+                    "error": f"Unknown error: {str(error)}"
+                }
+
+            if truncated:
+                logger.info(f"Query results truncated to {len(rows)} rows")
+            return {
+                "success": True,
+                "data": rows,
+                "row_count": len(rows),
+                "total_row_count": None if truncated else len(rows),
+                "truncated": truncated,
+                "columns": columns,
+                "column_types": column_types if result_format == "columns" else None,
+                "format": result_format,
+                "sql_query": sql_query
+            }
+
+    # Sets the statement_timeout of the connection's transaction to the time left before the
+    # deadline. Returns False when there is no time left
+    @staticmethod
+    def _set_statement_timeout(connection, deadline: float) -> bool:
+        timeout_ms = remaining_ms(deadline)
+        if timeout_ms <= 0:
+            return False
+        parameters = {"timeout": f"{timeout_ms}ms"}
+        with connection.cursor() as cursor:
+            cursor.execute(convert_placeholders(STATEMENT_TIMEOUT_SQL, parameters), parameters)
+        return True
+
+    # Reads the rows of the query (through a server-side cursor unless told otherwise) until the
+    # budgets are used up. Row sizes are estimated from the text of their values, like the Data API records
+    def _fetch(
+        self,
+        connection,
+        sql_query: str,
+        parameters: Optional[Dict[str, Any]],
+        max_rows: int,
+        max_bytes: int,
+        result_format: str,
+        server_cursor: bool = True
+    ) -> tuple[list, bool, list, list]:
+        if parameters:
+            sql_query = convert_placeholders(sql_query, parameters)
+        name = f"mcp_query_{next(self._cursor_ids)}" if server_cursor else None
+        with connection.cursor(name=name) as cursor:
+            cursor.itersize = self.fetch_size
+            cursor.execute(sql_query, parameters or None)
+
+            rows = []
+            used_bytes = 0
+            columns, column_types = [], []
+            while True:
+                # One more row than the budget tells a result that fits apart from a truncated one
+                size = self.fetch_size if not max_rows else min(self.fetch_size, max_rows - len(rows) + 1)
+                batch = cursor.fetchmany(size)
+                if not columns and cursor.description:
+                    columns = [column.name for column in cursor.description]
+                    column_types = [TYPE_NAMES.get(column.type_code, str(column.type_code)) for column in cursor.description]
+                if not batch:
+                    return rows, False, columns, column_types
+
+                for record in batch:
+                    if max_rows and len(rows) >= max_rows:
+                        return rows, True, columns, column_types
+                    values = [pg_value(value) for value in record]
+                    used_bytes += sum(len(str(value)) for value in values) + len(values) + 1
+                    if max_bytes and used_bytes > max_bytes:
+                        return rows, True, columns, column_types
+                    rows.append(dict(zip(columns, values)) if result_format != "columns" else values)
+
+    # Tests the connection to the database using a sample query
+    def test_connection(self) -> tuple[bool, str]:
+        result = self.execute_query("SELECT 1 as test")
+        if result["success"]:
+            logger.info("Connection successful")
+            return True, None
+        return False, f"Error connecting: {result.get('error_code', 'unknown')} - {result['error']}"
+
+    # Closes every connection of the pool
+    def close(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
@@ -1,27 +1,45 @@
-# Loads the database schema (in SQL format) and returns as a string
+import hashlib
+import os
+
+from schema_index import SchemaIndex
+
+# Loads the database schema (in SQL format, next to this module) and returns as a string
 def load_schema():
     try:
-        with open('schema.sql', 'r') as file:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql'), 'r') as file:
             return file.read()
     except FileNotFoundError:
         return "Error: schema.sql file not found."
 
 DATABASE_SCHEMA = load_schema()
-
-# Creates a system prompt for the Bedrock agent using the user's query and the database schema
-def create_system_prompt(user_query: str, schema=DATABASE_SCHEMA):
+SCHEMA_INDEX = SchemaIndex(DATABASE_SCHEMA)
+# Hash of the schema the prompts are built from, SQL generated for another schema isn't reused
+SCHEMA_HASH = hashlib.sha256(DATABASE_SCHEMA.encode("utf-8")).hexdigest()
+
+# Schemas smaller than this are sent whole, so the prompt prefix never changes and stays in the
+# provider's prompt cache (worth more than leaving out a few tables); 0 always prunes the schema.
+# The bundled schema.sql (~7 KB) is below the default, pruning is for larger schemas
+SCHEMA_PRUNING_MIN_BYTES = int(os.getenv("SCHEMA_PRUNING_MIN_BYTES", "16384"))
+
+# Returns the schema to include in the prompt: the tables relevant to the user's query
+# (and the tables joining them) for large schemas, the whole schema otherwise
+def select_schema(user_query: str):
+    if len(DATABASE_SCHEMA) < SCHEMA_PRUNING_MIN_BYTES:
+        return DATABASE_SCHEMA
+    return SCHEMA_INDEX.prune(user_query)
+
+# Builds the instructions and examples of the system prompt, which don't depend on the schema or
+# the query so they stay the same (and cached by the model provider) even when the schema is pruned
+def build_prompt_instructions():
     # Generated and modified template through Anthropic console
-    SYSTEM_PROMPT = f"""
+    PROMPT_INSTRUCTIONS = """
     You are an AI assistant tasked with converting natural language queries into
     valid SQL statements for a PostgreSQL database. You will be provided with the
     table schemas of the database and a user's query in natural language. Your
     job is to interpret the query and generate a corresponding SQL statement
     that will retrieve the requested information.
 
-    First, here are the table schemas for the database:
-    <table_schemas>
-    {schema}
-    </table_schemas> 
+    The table schemas for the database follow the examples below.
 
     When interpreting the user's query, consider the following guidelines:
     1. Identify the main entities (tables) involved in the query.
@@ -146,16 +164,59 @@ def create_system_prompt(user_query: str, schema=DATABASE_SCHEMA):
     </sql_statement>
 
     </example>
+    """
+
+    # Drop the indentation before the closing quotes so the next part starts on a new line
+    return PROMPT_INSTRUCTIONS.rstrip(" ")
+
+PROMPT_INSTRUCTIONS = build_prompt_instructions()
+
+# Creates the part of the system prompt with the table schemas
+def create_schema_prompt(schema):
+    SCHEMA_PROMPT = f"""
+    Here are the table schemas for the database:
+    <table_schemas>
+    {schema}
+    </table_schemas>
+    """
+
+    return SCHEMA_PROMPT.rstrip(" ")
+
+# Builds the static part of the system prompt (instructions, examples and schema), which is the same
+# for every query of a schema so it can be built once and cached by the model provider
+def build_prompt_prefix(schema=DATABASE_SCHEMA):
+    return PROMPT_INSTRUCTIONS + create_schema_prompt(schema)
 
+SYSTEM_PROMPT_PREFIX = build_prompt_prefix()
+
+# Size of the static prompt prefix (tokens are estimated at ~4 characters per token, the model
+# provider reports the exact count in the usage of each response)
+PROMPT_PREFIX_BYTES = len(SYSTEM_PROMPT_PREFIX.encode("utf-8"))
+PROMPT_PREFIX_TOKENS = len(SYSTEM_PROMPT_PREFIX) // 4
+
+# Creates the per-query part of the prompt, appended after the static prefix
+def create_query_prompt(user_query: str):
+    QUERY_PROMPT = f"""
     Now please convert the following user query into a valid SQL statement:
     <user_query>
     {user_query}
     </user_query>
     """
 
-    return SYSTEM_PROMPT
+    return QUERY_PROMPT
+
+# Returns the static prompt prefix for the schema (prebuilt for the whole schema)
+def get_prompt_prefix(schema):
+    return SYSTEM_PROMPT_PREFIX if schema is DATABASE_SCHEMA else build_prompt_prefix(schema)
+
+# Creates a system prompt for the Bedrock agent using the user's query and the database schema
+# (selected for the query unless a schema is given)
+def create_system_prompt(user_query: str, schema=None):
+    schema = select_schema(user_query) if schema is None else schema
+    return get_prompt_prefix(schema) + create_query_prompt(user_query)
 
-def create_error_prompt(user_query: str, error_context: dict, generated_sql: str = "", schema=DATABASE_SCHEMA):
+# Creates the per-query part of the prompt used to fix a SQL query after an error
+def create_error_query_prompt(user_query: str, error_context: dict, generated_sql: str = ""):
     error_title = error_context.get('error_title', 'Unknown Error')
     error_message = error_context.get('error_message', 'No error details provided')
     recovery_steps = error_context.get('recovery_steps', [])
@@ -184,6 +245,30 @@ def create_error_prompt(user_query: str, error_context: dict, generated_sql: str
     Focus on fixing the specific issue rather than rewriting the entire query from scratch.
     """
 
-    BASE_PROMPT = create_system_prompt(user_query=user_query, schema=schema)
-    FULL_PROMPT = ERROR_PROMPT + "\n\n" + BASE_PROMPT
-    return FULL_PROMPT
\ No newline at end of file
+    return ERROR_PROMPT + "\n\n" + create_query_prompt(user_query)
+
+# Creates the prompt used to fix a SQL query after an error (the error details follow the static
+# prefix, so the cached prefix is reused by retries too)
+def create_error_prompt(user_query: str, error_context: dict, generated_sql: str = "", schema=None):
+    schema = select_schema(user_query) if schema is None else schema
+    return get_prompt_prefix(schema) + create_error_query_prompt(user_query, error_context, generated_sql)
+
+# Creates the prompt as message content blocks, with the static prefix marked as a prompt cache
+# breakpoint so the provider reuses it across requests. The whole schema is part of the cached
+# prefix; a schema pruned for the query changes with every question, so it goes after the
+# breakpoint and only the instructions are cached
+def create_prompt_blocks(user_query: str, error_context: dict = None, generated_sql: str = "", schema=None):
+    schema = select_schema(user_query) if schema is None else schema
+    if error_context:
+        query_prompt = create_error_query_prompt(user_query, error_context, generated_sql)
+    else:
+        query_prompt = create_query_prompt(user_query)
+    if schema is DATABASE_SCHEMA:
+        return [
+            {"type": "text", "text": SYSTEM_PROMPT_PREFIX, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": query_prompt}
+        ]
+    return [
+        {"type": "text", "text": PROMPT_INSTRUCTIONS, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": create_schema_prompt(schema) + query_prompt}
+    ]
\ No newline at end of file
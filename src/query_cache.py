@@ -0,0 +1,148 @@
+import copy
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Optional
+
+from sql_validator import normalize_sql
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# A single cached query result along with its bookkeeping data
+class CacheEntry:
+    __slots__ = ("result", "tables", "size", "expires_at")
+
+    def __init__(self, result: Dict[str, Any], tables: frozenset, size: int, expires_at: float):
+        self.result = result
+        self.tables = tables
+        self.size = size
+        self.expires_at = expires_at
+
+# In-process cache for query results keyed on normalized SQL text, with a TTL, LRU eviction
+# bounded by total memory size, and per-table invalidation. The server only runs SELECT queries,
+# so the tables a write changed are reported by whoever wrote them (see invalidate_tables);
+# otherwise the TTL bounds how stale a result can be
+class QueryCache:
+    def __init__(self, ttl_seconds: float = 60.0, max_bytes: int = 32 * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._table_index: Dict[str, set] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Normalizes SQL text so trivially different spellings of the same query share an entry
+    # (case and whitespace are folded by the validator's lexer, which keeps literals, quoted names
+    # and comments as they are; trailing semicolons are dropped)
+    @staticmethod
+    def normalize_sql(sql_query: str) -> str:
+        return normalize_sql(sql_query.strip().rstrip(";").strip())
+
+    # Builds the cache key of a query; the variant separates different renderings of the same query's results
+    def make_key(self, sql_query: str, variant: str = "") -> str:
+        key = self.normalize_sql(sql_query)
+        return f"{variant}:{key}" if variant else key
+
+    # Returns a copy of the cached result for the query (or None if missing or expired), so callers
+    # can't change what later hits get
+    def get(self, sql_query: str, variant: str = "") -> Optional[Dict[str, Any]]:
+        key = self.make_key(sql_query, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            result = entry.result
+        return copy.deepcopy(result)
+
+    # Stores a copy of a successful query result, indexed by the tables the query reads from
+    # (SQLAnalysis.tables of the validated query)
+    def put(self, sql_query: str, result: Dict[str, Any], tables: Iterable[str] = (), variant: str = "") -> bool:
+        if self.ttl_seconds <= 0 or self.max_bytes <= 0:
+            return False
+
+        size = len(json.dumps(result, default=str))
+        if size > self.max_bytes:
+            logger.info(f"Query result too large to cache ({size} bytes)")
+            return False
+
+        key = self.make_key(sql_query, variant)
+        entry = CacheEntry(
+            result=copy.deepcopy(result),
+            tables=frozenset(table.lower() for table in tables),
+            size=size,
+            expires_at=time.monotonic() + self.ttl_seconds
+        )
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._total_bytes += size
+            for table in entry.tables:
+                self._table_index.setdefault(table, set()).add(key)
+
+            # Evict the least recently used entries until the cache fits in memory again
+            while self._total_bytes > self.max_bytes and self._entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+        return True
+
+    # Drops every cached result that reads from any of the given tables
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for table in tables:
+                for key in list(self._table_index.get(table.lower(), ())):
+                    self._remove(key)
+                    removed += 1
+        return removed
+
+    # Drops every cached result
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._table_index.clear()
+            self._total_bytes = 0
+
+    # Returns counters describing the current state of the cache
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    # Removes an entry and its table index references (caller must hold the lock)
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._total_bytes -= entry.size
+        for table in entry.tables:
+            keys = self._table_index.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._table_index[table]
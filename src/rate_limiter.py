@@ -0,0 +1,240 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# Error codes Bedrock uses when a request is rejected for going over a quota or capacity
+THROTTLING_CODES = frozenset([
+    "ThrottlingException", "TooManyRequestsException", "ServiceUnavailableException",
+    "ModelNotReadyException", "throttlingException", "serviceUnavailableException"
+])
+
+# Number of recent queue waits kept to compute percentiles
+WAIT_SAMPLES = 1000
+
+# Raised when a request can't get through the rate limiter before its deadline
+class RateLimitTimeout(Exception):
+    pass
+
+# Raised for throttling reported inside a response stream rather than as a ClientError
+class ThrottlingError(Exception):
+    pass
+
+# Returns whether the error means the request was throttled (and can be retried later)
+def is_throttling_error(error: Exception) -> bool:
+    if isinstance(error, ThrottlingError):
+        return True
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") in THROTTLING_CODES
+    return False
+
+# Token bucket refilled continuously, holding at most one minute worth of its rate
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    # Adds the tokens earned since the last refill, at the rate scaled by the factor
+    def refill(self, now: float, factor: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate * factor)
+        self.updated = now
+
+    # Returns the seconds to wait before the amount is available (requests larger than the
+    # bucket only wait for a full bucket)
+    def wait_time(self, amount: float, factor: float) -> float:
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / (self.rate * factor)
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+    def give(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+# Limits the calls made to a model shared by all threads: at most max_concurrency calls in
+# flight, requests and tokens per minute budgets (0 for no limit), and retries of throttled
+# calls with jittered exponential backoff. Every throttled call halves the rates allowed by the
+# budgets (down to min_rate_factor), successful calls bring them back up gradually.
+# Requests wait in line until their deadline (queue_timeout seconds by default)
+class RateLimiter:
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_concurrency: int = 4,
+        queue_timeout: float = 30,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 8,
+        min_rate_factor: float = 0.1
+    ):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.min_rate_factor = min_rate_factor
+        self.rate_factor = 1.0
+
+        self._condition = threading.Condition()
+        self.in_flight = 0
+        self.queued = 0
+        self.calls = 0
+        self.throttled = 0
+        self.retries = 0
+        self.rejected = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+
+    # Calls fn once a slot and the estimated tokens are available, retrying it while it is
+    # throttled. Raises RateLimitTimeout when the deadline (a time.monotonic() value) passes
+    # while waiting in line, and the error of the last attempt when retries run out
+    def call(self, fn: Callable[[], Any], tokens: float = 0, deadline: Optional[float] = None) -> Any:
+        if deadline is None:
+            deadline = time.monotonic() + self.queue_timeout
+
+        attempt = 0
+        while True:
+            self.acquire(tokens, deadline)
+            try:
+                result = fn()
+            except Exception as error:
+                if not is_throttling_error(error):
+                    raise
+                throttled_error = error
+            else:
+                self._succeeded()
+                return result
+            finally:
+                # The slot is freed before the backoff, so other calls run while this one waits
+                self.release()
+
+            self._throttled()
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+            if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                raise throttled_error
+            attempt += 1
+            with self._condition:
+                self.retries += 1
+            logger.warning(f"Model call throttled, retrying in {delay:.2f}s (attempt {attempt}/{self.max_retries})")
+            time.sleep(delay)
+
+    # Waits for a free slot and the request/token budgets, returns the time spent waiting
+    def acquire(self, tokens: float = 0, deadline: Optional[float] = None) -> float:
+        if deadline is None:
+            deadline = time.monotonic() + self.queue_timeout
+
+        start = time.monotonic()
+        with self._condition:
+            self.queued += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._wait_time(now, tokens)
+                    if wait <= 0:
+                        break
+                    if now + min(wait, 0.001) >= deadline:
+                        self.rejected += 1
+                        raise RateLimitTimeout(
+                            f"Model call waited {now - start:.2f}s in the rate limiter queue without getting through"
+                        )
+                    self._condition.wait(min(wait, deadline - now))
+
+                if self.requests is not None:
+                    self.requests.take(1)
+                if self.tokens is not None:
+                    self.tokens.take(tokens)
+                self.in_flight += 1
+                self.calls += 1
+            finally:
+                self.queued -= 1
+
+            waited = time.monotonic() - start
+            self.wait_count += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self._waits.append(waited)
+        return waited
+
+    # Frees the slot of a call
+    def release(self) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    # Corrects the token budget once the actual usage of a call is known (Bedrock counts
+    # max_tokens against the quota until the call completes, so estimates are usually high)
+    def record_usage(self, estimated_tokens: float, actual_tokens: float) -> None:
+        if self.tokens is None:
+            return
+        with self._condition:
+            self.tokens.refill(time.monotonic(), self.rate_factor)
+            if actual_tokens < estimated_tokens:
+                self.tokens.give(estimated_tokens - actual_tokens)
+            else:
+                self.tokens.take(actual_tokens - estimated_tokens)
+            self._condition.notify_all()
+
+    # Returns counters describing the calls and the time spent waiting in line
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            waits = sorted(self._waits)
+            return {
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "retries": self.retries,
+                "rejected": self.rejected,
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "rate_factor": round(self.rate_factor, 3),
+                "queue_wait": {
+                    "count": self.wait_count,
+                    "avg_ms": round(self.wait_total / self.wait_count * 1000, 3) if self.wait_count else 0.0,
+                    "p95_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 3) if waits else 0.0,
+                    "max_ms": round(self.wait_max * 1000, 3)
+                }
+            }
+
+    # Returns the seconds to wait before a call with the given tokens can start, 0 if it can start
+    # now (caller must hold the lock)
+    def _wait_time(self, now: float, tokens: float) -> float:
+        if self.in_flight >= self.max_concurrency:
+            # Woken up by release()
+            return self.queue_timeout
+        wait = 0.0
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket is not None:
+                bucket.refill(now, self.rate_factor)
+                wait = max(wait, bucket.wait_time(amount, self.rate_factor))
+        return wait
+
+    def _throttled(self) -> None:
+        with self._condition:
+            self.throttled += 1
+            self.rate_factor = max(self.min_rate_factor, self.rate_factor / 2)
+
+    def _succeeded(self) -> None:
+        with self._condition:
+            if self.rate_factor < 1.0:
+                self.rate_factor = min(1.0, self.rate_factor + 0.05)
@@ -1,8 +1,15 @@
+import asyncio
+import base64
+import functools
 import json
 import logging
-import boto3
+import random
+import re
+import threading
+import time
 from botocore.exceptions import ClientError
-from typing import Dict, Any
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional
 
 logging.basicConfig(
     level=logging.INFO,
@@ -11,48 +18,307 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Connects to an Aurora RDS PostgreSQL instance and executes SQL queries using the Data API
-class RDSClient:
-    def __init__(self, cluster_arn: str, secret_arn: str, db_name: str = "postgres", region: str = "us-east-1"):
+# Data API errors returned while an Aurora Serverless cluster resumes or scales up: the same
+# statement succeeds once the cluster is available, so these are retried rather than reported
+RESUMING_ERROR_CODES = frozenset(["DatabaseResumingException", "DatabaseUnavailableException", "ServiceUnavailableError"])
+# Messages of the (deprecated) BadRequestException that mean the same thing
+RESUMING_MESSAGE_PATTERN = re.compile(
+    r"resuming|auto-paused|Communications link failure|database system is starting up|scaling",
+    re.IGNORECASE
+)
+
+# Returns whether the Data API error is caused by the cluster resuming (or scaling up)
+def is_resuming_error(error_code: str, error_message: str) -> bool:
+    if error_code in RESUMING_ERROR_CODES:
+        return True
+    return error_code == "BadRequestException" and bool(RESUMING_MESSAGE_PATTERN.search(error_message or ""))
+
+# Errors of a statement cancelled by its statement_timeout (SQLSTATE 57014), or stopped by the Data
+# API's own call timeout
+STATEMENT_TIMEOUT_CODES = frozenset(["57014", "QueryCanceled", "StatementTimeoutException"])
+STATEMENT_TIMEOUT_PATTERN = re.compile(r"canceling statement due to statement timeout", re.IGNORECASE)
+
+# Longest a Data API call waits for its statement: the service cancels the statement itself at
+# that point (continueAfterTimeout is never set), so only deadlines before it need a statement_timeout
+DATA_API_CALL_TIMEOUT_SECONDS = 45
+
+# Sets the statement_timeout of the current transaction only (a function call rather than SET
+# LOCAL, which RDS Proxy would take as session state and pin the connection for)
+STATEMENT_TIMEOUT_SQL = "SELECT set_config('statement_timeout', :timeout, true)"
+
+# Returns whether the error means the statement ran out of time
+def is_statement_timeout(error_code: str, error_message: str) -> bool:
+    return error_code in STATEMENT_TIMEOUT_CODES or bool(STATEMENT_TIMEOUT_PATTERN.search(error_message or ""))
+
+# Returns the milliseconds left before the deadline (a time.monotonic() value)
+def remaining_ms(deadline: float) -> int:
+    return int((deadline - time.monotonic()) * 1000)
+
+# Returns the error result of a query that ran out of time
+def timeout_result(message: str, error_code: str = "QueryTimeout") -> Dict[str, Any]:
+    return {
+        "success": False,
+        "error": f"Database error: {message}",
+        "error_code": error_code,
+        "timed_out": True
+    }
+
+JSON_DECODER = json.JSONDecoder()
+JSON_WHITESPACE_PATTERN = re.compile(r"[ \t\n\r]*")
+
+# Parses the JSON array of records returned by the Data API one row at a time, stopping as soon
+# as the row or byte budget (0 = unlimited) is used up so runaway results are never fully built.
+# Row sizes are measured on the JSON text of each record. Returns the rows and whether they were truncated
+def parse_records(formatted_records: str, max_rows: int = 0, max_bytes: int = 0) -> tuple[list, bool]:
+    rows = []
+    used_bytes = 0
+    pos = JSON_WHITESPACE_PATTERN.match(formatted_records, 0).end()
+    if not formatted_records.startswith("[", pos):
+        raise ValueError("Expected a JSON array of records")
+    pos += 1
+
+    while True:
+        pos = JSON_WHITESPACE_PATTERN.match(formatted_records, pos).end()
+        if formatted_records.startswith("]", pos) and not rows:
+            return rows, False
+        if max_rows and len(rows) >= max_rows:
+            return rows, True
+
+        row, end = JSON_DECODER.raw_decode(formatted_records, pos)
+        used_bytes += end - pos
+        if max_bytes and used_bytes > max_bytes:
+            return rows, True
+        rows.append(row)
+
+        pos = JSON_WHITESPACE_PATTERN.match(formatted_records, end).end()
+        if formatted_records.startswith("]", pos):
+            return rows, False
+        if not formatted_records.startswith(",", pos):
+            raise ValueError(f"Expected ',' or ']' at position {pos}")
+        pos += 1
+
+# Result formats: "json" returns rows as objects keyed by column name, "columns" returns rows as
+# arrays of values in the order of the result columns
+RESULT_FORMATS = ("json", "columns")
+
+# Converts a Data API field (e.g. {"stringValue": "open"}) into a Python value
+def field_value(field: Dict[str, Any]) -> Any:
+    if field.get("isNull"):
+        return None
+    if "blobValue" in field:
+        return base64.b64encode(field["blobValue"]).decode("ascii")
+    if "arrayValue" in field:
+        return array_value(field["arrayValue"])
+    for value in field.values():
+        return value
+    return None
+
+# Converts a Data API array value (e.g. {"longValues": [1, 2]}) into a list, including nested arrays
+def array_value(array: Dict[str, Any]) -> list:
+    for kind, values in array.items():
+        if kind == "arrayValues":
+            return [array_value(value) for value in values]
+        return list(values)
+    return []
+
+# Converts the native Data API records into rows of values within the row and byte budgets
+# (0 = unlimited). Row sizes are estimated from the text of their values. Returns the rows
+# and whether they were truncated
+def parse_field_records(records: list, max_rows: int = 0, max_bytes: int = 0) -> tuple[list, bool]:
+    rows = []
+    used_bytes = 0
+    for record in records:
+        if max_rows and len(rows) >= max_rows:
+            return rows, True
+
+        row = [field_value(field) for field in record]
+        used_bytes += sum(len(str(value)) for value in row) + len(row) + 1
+        if max_bytes and used_bytes > max_bytes:
+            return rows, True
+        rows.append(row)
+    return rows, False
+
+# Reads the top plan node from the rows returned by EXPLAIN (FORMAT JSON): a single "QUERY PLAN"
+# value holding the plan either as JSON text or already decoded
+def plan_result(rows: list) -> Dict[str, Any]:
+    try:
+        value = rows[0][0] if isinstance(rows[0], list) else next(iter(rows[0].values()))
+        plan = json.loads(value) if isinstance(value, str) else value
+        return {"success": True, "plan": plan[0]["Plan"]}
+    except (IndexError, KeyError, TypeError, StopIteration, ValueError) as error:
+        logger.error(f"Failed to read the query plan: {error}")
+        return {"success": False, "error": f"Unknown error: unexpected EXPLAIN output ({error})"}
+
+# Interface of the backends RDSClient runs queries with. execute_query returns the result dict
+# documented on DataAPIBackend.execute_query (it never raises), test_connection returns whether
+# the database answered along with the error if not. Queries given a deadline run in a
+# transaction whose statement_timeout ends at the deadline, and report "timed_out" when it fires.
+# Backends are called from several threads
+class QueryBackend:
+    name = "base"
+
+    def execute_query(
+        self,
+        sql_query: str,
+        parameters: Dict[str, Any] = None,
+        max_rows: int = 0,
+        max_bytes: int = 0,
+        result_format: str = "json",
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def test_connection(self) -> tuple[bool, str]:
+        raise NotImplementedError
+
+    # Returns the plan PostgreSQL estimates for the query without running it (EXPLAIN (FORMAT JSON))
+    # as {"success": True, "plan": <top plan node>}, or the error result of execute_query
+    def explain_query(
+        self,
+        sql_query: str,
+        parameters: Dict[str, Any] = None,
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        result = self.execute_query(f"EXPLAIN (FORMAT JSON) {sql_query}", parameters=parameters, deadline=deadline)
+        if not result["success"]:
+            return result
+        return plan_result(result["data"])
+
+    # Releases the connections held by the backend
+    def close(self) -> None:
+        pass
+
+# Executes SQL queries on an Aurora RDS PostgreSQL instance using the Data API (HTTP, no
+# connection to manage). Statements rejected while the cluster resumes are retried with backoff
+# for up to resume_timeout seconds. A query whose deadline comes before the Data API's own call
+# timeout takes three more calls: its transaction is begun, given a statement_timeout, and rolled
+# back once the query is read. Other queries are a single call
+class DataAPIBackend(QueryBackend):
+    name = "data_api"
+
+    def __init__(
+        self,
+        cluster_arn: str,
+        secret_arn: str,
+        db_name: str = "postgres",
+        region: str = "us-east-1",
+        max_concurrency: int = 10,
+        resume_timeout: float = 30,
+        client=None
+    ):
         self.cluster_arn = cluster_arn
         self.secret_arn = secret_arn
         self.db_name = db_name
         self.region = region
-        self.rds_client = boto3.client('rds-data', region_name=region)
-    
-    # Executes a SQL query on the RDS instance
-    def execute_query(self, sql_query: str) -> Dict[str, Any]:
+        self.max_concurrency = max_concurrency
+        self.resume_timeout = resume_timeout
+        self.resume_base_delay = 0.5
+        self.resume_max_delay = 5.0
+        self.resume_retries = 0
+        # Data API client given by the caller (e.g. data_api_emulator.DataAPIEmulator), boto3's otherwise
+        self._rds_client = client
+
+    # Data API client, created on first use to keep boto3 out of the import path (cold starts)
+    @property
+    def rds_client(self):
+        if self._rds_client is None:
+            import boto3
+            from botocore.config import Config
+            self._rds_client = boto3.client(
+                'rds-data',
+                region_name=self.region,
+                config=Config(max_pool_connections=self.max_concurrency)
+            )
+        return self._rds_client
+
+    @rds_client.setter
+    def rds_client(self, client):
+        self._rds_client = client
+
+    # Executes a SQL query on the RDS instance (optionally with named :parameters), keeping at
+    # most max_rows rows / max_bytes bytes of records (0 = unlimited). The "columns" result format
+    # reads the native records and column metadata instead of the JSON formatted records.
+    # With a deadline (a time.monotonic() value) the query is cancelled when it passes (by the
+    # database when it comes before DATA_API_CALL_TIMEOUT_SECONDS, by the Data API otherwise),
+    # and resume retries stop at the deadline if it comes before resume_timeout
+    def execute_query(
+        self,
+        sql_query: str,
+        parameters: Dict[str, Any] = None,
+        max_rows: int = 0,
+        max_bytes: int = 0,
+        result_format: str = "json",
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        transaction_id = None
         try:
             # Execute the SQL query using the Data API
-            response = self.rds_client.execute_statement(
-                resourceArn=self.cluster_arn,
-                secretArn=self.secret_arn,
-                database=self.db_name,
-                sql=sql_query,
-                formatRecordsAs='JSON'
-            )
+            request = {
+                "resourceArn": self.cluster_arn,
+                "secretArn": self.secret_arn,
+                "database": self.db_name,
+                "sql": sql_query
+            }
+            if result_format == "columns":
+                request["includeResultMetadata"] = True
+            else:
+                request["formatRecordsAs"] = 'JSON'
+            if parameters:
+                request["parameters"] = self.build_parameters(parameters)
+            if deadline is not None and deadline - time.monotonic() < DATA_API_CALL_TIMEOUT_SECONDS:
+                transaction_id = self.begin_transaction(deadline)
+                if not self.set_statement_timeout(transaction_id, deadline):
+                    return timeout_result("the request deadline passed before the query started")
+                request["transactionId"] = transaction_id
+            response = self.execute_statement(request, deadline)
 
-            # Parse the JSON response from the Data API into Python objects
-            formatted_records = response.get('formattedRecords', [])
-            try:
-                parsed_data = json.loads(formatted_records)
-            except json.JSONDecodeError as error:
-                logger.error(f"Failed to parse JSON: {error}")
-                parsed_data = []
+            # Parse the response from the Data API into Python objects (within the budget)
+            column_types = None
+            if result_format == "columns":
+                parsed_data, truncated = parse_field_records(
+                    response.get('records', []), max_rows=max_rows, max_bytes=max_bytes
+                )
+                column_metadata = response.get('columnMetadata', [])
+                columns = [column.get('label') or column.get('name') for column in column_metadata]
+                column_types = [column.get('typeName') for column in column_metadata]
+            else:
+                formatted_records = response.get('formattedRecords', '[]')
+                try:
+                    parsed_data, truncated = parse_records(formatted_records, max_rows=max_rows, max_bytes=max_bytes)
+                except ValueError as error:
+                    logger.error(f"Failed to parse JSON: {error}")
+                    parsed_data, truncated = [], False
+                columns = list(parsed_data[0].keys()) if parsed_data else []
+            if truncated:
+                logger.info(f"Query results truncated to {len(parsed_data)} rows")
 
-            # Return the results of the query
+            # Return the results of the query (the total row count is only known when nothing was cut off)
             return {
                 "success": True,
                 "data": parsed_data,
                 "row_count": len(parsed_data),
-                "columns": list(parsed_data[0].keys()) if parsed_data else [],
+                "total_row_count": None if truncated else len(parsed_data),
+                "truncated": truncated,
+                "columns": columns,
+                "column_types": column_types,
+                "format": result_format,
                 "sql_query": sql_query
             }
         except ClientError as error:
             error_code = error.response['Error']['Code']
             error_message = error.response['Error']['Message']
             logger.error(f"RDS data API error: {error_code} - {error_message}")
-            
+
+            # The database didn't come back in time, this says nothing about the query itself
+            if is_resuming_error(error_code, error_message):
+                return {
+                    "success": False,
+                    "error": f"Database error: the database is resuming and not available yet ({error_message})",
+                    "error_code": error_code,
+                    "resuming": True
+                }
+            if is_statement_timeout(error_code, error_message):
+                return timeout_result(f"query cancelled at the request deadline ({error_message})", error_code)
             return {
                 "success": False,
                 "error": f"Database error: {error_message}",
@@ -65,17 +331,106 @@ class RDSClient:
                 "success": False,
                 "error": f"Unknown error: {str(error)}"
             }
-    
-    # Tests the connection to the RDS instance using a sample query
-    def test_connection(self) -> tuple[bool, str]:
+        finally:
+            if transaction_id is not None:
+                self.rollback_transaction(transaction_id)
+
+    # Begins the transaction of a query with a deadline (retried while the cluster resumes) and
+    # returns its ID
+    def begin_transaction(self, deadline: Optional[float] = None) -> str:
+        response = self.retry_resuming(
+            functools.partial(
+                self.rds_client.begin_transaction,
+                resourceArn=self.cluster_arn,
+                secretArn=self.secret_arn,
+                database=self.db_name
+            ),
+            deadline
+        )
+        return response["transactionId"]
+
+    # Sets the statement_timeout of the transaction to the time left before the deadline. Returns
+    # False when there is no time left
+    def set_statement_timeout(self, transaction_id: str, deadline: float) -> bool:
+        timeout_ms = remaining_ms(deadline)
+        if timeout_ms <= 0:
+            return False
+        self.rds_client.execute_statement(
+            resourceArn=self.cluster_arn,
+            secretArn=self.secret_arn,
+            database=self.db_name,
+            sql=STATEMENT_TIMEOUT_SQL,
+            parameters=self.build_parameters({"timeout": f"{timeout_ms}ms"}),
+            transactionId=transaction_id
+        )
+        return True
+
+    # Ends the (read-only) transaction of a query; a failure is only logged since the Data API
+    # ends idle transactions by itself
+    def rollback_transaction(self, transaction_id: str) -> None:
         try:
-            test_query = "SELECT 1 as test"
-            response = self.rds_client.execute_statement(
+            self.rds_client.rollback_transaction(
                 resourceArn=self.cluster_arn,
                 secretArn=self.secret_arn,
-                database=self.db_name,
-                sql=test_query
+                transactionId=transaction_id
             )
+        except Exception as error:
+            logger.warning(f"Failed to roll back transaction {transaction_id}: {error}")
+
+    # Runs a Data API statement, retrying it while the cluster resumes (see retry_resuming)
+    def execute_statement(self, request: Dict[str, Any], deadline: Optional[float] = None) -> Dict[str, Any]:
+        return self.retry_resuming(functools.partial(self.rds_client.execute_statement, **request), deadline)
+
+    # Makes a Data API call, retrying it with jittered exponential backoff while the cluster
+    # resumes, until resume_timeout (or the deadline) runs out. Other errors are raised right away
+    def retry_resuming(self, call, deadline: Optional[float] = None) -> Dict[str, Any]:
+        resume_deadline = time.monotonic() + self.resume_timeout
+        deadline = resume_deadline if deadline is None else min(deadline, resume_deadline)
+        attempt = 0
+        while True:
+            try:
+                return call()
+            except ClientError as error:
+                error_code = error.response['Error']['Code']
+                if not is_resuming_error(error_code, error.response['Error'].get('Message', '')):
+                    raise
+                delay = min(self.resume_max_delay, self.resume_base_delay * 2 ** attempt)
+                delay = random.uniform(delay / 2, delay)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                attempt += 1
+                self.resume_retries += 1
+                logger.info(f"Database is resuming ({error_code}), retrying in {delay:.2f}s (attempt {attempt})")
+                time.sleep(delay)
+
+    # Converts named Python values into Data API SQL parameters
+    @staticmethod
+    def build_parameters(parameters: Dict[str, Any]) -> list:
+        sql_parameters = []
+        for name, value in parameters.items():
+            if value is None:
+                field = {"isNull": True}
+            elif isinstance(value, bool):
+                field = {"booleanValue": value}
+            elif isinstance(value, int):
+                field = {"longValue": value}
+            elif isinstance(value, float):
+                field = {"doubleValue": value}
+            else:
+                field = {"stringValue": str(value)}
+            sql_parameters.append({"name": name, "value": field})
+        return sql_parameters
+
+    # Tests the connection to the RDS instance using a sample query
+    def test_connection(self) -> tuple[bool, str]:
+        try:
+            test_query = "SELECT 1 as test"
+            response = self.execute_statement({
+                "resourceArn": self.cluster_arn,
+                "secretArn": self.secret_arn,
+                "database": self.db_name,
+                "sql": test_query
+            })
             logger.info(f"Connection successful. {response}")
             return True, None
         except ClientError as error:
@@ -85,4 +440,159 @@ class RDSClient:
             return False, f"Error connecting: {error_code} - {error_message}"
         except Exception as error:
             logger.error(f"Error connecting to RDS: {str(error)}")
-            return False, f"Error connecting: {str(error)}"
\ No newline at end of file
+            return False, f"Error connecting: {str(error)}"
+
+# Connects to an Aurora RDS PostgreSQL instance and executes SQL queries through a backend: the
+# Data API by default, or any QueryBackend (e.g. pg_backend.PostgresBackend through the RDS Proxy).
+# Async callers run queries on a bounded thread pool (max_concurrency calls at once, sharing a
+# connection pool of the same size) so slow queries don't block the event loop
+class RDSClient:
+    def __init__(
+        self,
+        cluster_arn: str,
+        secret_arn: str,
+        db_name: str = "postgres",
+        region: str = "us-east-1",
+        max_concurrency: int = 10,
+        query_timeout: Optional[float] = None,
+        resume_timeout: float = 30,
+        prewarm_interval: float = 60,
+        backend: Optional[QueryBackend] = None,
+        client=None
+    ):
+        self.cluster_arn = cluster_arn
+        self.secret_arn = secret_arn
+        self.db_name = db_name
+        self.region = region
+        self.query_timeout = query_timeout
+        self.max_concurrency = max_concurrency
+        self.backend = backend or DataAPIBackend(
+            cluster_arn=cluster_arn,
+            secret_arn=secret_arn,
+            db_name=db_name,
+            region=region,
+            max_concurrency=max_concurrency,
+            resume_timeout=resume_timeout,
+            client=client
+        )
+        self.prewarm_interval = prewarm_interval
+        self.last_success = None
+        self._prewarm_future = None
+        self._prewarm_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="rds-data")
+
+    # Data API client of the default backend
+    @property
+    def rds_client(self):
+        return self.backend.rds_client
+
+    @rds_client.setter
+    def rds_client(self, client):
+        self.backend.rds_client = client
+
+    # Runs a call of the client on the thread pool without blocking the event loop. Waiting for a
+    # free worker counts towards the timeout; on timeout an error result is returned while the
+    # call finishes in the background (cancelled by the database at the same deadline)
+    async def run_async(self, call, timeout: Optional[float]) -> Dict[str, Any]:
+        if timeout is not None and timeout <= 0:
+            logger.error("Query not started, the request deadline has passed")
+            return timeout_result("the request deadline passed before the query started")
+        try:
+            return await asyncio.wait_for(asyncio.get_running_loop().run_in_executor(self.executor, call), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Query timed out after {timeout:.1f} seconds")
+            return timeout_result(f"query timed out after {timeout:.1f} seconds")
+
+    # Returns the timeout and deadline of a call: the earlier of the caller's deadline (a
+    # time.monotonic() value) and the timeout, which defaults to query_timeout
+    def time_limits(self, timeout: Optional[float], deadline: Optional[float]) -> tuple[Optional[float], Optional[float]]:
+        timeout = self.query_timeout if timeout is None else timeout
+        now = time.monotonic()
+        if timeout:
+            deadline = now + timeout if deadline is None else min(deadline, now + timeout)
+        return (None, None) if deadline is None else (deadline - now, deadline)
+
+    # Executes a SQL query without blocking the event loop (see run_async), within the timeout and
+    # the deadline (see time_limits)
+    async def execute_query_async(
+        self,
+        sql_query: str,
+        parameters: Dict[str, Any] = None,
+        max_rows: int = 0,
+        max_bytes: int = 0,
+        result_format: str = "json",
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        timeout, deadline = self.time_limits(timeout, deadline)
+        call = functools.partial(
+            self.execute_query,
+            sql_query,
+            parameters=parameters,
+            max_rows=max_rows,
+            max_bytes=max_bytes,
+            result_format=result_format,
+            # Resume retries give up in time to report the resume rather than a timeout
+            deadline=deadline
+        )
+        return await self.run_async(call, timeout)
+
+    # Returns the estimated plan of a SQL query without blocking the event loop (see run_async)
+    async def explain_query_async(
+        self,
+        sql_query: str,
+        parameters: Dict[str, Any] = None,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        timeout, deadline = self.time_limits(timeout, deadline)
+        call = functools.partial(
+            self.backend.explain_query,
+            sql_query,
+            parameters=parameters,
+            deadline=deadline
+        )
+        return await self.run_async(call, timeout)
+
+    # Executes a SQL query on the RDS instance (optionally with named :parameters) with the backend,
+    # keeping at most max_rows rows / max_bytes bytes of records (0 = unlimited)
+    def execute_query(
+        self,
+        sql_query: str,
+        parameters: Dict[str, Any] = None,
+        max_rows: int = 0,
+        max_bytes: int = 0,
+        result_format: str = "json",
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        result = self.backend.execute_query(
+            sql_query,
+            parameters=parameters,
+            max_rows=max_rows,
+            max_bytes=max_bytes,
+            result_format=result_format,
+            deadline=deadline
+        )
+        if result["success"]:
+            self.last_success = time.monotonic()
+        return result
+
+    # Tests the connection to the RDS instance using a sample query
+    def test_connection(self) -> tuple[bool, str]:
+        success, error = self.backend.test_connection()
+        if success:
+            self.last_success = time.monotonic()
+        return success, error
+
+    # Sends a cheap query in the background without waiting for it, so an Aurora resume or scale-up
+    # starts while the caller does something else (e.g. the client's LLM generates the SQL query).
+    # Skipped when the database answered recently or a prewarm is still running. Returns the
+    # future of the connection test, or None when skipped
+    def prewarm(self) -> Optional[Future]:
+        with self._prewarm_lock:
+            if self._prewarm_future is not None and not self._prewarm_future.done():
+                return None
+            if self.last_success is not None and time.monotonic() - self.last_success < self.prewarm_interval:
+                return None
+            self._prewarm_future = self.executor.submit(self.test_connection)
+            return self._prewarm_future
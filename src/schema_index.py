@@ -0,0 +1,244 @@
+import math
+import re
+from collections import deque
+from typing import Dict, List, Optional
+
+# Start of a table definition (the opening parenthesis of the column list is matched separately)
+CREATE_TABLE_PATTERN = re.compile(
+    r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(?P<name>(?:\"[^\"]+\"|\w+)(?:\.(?:\"[^\"]+\"|\w+))?)\s*\(",
+    re.IGNORECASE
+)
+COLUMN_PATTERN = re.compile(r"^(?P<name>\"[^\"]+\"|\w+)\s+(?P<type>\w+)")
+REFERENCES_PATTERN = re.compile(r"\bREFERENCES\s+(?P<table>(?:\"[^\"]+\"|\w+)(?:\.(?:\"[^\"]+\"|\w+))?)", re.IGNORECASE)
+# Table aliases used in the notes of the schema (e.g. "JOIN ticket_statuses ts ON ...")
+ALIAS_PATTERN = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)\s+(?:AS\s+)?(\w+)\s+ON\b", re.IGNORECASE)
+CONSTRAINT_WORDS = frozenset(["PRIMARY", "FOREIGN", "UNIQUE", "CONSTRAINT", "CHECK", "EXCLUDE"])
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Words that say nothing about which tables a question is about
+STOP_WORDS = frozenset([
+    "a", "about", "all", "along", "an", "and", "any", "are", "as", "at", "be", "by", "each", "every", "find",
+    "for", "from", "get", "give", "has", "have", "how", "in", "is", "it", "its", "last", "list", "many",
+    "me", "most", "much", "of", "on", "or", "per", "show", "than", "that", "the", "their", "them", "there",
+    "these", "this", "those", "to", "was", "were", "what", "when", "where", "which", "who", "with"
+])
+
+# Relative weight of a question word matching a table's name, column names or comments
+NAME_WEIGHT = 3.0
+COLUMN_WEIGHT = 1.0
+COMMENT_WEIGHT = 0.5
+
+# Reduces a word to a crude singular form so "priorities" matches "priority" and "tickets" matches "ticket"
+def normalize_word(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ses", "xes", "ches", "shes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+# Splits text (including snake_case identifiers) into normalized words, dropping stop words
+def extract_words(text: str) -> set:
+    return {
+        normalize_word(word)
+        for word in WORD_PATTERN.findall(text.lower().replace("_", " "))
+        if len(word) > 1 and word not in STOP_WORDS
+    }
+
+# Returns the unquoted, lowercase table name without its schema
+def table_key(name: str) -> str:
+    return name.split(".")[-1].strip('"').lower()
+
+# A table of the schema along with the text that defines it (its leading comments and CREATE TABLE statement)
+class TableInfo:
+    __slots__ = ("name", "comment", "columns", "references", "text", "name_words", "column_words", "comment_words")
+
+    def __init__(self, name: str, comment: str, columns: Dict[str, str], references: set, text: str):
+        self.name = name
+        self.comment = comment
+        self.columns = columns
+        self.references = references
+        self.text = text
+        self.name_words = extract_words(name)
+        self.column_words = extract_words(" ".join(columns))
+        self.comment_words = extract_words(" ".join([comment, *columns.values()]))
+
+# Index of the tables, columns, comments and foreign keys of a schema.sql file, used to build a
+# schema that only contains the tables relevant to a question (and the tables joining them)
+class SchemaIndex:
+    def __init__(self, schema: str, relevance_ratio: float = 0.3):
+        self.schema = schema
+        self.relevance_ratio = relevance_ratio
+        self.tables: Dict[str, TableInfo] = {}
+        self.notes: List[str] = []
+        self._parse(schema)
+        self.aliases = {
+            alias.lower(): table.lower()
+            for table, alias in ALIAS_PATTERN.findall("\n".join(self.notes))
+            if table.lower() in self.tables
+        }
+
+        # Words found in every table don't help telling them apart (inverse document frequency)
+        document_counts: Dict[str, int] = {}
+        for table in self.tables.values():
+            for word in table.name_words | table.column_words | table.comment_words:
+                document_counts[word] = document_counts.get(word, 0) + 1
+        self.word_weights = {
+            word: math.log((len(self.tables) + 1) / count) for word, count in document_counts.items()
+        }
+
+        # Foreign keys as an undirected graph, joins work both ways
+        self.graph: Dict[str, set] = {name: set() for name in self.tables}
+        for table in self.tables.values():
+            for reference in table.references:
+                if reference in self.graph and reference != table.name:
+                    self.graph[table.name].add(reference)
+                    self.graph[reference].add(table.name)
+
+    # Returns the tables relevant to the question, in schema order (empty if nothing matches)
+    def relevant_tables(self, user_query: str) -> List[str]:
+        words = extract_words(user_query)
+        scores = {}
+        for table in self.tables.values():
+            score = 0.0
+            for word in words:
+                weight = self.word_weights.get(word, 0.0)
+                if word in table.name_words:
+                    score += NAME_WEIGHT * weight
+                elif word in table.column_words:
+                    score += COLUMN_WEIGHT * weight
+                elif word in table.comment_words:
+                    score += COMMENT_WEIGHT * weight
+            if score > 0:
+                scores[table.name] = score
+        if not scores:
+            return []
+
+        threshold = max(scores.values()) * self.relevance_ratio
+        selected = {name for name, score in scores.items() if score >= threshold}
+        selected |= self._join_tables(selected)
+        return [name for name in self.tables if name in selected]
+
+    # Returns the part of the schema needed to answer the question. The whole schema is returned
+    # when no table matches (or every table does), so the model is never left without context
+    def prune(self, user_query: str) -> str:
+        tables = self.relevant_tables(user_query)
+        if not tables or len(tables) == len(self.tables):
+            return self.schema
+        return self.render(tables)
+
+    # Builds the schema text of the given tables, along with the notes that only mention them
+    # (by name or by the aliases the notes use for them)
+    def render(self, tables: List[str]) -> str:
+        selected = set(tables)
+        parts = [self.tables[name].text for name in tables]
+
+        notes = []
+        for line in self.notes:
+            mentioned = {word for word in re.findall(r"\b\w+\b", line.lower()) if word in self.tables}
+            mentioned |= {self.aliases[alias] for alias in re.findall(r"\b(\w+)\.", line.lower()) if alias in self.aliases}
+            if mentioned <= selected:
+                notes.append(line)
+        if any(line.strip(" -=") for line in notes):
+            parts.append("\n".join(notes).strip("\n"))
+        return "\n\n".join(parts) + "\n"
+
+    # Returns the tables on the shortest foreign key paths between the selected tables
+    def _join_tables(self, selected: set) -> set:
+        path_tables = set()
+        ordered = [name for name in self.tables if name in selected]
+        for i, source in enumerate(ordered):
+            for target in ordered[i + 1:]:
+                path = self._shortest_path(source, target)
+                if path:
+                    path_tables.update(path)
+        return path_tables
+
+    # Breadth-first search over the foreign key graph (None when the tables aren't connected)
+    def _shortest_path(self, source: str, target: str) -> Optional[List[str]]:
+        previous = {source: None}
+        queue = deque([source])
+        while queue:
+            name = queue.popleft()
+            if name == target:
+                path = []
+                while name is not None:
+                    path.append(name)
+                    name = previous[name]
+                return path
+            for neighbour in sorted(self.graph[name]):
+                if neighbour not in previous:
+                    previous[neighbour] = name
+                    queue.append(neighbour)
+        return None
+
+    # Splits the schema into table definitions (with the comment lines right above them) and notes
+    def _parse(self, schema: str) -> None:
+        position = 0
+        for match in CREATE_TABLE_PATTERN.finditer(schema):
+            if match.start() < position:
+                continue
+            end = self._statement_end(schema, match.end())
+
+            # The comment block directly above the statement describes the table
+            start = match.start()
+            lines_before = schema[position:start].split("\n")
+            comment_lines = []
+            while len(lines_before) > 1 and lines_before[-2].strip().startswith("--"):
+                comment_lines.insert(0, lines_before.pop(-2))
+            self.notes.extend(line for line in "\n".join(lines_before[:-1]).split("\n") if line.strip())
+            start -= sum(len(line) + 1 for line in comment_lines)
+
+            name = table_key(match.group("name"))
+            body = schema[match.end():end]
+            comment = " ".join(line.strip().lstrip("-").strip() for line in comment_lines)
+            self.tables[name] = TableInfo(
+                name=name,
+                comment=comment,
+                columns=self._parse_columns(body),
+                references={table_key(reference) for reference in REFERENCES_PATTERN.findall(body)},
+                text=schema[start:end].rstrip()
+            )
+            position = end
+        self.notes.extend(schema[position:].strip("\n").split("\n"))
+
+    # Returns the column names of a table body along with their trailing comments
+    @staticmethod
+    def _parse_columns(body: str) -> Dict[str, str]:
+        columns = {}
+        for line in body.split("\n"):
+            definition, _, comment = line.partition("--")
+            match = COLUMN_PATTERN.match(definition.strip())
+            if match and match.group("name").upper() not in CONSTRAINT_WORDS:
+                columns[match.group("name").strip('"').lower()] = comment.strip()
+        return columns
+
+    # Returns the position right after the statement that starts at the given position (after the
+    # closing parenthesis and semicolon), skipping comments and quoted text
+    @staticmethod
+    def _statement_end(schema: str, position: int) -> int:
+        depth = 1
+        length = len(schema)
+        while position < length:
+            char = schema[position]
+            if schema.startswith("--", position):
+                newline = schema.find("\n", position)
+                position = length if newline == -1 else newline
+                continue
+            if char in ("'", '"'):
+                closing = schema.find(char, position + 1)
+                position = length if closing == -1 else closing + 1
+                continue
+            if char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+                if depth == 0:
+                    semicolon = schema.find(";", position)
+                    newline = schema.find("\n", position)
+                    if semicolon != -1 and (newline == -1 or semicolon < newline):
+                        return semicolon + 1
+                    return position + 1
+            position += 1
+        return length
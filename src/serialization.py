@@ -0,0 +1,30 @@
+import json
+from typing import Any
+
+# orjson is an optional, much faster JSON backend; the standard library is used when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+# Serializes a tool result into compact UTF-8 JSON (values that aren't JSON types are written as strings)
+def dumps_bytes(value: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # e.g. integers beyond 64 bits, which the standard library can still write
+            pass
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+# Serializes a tool result into a compact JSON string
+def dumps(value: Any) -> str:
+    return dumps_bytes(value).decode("utf-8")
+
+# Parses JSON text or bytes with the same backend
+def loads(data: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
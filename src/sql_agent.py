@@ -1,12 +1,14 @@
 import logging
 import json
 import re
-import boto3
+import threading
+from collections import OrderedDict
+from typing import Optional
 from botocore.exceptions import ClientError
-import sqlparse
-from sqlparse.tokens import Keyword, DML, Punctuation
 
-from prompt import create_system_prompt
+from prompt import create_prompt_blocks
+from rate_limiter import RateLimiter, ThrottlingError
+from sql_validator import SQLAnalysis, analyze_sql, normalize_sql, validate_sql as validate_sql_query
 
 logging.basicConfig(
     level=logging.INFO,
@@ -15,138 +17,316 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Most tokens the model may generate for a query
+MAX_TOKENS = 3000
+
+# Count of a top-level LIMIT / FETCH clause (read at the position the analysis found the keyword at).
+# The LIMIT count only counts when it ends the clause (OFFSET, FETCH, the end of the statement or
+# comments follow it): "LIMIT 10 + 5000" is an expression, not a count of 10
+LIMIT_COUNT_PATTERN = re.compile(
+    r"LIMIT\s+(?P<count>\d+|ALL)(?=(?:\s+|--[^\n]*|/\*.*?\*/)*(?:\Z|;|OFFSET\b|FETCH\b))",
+    re.IGNORECASE | re.DOTALL
+)
+FETCH_COUNT_PATTERN = re.compile(r"FETCH\s+(?:FIRST|NEXT)\s+(?P<count>\d+)?\s*ROWS?\b", re.IGNORECASE)
+
+# Bounds the rows a validated SELECT query can return: adds an outer LIMIT when the query has no
+# top-level LIMIT/FETCH, and lowers a larger top-level LIMIT/FETCH count to max_limit. A count
+# that isn't a plain number (e.g. a subquery) is bounded by wrapping the query. CTEs, DISTINCT ON
+# and window ORDER BYs are inside parentheses, so only the clauses of the outer query are touched.
+# Returns the query (unchanged when already bounded) and a description of the change, or None
+def enforce_limit(sql_query: str, max_limit: int, analysis: Optional[SQLAnalysis] = None) -> tuple[str, Optional[str]]:
+    if max_limit <= 0:
+        return sql_query, None
+    if analysis is None:
+        analysis = analyze_sql(sql_query)
+
+    # The statement ends at its semicolon; whatever follows (a comment) is kept after it
+    end = analysis.terminator if analysis.terminator is not None else len(sql_query)
+    body, tail = sql_query[:end].rstrip(), sql_query[end:]
+
+    for keyword, pattern in (("LIMIT", LIMIT_COUNT_PATTERN), ("FETCH", FETCH_COUNT_PATTERN)):
+        position = analysis.top_level_clauses.get(keyword)
+        if position is None:
+            continue
+        match = pattern.match(body, position)
+        if match is None:
+            # Not a plain count, bounded by the outer LIMIT below
+            break
+        count = match.group("count")
+        if count is None or (count.isdigit() and int(count) <= max_limit):
+            return sql_query, None
+        start, stop = match.span("count")
+        rewritten = body[:start] + str(max_limit) + body[stop:] + tail
+        return rewritten, f"Lowered {keyword} {count} to {max_limit}"
+    else:
+        # A line comment at the end of the query would swallow the clause
+        separator = "\n" if "--" in body.rsplit("\n", 1)[-1] else " "
+        return f"{body}{separator}LIMIT {max_limit}{tail}", f"Added LIMIT {max_limit}"
+
+    return f"SELECT * FROM (\n{body}\n) AS limited_query LIMIT {max_limit}{tail}", f"Wrapped the query in LIMIT {max_limit}"
+
+# Tags the prompt asks the model to put the SQL query in
+SQL_START_TAG = "<sql_statement>"
+SQL_END_TAG = "</sql_statement>"
+
+# Extracts the SQL query from a completion (contained in <sql_statement> tags). A missing closing
+# tag (e.g. the completion ran out of tokens) keeps everything after the opening tag, and a
+# completion without tags is taken as the SQL query itself
+def extract_sql(text_response: str) -> str:
+    start = text_response.find(SQL_START_TAG)
+    if start == -1:
+        return text_response.strip()
+    start += len(SQL_START_TAG)
+    end = text_response.find(SQL_END_TAG, start)
+    return text_response[start:end if end != -1 else len(text_response)].strip()
+
+# Incremental version of extract_sql for streamed completions. Only the text that may still hold
+# a tag split across chunks is searched again when a chunk arrives
+class SQLStatementParser:
+    def __init__(self):
+        self.text = ""
+        self.start = -1
+        self.end = -1
+        self._searched = 0
+
+    # Adds a chunk of the completion, returns True once the SQL statement is complete
+    def feed(self, chunk: str) -> bool:
+        if self.end != -1:
+            return True
+        self.text += chunk
+        if self.start == -1:
+            position = self.text.find(SQL_START_TAG, self._searched)
+            if position == -1:
+                self._searched = max(0, len(self.text) - len(SQL_START_TAG) + 1)
+                return False
+            self.start = position + len(SQL_START_TAG)
+            self._searched = self.start
+        position = self.text.find(SQL_END_TAG, self._searched)
+        if position == -1:
+            self._searched = max(self.start, len(self.text) - len(SQL_END_TAG) + 1)
+            return False
+        self.end = position
+        return True
+
+    # Returns the SQL query read so far (see extract_sql)
+    def sql_query(self) -> str:
+        if self.start == -1:
+            return self.text.strip()
+        return self.text[self.start:self.end if self.end != -1 else len(self.text)].strip()
+
 # Generates and validates SQL queries from a user's natural language query 
 # using a Bedrock agent and a custom prompt
 class SQLAgent:
-    def __init__(self, model_id: str = "anthropic.claude-3-5-sonnet-20240620-v1:0", region: str = "us-east-1"):
+    def __init__(
+        self,
+        model_id: str = "anthropic.claude-3-5-sonnet-20240620-v1:0",
+        region: str = "us-east-1",
+        validation_cache_size: int = 1024,
+        prompt_caching: bool = True,
+        streaming: bool = True,
+        rate_limiter: RateLimiter = None,
+        max_limit: int = 1000
+    ):
         self.model_id = model_id
         self.region = region
-        self.bedrock_agent = boto3.client(service_name='bedrock-runtime', region_name=region)
+        self.prompt_caching = prompt_caching
+        self.streaming = streaming
+        # Shared by every call made through this agent (Bedrock quotas are per account and model)
+        self.rate_limiter = rate_limiter or RateLimiter()
+        # Most rows a query may return once rewritten (0 leaves queries as they are)
+        self.max_limit = max_limit
+        self._bedrock_agent = None
+
+        # Memo of validation verdicts keyed on query fingerprints and texts (bounded, LRU)
+        self.validation_cache_size = validation_cache_size
+        self._validation_cache: "OrderedDict[str, tuple[bool, str]]" = OrderedDict()
+        self._validation_lock = threading.Lock()
+        self.validation_cache_hits = 0
+        self.validation_cache_misses = 0
+
+    # Bedrock runtime client, created on first use since most requests never generate SQL here
+    @property
+    def bedrock_agent(self):
+        if self._bedrock_agent is None:
+            import boto3
+            from botocore.config import Config
+            # Throttled calls are retried by the rate limiter, not by botocore
+            self._bedrock_agent = boto3.client(
+                service_name='bedrock-runtime',
+                region_name=self.region,
+                config=Config(retries={"max_attempts": 1, "mode": "standard"})
+            )
+        return self._bedrock_agent
 
     # Generates SQL query from user's natural language query    
     def generate_sql(self, user_query: str) -> tuple[str, str]:
-        # Create system prompt for the Bedrock agent using the user's query  
-        system_prompt = create_system_prompt(user_query=user_query)
-        body = json.dumps({
+        body = self.build_request_body(user_query)
+        # Bedrock counts the prompt and max_tokens against the tokens per minute quota up front
+        estimated_tokens = len(body) // 4 + MAX_TOKENS
+
+        # Run the Bedrock agent using the prompt (Claude Sonnet 3.5)
+        try:
+            generate = self._generate_streaming if self.streaming else self._generate
+            sql_query, usage = self.rate_limiter.call(lambda: generate(body), tokens=estimated_tokens)
+        except (ClientError, Exception) as error:
+            logger.error(f"ERROR: Can't invoke '{self.model_id}'. Reason: {error}")
+            return None, f"Error invoking model: {error}"
+        self.rate_limiter.record_usage(
+            estimated_tokens,
+            sum(usage.get(key) or 0 for key in (
+                "input_tokens", "cache_read_input_tokens", "cache_creation_input_tokens", "output_tokens"
+            ))
+        )
+        logger.info(
+            f"Prompt tokens: {usage.get('input_tokens')} input, "
+            f"{usage.get('cache_read_input_tokens', 0)} read from cache, "
+            f"{usage.get('cache_creation_input_tokens', 0)} written to cache"
+        )
+
+        # Validate the SQL query
+        is_valid, validation_error = self.validate_sql(sql_query)
+        if not is_valid:
+            return None, f"SQL validation failed: {validation_error}"
+
+        return sql_query, None
+
+    # Builds the Bedrock request body for the user's query
+    def build_request_body(self, user_query: str) -> str:
+        # Create system prompt for the Bedrock agent using the user's query (the static
+        # prefix is sent as a cacheable block, so only the query part is processed each time)
+        content = create_prompt_blocks(user_query=user_query)
+        if not self.prompt_caching:
+            content = [{"type": "text", "text": block["text"]} for block in content]
+        return json.dumps({
             "anthropic_version": "bedrock-2023-05-31",
             "temperature": 0.1,
-            "max_tokens": 3000,
+            "max_tokens": MAX_TOKENS,
             "messages": [
                 {
                     "role": "user",
-                    "content": [{"type": "text", "text": system_prompt}],
+                    "content": content,
                 }
             ],
         })
 
-        # Run the Bedrock agent using the prompt (Claude Sonnet 3.5)
-        try:
-            response = self.bedrock_agent.invoke_model(
-                modelId=self.model_id,
-                body=body
-            )
-        except (ClientError, Exception) as error:
-            logger.error(f"ERROR: Can't invoke '{self.model_id}'. Reason: {error}")
-            return None, f"Error invoking model: {error}"
+    # Waits for the whole completion and extracts the SQL query from it
+    def _generate(self, body: str) -> tuple[str, dict]:
+        response = self.bedrock_agent.invoke_model(
+            modelId=self.model_id,
+            body=body
+        )
 
         # Decode the response from the Bedrock agent
         decoded_response = json.loads(response["body"].read())
         text_response = decoded_response["content"][0]["text"]
+        return extract_sql(text_response), decoded_response.get("usage", {})
 
-        # Extract the SQL query from the response (contained in <sql_statement> tags)
-        if '<sql_statement>' in text_response:
-            start = text_response.find('<sql_statement>') + len('<sql_statement>')
-            end = text_response.find('</sql_statement>')
-            if end != -1:
-                sql_query = text_response[start:end].strip()
-        else:
-            sql_query = text_response.strip()
+    # Reads the completion as it is generated and stops as soon as the SQL statement is complete,
+    # so the explanation the model writes after it is never waited for. Streaming needs the
+    # bedrock:InvokeModelWithResponseStream action: a role that only has bedrock:InvokeModel
+    # falls back to waiting for whole completions
+    def _generate_streaming(self, body: str) -> tuple[str, dict]:
+        try:
+            response = self.bedrock_agent.invoke_model_with_response_stream(
+                modelId=self.model_id,
+                body=body
+            )
+        except ClientError as error:
+            if error.response.get("Error", {}).get("Code") != "AccessDeniedException":
+                raise
+            logger.warning(f"Streaming isn't allowed for '{self.model_id}', using invoke_model instead: {error}")
+            self.streaming = False
+            return self._generate(body)
 
-        # Validate the SQL query
-        is_valid, validation_error = self.validate_sql(sql_query)
-        if not is_valid:
-            return None, f"SQL validation failed: {validation_error}"
+        stream = response["body"]
+        parser = SQLStatementParser()
+        usage = {}
+        try:
+            for event in stream:
+                chunk = event.get("chunk")
+                if chunk is None:
+                    # Errors are reported as events of their own (e.g. throttlingException)
+                    if "throttlingException" in event or "serviceUnavailableException" in event:
+                        raise ThrottlingError(f"Model stream throttled: {event}")
+                    raise RuntimeError(f"Model stream error: {event}")
 
-        return sql_query, None
+                message = json.loads(chunk["bytes"])
+                if message.get("type") == "message_start":
+                    usage = message.get("message", {}).get("usage", {})
+                elif message.get("type") == "content_block_delta":
+                    if parser.feed(message.get("delta", {}).get("text", "")):
+                        break
+        finally:
+            # Closing the stream stops reading the rest of the completion
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        # The stream was closed before the output token count arrived, estimate it from the text
+        usage = dict(usage, output_tokens=max(usage.get("output_tokens") or 0, len(parser.text) // 4))
+        return parser.sql_query(), usage
 
     # Validates the SQL query to ensure it is safe and follows SQL syntax
+    # (verdicts are memoized by query fingerprint, so repeated queries skip parsing). The fingerprint
+    # is the query as normalized by the validator's lexer (whitespace collapsed, unquoted keywords
+    # and names case-folded, literals kept), which gets the same verdict as the query itself; the
+    # exact text is memoized too, so a repeated query isn't even normalized again
     def validate_sql(self, sql_query: str) -> tuple[bool, str]:
-        PROHIBITED_KEYWORDS = [
-            "INSERT", "UPDATE", "DELETE", "MERGE", "UPSERT", "REPLACE",
-            "DROP", "ALTER", "CREATE", "TRUNCATE", "GRANT", "REVOKE",
-            "CALL", "EXEC", "EXECUTE", "UNION", "INTERSECT", "EXCEPT", "MINUS",
-            "BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "COPY", 
-            "LOAD", "IMPORT", "EXPORT",
-        ]
-        PROHIBITED_SELECT_KEYWORDS = ["INTO"]
-        DISALLOWED_SCHEMAS = [
-            "INFORMATION_SCHEMA", "PG_CATALOG", "PG_TOAST", "PG_TEMP", "PG_TOAST_TEMP"
-        ]
-        DISALLOWED_TABLE_PREFIXES = ["PG_STAT"]
-
-        if not isinstance(sql_query, str) or not sql_query.strip():
-            return False, "Empty or invalid SQL string"
-
-        statements = [s for s in sqlparse.parse(sql_query) if s.tokens and not s.is_whitespace]
-        if not statements:
-            return False, "Empty or invalid SQL query"
-        if len(statements) != 1:
-            return False, "Multiple statements are not allowed"
-        stmt = statements[0]
-
-        flat = []
-        stack = list(stmt.tokens)
-        while stack:
-            t = stack.pop(0)
-            if getattr(t, "is_group", False):
-                stack = list(t.tokens) + stack
+        if not isinstance(sql_query, str) or self.validation_cache_size <= 0:
+            return self._validate_sql(sql_query)
+
+        with self._validation_lock:
+            verdict = self._validation_cache.get(sql_query)
+            if verdict is not None:
+                self._validation_cache.move_to_end(sql_query)
+                self.validation_cache_hits += 1
+                return verdict
+
+        fingerprint = self.fingerprint_sql(sql_query)
+        with self._validation_lock:
+            verdict = self._validation_cache.get(fingerprint)
+            if verdict is not None:
+                self._validation_cache.move_to_end(fingerprint)
+                self.validation_cache_hits += 1
             else:
-                flat.append(t)
-
-        if (stmt.get_type() or "").upper() != "SELECT":
-            return False, "Only SELECT queries are allowed"
-
-        for t in flat:
-            if (t.ttype in (Keyword, DML)) or str(t.ttype).startswith("Token.Keyword"):
-                if t.value.upper() in PROHIBITED_KEYWORDS:
-                    return False, "Query contains prohibited keywords (DDL/DML/set operations)"
-        
-        saw_select = False
-        before_from = True
-        for t in flat:
-            if (t.ttype in (Keyword, DML)) or str(t.ttype).startswith("Token.Keyword"):
-                val = t.value.upper()
-                if val == "SELECT":
-                    saw_select = True
-                elif val == "FROM":
-                    before_from = False
-                elif saw_select and before_from and val in PROHIBITED_SELECT_KEYWORDS:
-                    return False, "SELECT INTO is not allowed"
-
-        mid_semicolon = any(t.ttype is Punctuation and t.value == ";" for t in flat)
-        if mid_semicolon and not sql_query.strip().endswith(";"):
-            return False, "Semicolons in the middle of the query are not allowed"
-        
-        sql_up = sql_query.upper()
-        from_like_patterns = [
-            r"\bFROM\s+(?:ONLY\s+)?(?P<obj>(?:\"[^\"]+\"|\w+)(?:\.(?:\"[^\"]+\"|\w+))?)",
-            r"\bJOIN\s+(?:ONLY\s+)?(?P<obj>(?:\"[^\"]+\"|\w+)(?:\.(?:\"[^\"]+\"|\w+))?)",
-        ]
-        for pat in from_like_patterns:
-            for m in re.finditer(pat, sql_up):
-                obj = m.group("obj").strip()
-                parts = [p[1:-1] if len(p) >= 2 and p[0] == '"' and p[-1] == '"' else p for p in obj.split(".")]
-                parts = [p.strip() for p in parts if p.strip()]
-                if not parts:
-                    continue
-
-                if len(parts) >= 2:
-                    schema = parts[0]
-                    if schema in DISALLOWED_SCHEMAS or schema.startswith("PG_"):
-                        return False, f"Access to schema '{schema}' is not allowed"
-                else:
-                    tbl = parts[0]
-                    if any(tbl.startswith(prefix) for prefix in DISALLOWED_TABLE_PREFIXES):
-                        return False, f"Access to table '{tbl}' is not allowed"
-        
-        return True, None
\ No newline at end of file
+                self.validation_cache_misses += 1
+
+        if verdict is None:
+            verdict = self._validate_sql(sql_query)
+        with self._validation_lock:
+            self._validation_cache[fingerprint] = verdict
+            self._validation_cache[sql_query] = verdict
+            while len(self._validation_cache) > self.validation_cache_size:
+                self._validation_cache.popitem(last=False)
+        return verdict
+
+    # Rewrites a validated query so it returns at most max_limit rows. Returns the query to run
+    # and a description of the change (None when the query is already bounded)
+    def rewrite_sql(self, sql_query: str) -> tuple[str, Optional[str]]:
+        analysis = analyze_sql(sql_query)
+        if analysis.statement_type != "SELECT":
+            return sql_query, None
+        return enforce_limit(sql_query, self.max_limit, analysis)
+
+    # Returns the whitespace- and case-insensitive fingerprint of the query (leading and trailing
+    # whitespace never changes the verdict, so it is dropped)
+    @staticmethod
+    def fingerprint_sql(sql_query: str) -> str:
+        return normalize_sql(sql_query.strip())
+
+    # Returns the hit/miss counters and size of the validation memo
+    def validation_cache_info(self) -> dict:
+        with self._validation_lock:
+            return {
+                "hits": self.validation_cache_hits,
+                "misses": self.validation_cache_misses,
+                "size": len(self._validation_cache),
+                "max_size": self.validation_cache_size
+            }
+
+    # Runs the full validation of the SQL query (without memoization)
+    def _validate_sql(self, sql_query: str) -> tuple[bool, str]:
+        return validate_sql_query(sql_query)
+
+    # Returns the (lowercased, unqualified) table names the query reads from via FROM/JOIN
+    def extract_tables(self, sql_query: str) -> set[str]:
+        return set(analyze_sql(sql_query).tables)
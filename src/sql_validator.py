@@ -0,0 +1,437 @@
+import re
+from typing import Optional
+
+# Keywords that are never allowed in a query (DDL/DML/set operations/transactions).
+# IMPORT/EXPORT are not PostgreSQL keywords and are treated as plain names.
+PROHIBITED_KEYWORDS = frozenset([
+    "INSERT", "UPDATE", "DELETE", "MERGE", "UPSERT", "REPLACE",
+    "DROP", "ALTER", "CREATE", "TRUNCATE", "GRANT", "REVOKE",
+    "CALL", "EXEC", "EXECUTE", "UNION", "INTERSECT", "EXCEPT", "MINUS",
+    "BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "COPY", "LOAD",
+])
+PROHIBITED_SELECT_KEYWORDS = frozenset(["INTO"])
+DISALLOWED_SCHEMAS = frozenset([
+    "INFORMATION_SCHEMA", "PG_CATALOG", "PG_TOAST", "PG_TEMP", "PG_TOAST_TEMP"
+])
+DISALLOWED_TABLE_PREFIXES = ("PG_STAT",)
+
+# Keywords that determine the statement type (the first one after a WITH clause wins)
+DML_KEYWORDS = frozenset([
+    "SELECT", "INSERT", "UPDATE", "DELETE", "MERGE", "UPSERT", "REPLACE", "COMMIT", "ROLLBACK", "START"
+])
+
+# Clauses whose presence at the top level of the query is recorded (used when wrapping queries)
+CLAUSE_KEYWORDS = frozenset(["ORDER", "LIMIT", "OFFSET", "FETCH"])
+
+# Every word the validator needs to look at; all other words are skipped in bulk
+INTERESTING_WORDS = PROHIBITED_KEYWORDS | PROHIBITED_SELECT_KEYWORDS | DML_KEYWORDS | CLAUSE_KEYWORDS | frozenset([
+    "FROM", "WITH", "END", "GO"
+])
+
+# Builds a regex alternation grouped by first letter, so most words are ruled out after one character
+def _grouped_alternation(words) -> str:
+    groups: dict = {}
+    for word in sorted(words, key=len, reverse=True):
+        groups.setdefault(word[0], []).append(word[1:])
+    return "|".join(f"{first}(?:{'|'.join(rests)})" for first, rests in sorted(groups.items()))
+
+# Keywords the lexer recognizes at a word boundary even when "$" or "#" follows
+_BOUNDARY_KEYWORDS = r"(?:FROM|CREATE|END)\b"
+# Words that can't be skipped as part of a plain name run
+_NOT_PLAIN_WORD = (
+    r"(?!" + _BOUNDARY_KEYWORDS + r"|(?:"
+    + _grouped_alternation(INTERESTING_WORDS | {"CASE", "IN", "VALUES", "USING", "AS"})
+    + r")(?![\w$#]))"
+)
+
+# Names quoted the way other databases do, read as single names
+_FOREIGN_QUOTED_NAME = r"`(?:``|[^`])*`|´(?:´´|[^´])*´|\[(?<![\w\])]\[)[^\]\[]+\]"
+
+# Single lexer pattern, following the precedence of the usual SQL lexer rules
+# (comments, placeholders, names, numbers, operators, literals, words). "boring"
+# runs cover everything that can't change the verdict (whitespace, operators,
+# numbers, plain names, ...) so they are consumed in one step; the remaining
+# alternatives are the tokens the validator acts on. Like sqlparse, "#" followed by
+# a space starts a line comment; "#" followed by anything else is an operator.
+# String literals and quoted names are read as PostgreSQL reads them with
+# standard_conforming_strings on: a backslash only escapes a quote inside E'...'
+# literals, elsewhere quotes end by doubling.
+TOKEN_PATTERN = re.compile(
+    r"(?P<line_comment>(?:--|\# ).*?(?:\r\n|\r|\n|$))"
+    r"|(?P<literal>(?<![\w$#])E'(?:''|\\[\s\S]|[^'\\])*'|'(?:''|[^'])*'|\"(?:\"\"|[^\"])*\")"
+    r"|(?P<boring>(?:"
+    r"[\s,]+"
+    r"|\d(?:(?<=0)X[\dA-F]+|\d*(?:\.\d*)?(?:E-?\d+)?(?![_A-ZÀ-Ü])|[\w$#]*)"
+    r"|[*?=>~!{}\]]"
+    r"|(?!E')" + _NOT_PLAIN_WORD + r"[^\W\d][\w$#]*"
+    r"|" + _FOREIGN_QUOTED_NAME +
+    r"|(?:CASE|IN|VALUES|USING|AS)\b"
+    r"|[A-ZÀ-Ü](?!(?<=F)ROM\b)\w*(?=\s*\.(?!\d)|\()"
+    r"|\.(?:(?!FROM\b)[A-ZÀ-Ü]\w*)?"
+    r"|:(?:[:=]|(?<!\w:)\w+)"
+    r"|%(?:\(\w+\))?s"
+    r"|\\\w+"
+    r"|@(?:>|[A-ZÀ-Ü]\w+|[+/@\#%^&|-]*)"
+    r"|\#(?:\#[A-ZÀ-Ü]\w+|[A-ZÀ-Ü]\w+|>>?|-|(?! )[+/@\#%^&|-]*)"
+    r"|-(?:>>?|(?!-))"
+    r"|<@?"
+    r"|[+%^&|][+/@\#%^&|-]*"
+    r"|/(?!\*)[+/@\#%^&|-]*"
+    r"|[^\w\s'\"`´$;()\-/\#]"
+    r")+)"
+    r"|(?P<word>" + _BOUNDARY_KEYWORDS + r"|\w[\w$#]*)"
+    r"|(?P<punct>[;()])"
+    r"|(?P<char>[\s\S])",
+    re.IGNORECASE
+)
+
+# Dollar-quote delimiters ($$ or $tag$) and $-placeholders ($1)
+DOLLAR_DELIMITER_PATTERN = re.compile(r"(?<![\w\"$])\$(?:[_A-ZÀ-Ü]\w*)?\$", re.IGNORECASE)
+DOLLAR_PLACEHOLDER_PATTERN = re.compile(r"(?<!\w)\$\w+")
+
+# Parts of a "boring" run as normalize_sql sees them: quoted names and $-words (kept),
+# whitespace (collapsed) and everything else, single spaces included (case-folded)
+BORING_PART_PATTERN = re.compile(
+    r"(?P<quoted>" + _FOREIGN_QUOTED_NAME + r"|\$[\w$]*)"
+    r"|(?P<other>(?:[^\s`´\[$]| (?=[^\s`´\[$]))+)"
+    r"|(?P<space>\s+)"
+    r"|[\s\S]"
+)
+# Word characters that may spell a dollar-quote tag
+TAG_PATTERN = re.compile(r"\w*")
+ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+# Suffixes of multi-word keywords
+UNION_ALL_PATTERN = re.compile(r"\s+ALL\b", re.IGNORECASE)
+OR_REPLACE_PATTERN = re.compile(r"\s+OR\s+REPLACE\b", re.IGNORECASE)
+END_SUFFIX_PATTERN = re.compile(r"\s+(?:IF|LOOP|WHILE|FOR|CASE)\b", re.IGNORECASE)
+GO_COUNT_PATTERN = re.compile(r"\s\d+\b")
+
+# Objects referenced after FROM/JOIN (optionally schema-qualified and quoted)
+REFERENCE_PATTERN = re.compile(
+    r"(?P<kind>FROM|JOIN)\s+(?:ONLY\s+)?(?P<obj>(?:\"[^\"]+\"|\w+)(?:\.(?:\"[^\"]+\"|\w+))?)",
+    re.IGNORECASE
+)
+REFERENCE_WORD_PATTERN = re.compile(r"\b(?:FROM|JOIN)\b", re.IGNORECASE)
+
+# Everything the validator learns about a query from a single lexer pass
+class SQLAnalysis:
+    __slots__ = (
+        "statement_count", "statement_type", "has_prohibited_keyword", "has_select_into",
+        "has_semicolon", "from_references", "join_references", "tables", "top_level_clauses", "terminator"
+    )
+
+    def __init__(self):
+        self.statement_count = 0
+        self.statement_type = "UNKNOWN"
+        self.has_prohibited_keyword = False
+        self.has_select_into = False
+        self.has_semicolon = False
+        self.from_references: list[list[str]] = []
+        self.join_references: list[list[str]] = []
+        self.tables: set[str] = set()
+        self.top_level_clauses: dict[str, int] = {}
+        self.terminator: Optional[int] = None
+
+# Splits a possibly schema-qualified object name into its unquoted parts
+def split_object_name(obj: str) -> list[str]:
+    parts = [p[1:-1] if len(p) >= 2 and p[0] == '"' and p[-1] == '"' else p for p in obj.strip().split(".")]
+    return [p.strip() for p in parts if p.strip()]
+
+# Returns the closing position of a block comment or dollar quote, caching it in `closes`
+# so that many unclosed openers don't each search the rest of the query
+def _find_close(text: str, closing: str, start: int, closes: dict) -> int:
+    cached = closes.get(closing)
+    if cached is not None and (cached == -1 or cached >= start):
+        return cached
+    closes[closing] = text.find(closing, start)
+    return closes[closing]
+
+# Resolves a "char" token into a block comment, a dollar-quoted literal or a boring
+# character/$-placeholder, returning its kind and end position
+def resolve_char(text: str, pos: int, closes: dict) -> tuple[str, int]:
+    if text[pos] == "/":
+        close = _find_close(text, "*/", pos + (3 if text.startswith("/*+", pos) else 2), closes)
+        if close != -1:
+            return "block_comment", close + 2
+    elif text[pos] == "$":
+        delimiter = DOLLAR_DELIMITER_PATTERN.match(text, pos)
+        close = _find_close(text, delimiter.group(), delimiter.end(), closes) if delimiter else -1
+        if close != -1:
+            return "dollar_string", close + len(delimiter.group())
+        placeholder = DOLLAR_PLACEHOLDER_PATTERN.match(text, pos)
+        if placeholder:
+            return "boring", placeholder.end()
+    return "boring", pos + 1
+
+# Tokenizes the query once and collects the statement structure, keywords,
+# SELECT INTO, semicolons and FROM/JOIN references in the same pass (linear time)
+def analyze_sql(sql_query: str) -> SQLAnalysis:
+    analysis = SQLAnalysis()
+    text = sql_query
+    length = len(text)
+    match_token = TOKEN_PATTERN.match
+
+    # Statement splitting state (mirrors how statements are split on top-level semicolons)
+    analysis.statement_count = 1 if text.strip() else 0
+    level = 0
+    begin_blocks = 0
+    seen_begin = False
+    awaiting_statement = False
+    pending_statement = False
+
+    # Statement type state
+    first_token_seen = False
+    in_cte = False
+    after_with = False
+    depth = 0
+
+    # SELECT INTO state
+    saw_select = False
+    before_from = True
+
+    # Cached closing positions for block comments and dollar quotes (keeps unclosed openers linear)
+    closes: dict = {}
+
+    def add_reference(ref_match) -> None:
+        parts = split_object_name(ref_match.group("obj").upper())
+        if not parts:
+            return
+        if ref_match.group("kind").upper() == "FROM":
+            analysis.from_references.append(parts)
+        else:
+            analysis.join_references.append(parts)
+        analysis.tables.add(parts[-1].lower())
+
+    # References are looked for in every span of the query, including literals, comments
+    # and names (SQL passed to a function as a string can't be used to reach catalog tables)
+    def scan_span(start: int, end: int) -> None:
+        for word in REFERENCE_WORD_PATTERN.finditer(text, start, end):
+            ref_match = REFERENCE_PATTERN.match(text, word.start())
+            if ref_match:
+                add_reference(ref_match)
+
+    pos = 0
+    while pos < length:
+        m = match_token(text, pos)
+        kind = m.lastgroup
+        end = m.end()
+
+        if kind == "char":
+            kind, end = resolve_char(text, pos, closes)
+        value = text[pos:end]
+        is_space = kind == "boring" and value.isspace()
+
+        # After a split, plain whitespace and line comments still belong to the previous
+        # statement; a line break or anything else starts the next one, which only
+        # counts once it contains more than whitespace
+        if awaiting_statement:
+            if not (
+                (kind == "line_comment" and not value.startswith(("--+", "# +")))
+                or (is_space and "\n" not in value and "\r" not in value)
+            ):
+                awaiting_statement = False
+                level = 0
+                begin_blocks = 0
+                seen_begin = False
+                if is_space:
+                    pending_statement = True
+                else:
+                    analysis.statement_count += 1
+                    if analysis.statement_count > 1:
+                        return analysis
+        elif pending_statement and not is_space:
+            pending_statement = False
+            analysis.statement_count += 1
+            if analysis.statement_count > 1:
+                return analysis
+
+        if kind in ("line_comment", "block_comment"):
+            scan_span(pos, end)
+            pos = end
+            continue
+        if kind == "boring":
+            if not is_space:
+                scan_span(pos, end)
+        elif kind == "literal" or kind == "dollar_string":
+            scan_span(pos, end)
+        elif kind == "punct":
+            if value == ";":
+                analysis.has_semicolon = True
+                if seen_begin:
+                    seen_begin = False
+                    if begin_blocks:
+                        begin_blocks -= 1
+                        level -= 1
+                if level <= 0 and not begin_blocks:
+                    if analysis.terminator is None:
+                        analysis.terminator = pos
+                    awaiting_statement = True
+            elif value == "(":
+                level += 1
+                depth += 1
+            else:
+                level -= 1
+                depth = max(0, depth - 1)
+        elif kind == "word":
+            word = value.upper()
+            if word == "FROM":
+                ref_match = REFERENCE_PATTERN.match(text, pos)
+                if ref_match:
+                    add_reference(ref_match)
+
+            # Multi-word keywords ("UNION ALL", "CREATE OR REPLACE", "END IF", "GO 2")
+            # are single tokens whose text doesn't match any single keyword
+            suffix = None
+            if word == "UNION":
+                suffix = UNION_ALL_PATTERN.match(text, end)
+            elif word == "CREATE":
+                suffix = OR_REPLACE_PATTERN.match(text, end)
+            elif word == "END":
+                suffix = END_SUFFIX_PATTERN.match(text, end)
+            elif value == "GO":
+                suffix = GO_COUNT_PATTERN.match(text, end)
+            if suffix:
+                end = suffix.end()
+                word = word + suffix.group().upper()
+
+            if word in PROHIBITED_KEYWORDS:
+                analysis.has_prohibited_keyword = True
+            elif word in CLAUSE_KEYWORDS and depth == 0:
+                analysis.top_level_clauses.setdefault(word, pos)
+
+            if word == "SELECT":
+                saw_select = True
+            elif word == "FROM":
+                before_from = False
+            elif saw_select and before_from and word in PROHIBITED_SELECT_KEYWORDS:
+                analysis.has_select_into = True
+
+            # Statement type: a leading SELECT, or the first top-level DML after WITH
+            if not first_token_seen:
+                if word == "SELECT":
+                    analysis.statement_type = "SELECT"
+                elif word == "WITH":
+                    in_cte = True
+                    after_with = True
+                    first_token_seen = True
+                    pos = end
+                    continue
+            elif in_cte and depth == 0 and word in DML_KEYWORDS and not after_with:
+                analysis.statement_type = word
+                in_cte = False
+
+            if word == "BEGIN":
+                begin_blocks += 1
+                level += 1
+                seen_begin = True
+            elif word == "END":
+                level -= 1
+                if begin_blocks:
+                    begin_blocks -= 1
+            elif value == "GO":
+                awaiting_statement = True
+
+        if not is_space:
+            first_token_seen = True
+            after_with = False
+            if kind != "word" or value.upper() != "BEGIN":
+                seen_begin = False
+        pos = end
+
+    return analysis
+
+# Case-folds text[start:end] except for the word characters right after a "$" (they may
+# spell a case-sensitive dollar-quote tag)
+def _fold_case(text: str, start: int, end: int) -> str:
+    if start > 0 and text[start - 1] == "$":
+        tag_end = TAG_PATTERN.match(text, start, end).end()
+        return text[start:tag_end] + text[tag_end:end].translate(ASCII_LOWER)
+    return text[start:end].translate(ASCII_LOWER)
+
+# Normalizes a query with the validator's lexer, so that spellings of the same query that differ
+# only in whitespace or in the case of unquoted keywords and names (which PostgreSQL folds to
+# lower case, ASCII only) share one text. Whitespace runs are collapsed to one space, or to a
+# line break when they contain one (it ends "--" comments and starts statements); literals,
+# quoted names, comments and dollar-quoted bodies are kept as they are. Spellings the lexer
+# itself tells apart are kept too: "GO" and the whitespace after it ("GO 2" repeats a batch,
+# "GO  2" doesn't), whitespace after "#" ("# " starts a comment) or after a comment ending in
+# "\r" (a "\n" would join it), and the case of words that are or may become part of a
+# dollar-quote tag. The normalized query gets the same verdict as the original.
+def normalize_sql(sql_query: str) -> str:
+    text = sql_query
+    length = len(text)
+    match_token = TOKEN_PATTERN.match
+    match_part = BORING_PART_PATTERN.match
+    closes: dict = {}
+    parts = []
+
+    pos = 0
+    while pos < length:
+        m = match_token(text, pos)
+        kind = m.lastgroup
+        end = m.end()
+        if kind == "boring":
+            part_pos = pos
+            while part_pos < end:
+                part = match_part(text, part_pos, end)
+                part_end = part.end()
+                if part.lastgroup == "other":
+                    parts.append(_fold_case(text, part_pos, part_end))
+                elif part.lastgroup == "space" and not text.endswith(("#", "GO", "\r"), 0, part_pos):
+                    value = part.group()
+                    parts.append("\n" if ("\n" in value or "\r" in value) else " ")
+                else:
+                    parts.append(part.group())
+                part_pos = part_end
+        elif kind == "word":
+            value = m.group()
+            if value == "GO":
+                suffix = GO_COUNT_PATTERN.match(text, end)
+                if suffix:
+                    end = suffix.end()
+                parts.append(text[pos:end])
+            elif "$" in value:
+                parts.append(value)
+            else:
+                parts.append(_fold_case(text, pos, end))
+        else:
+            if kind == "char":
+                kind, end = resolve_char(text, pos, closes)
+            parts.append(text[pos:end])
+        pos = end
+
+    return "".join(parts)
+
+# Validates the SQL query to ensure it is safe and follows SQL syntax
+def validate_sql(sql_query: str, analysis: Optional[SQLAnalysis] = None) -> tuple[bool, str]:
+    if not isinstance(sql_query, str) or not sql_query.strip():
+        return False, "Empty or invalid SQL string"
+
+    if analysis is None:
+        analysis = analyze_sql(sql_query)
+    if analysis.statement_count == 0:
+        return False, "Empty or invalid SQL query"
+    if analysis.statement_count != 1:
+        return False, "Multiple statements are not allowed"
+    if analysis.statement_type != "SELECT":
+        return False, "Only SELECT queries are allowed"
+    if analysis.has_prohibited_keyword:
+        return False, "Query contains prohibited keywords (DDL/DML/set operations)"
+    if analysis.has_select_into:
+        return False, "SELECT INTO is not allowed"
+    if analysis.has_semicolon and not sql_query.strip().endswith(";"):
+        return False, "Semicolons in the middle of the query are not allowed"
+
+    for references in (analysis.from_references, analysis.join_references):
+        for parts in references:
+            if len(parts) >= 2:
+                schema = parts[0]
+                if schema in DISALLOWED_SCHEMAS or schema.startswith("PG_"):
+                    return False, f"Access to schema '{schema}' is not allowed"
+            else:
+                table = parts[0]
+                if any(table.startswith(prefix) for prefix in DISALLOWED_TABLE_PREFIXES):
+                    return False, f"Access to table '{table}' is not allowed"
+
+    return True, None
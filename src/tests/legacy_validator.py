@@ -0,0 +1,64 @@
+import re
+
+import sqlparse
+from sqlparse.tokens import Keyword, DML, Punctuation
+
+from sql_validator import DISALLOWED_SCHEMAS, DISALLOWED_TABLE_PREFIXES, PROHIBITED_KEYWORDS, split_object_name
+
+LEGACY_PROHIBITED_KEYWORDS = PROHIBITED_KEYWORDS | {"IMPORT", "EXPORT"}
+LEGACY_FROM_LIKE_PATTERNS = [
+    re.compile(r"\bFROM\s+(?:ONLY\s+)?(?P<obj>(?:\"[^\"]+\"|\w+)(?:\.(?:\"[^\"]+\"|\w+))?)"),
+    re.compile(r"\bJOIN\s+(?:ONLY\s+)?(?P<obj>(?:\"[^\"]+\"|\w+)(?:\.(?:\"[^\"]+\"|\w+))?)"),
+]
+
+# Previous sqlparse based validator, kept as the baseline the lexer is compared with
+def legacy_validate_sql(sql_query: str) -> tuple[bool, str]:
+    statements = [s for s in sqlparse.parse(sql_query) if s.tokens and not s.is_whitespace]
+    if not statements:
+        return False, "Empty or invalid SQL query"
+    if len(statements) != 1:
+        return False, "Multiple statements are not allowed"
+    stmt = statements[0]
+
+    flat = []
+    stack = list(stmt.tokens)
+    while stack:
+        t = stack.pop(0)
+        if getattr(t, "is_group", False):
+            stack = list(t.tokens) + stack
+        else:
+            flat.append(t)
+
+    if (stmt.get_type() or "").upper() != "SELECT":
+        return False, "Only SELECT queries are allowed"
+
+    for t in flat:
+        if (t.ttype in (Keyword, DML)) or str(t.ttype).startswith("Token.Keyword"):
+            if t.value.upper() in LEGACY_PROHIBITED_KEYWORDS:
+                return False, "Query contains prohibited keywords (DDL/DML/set operations)"
+
+    saw_select = False
+    before_from = True
+    for t in flat:
+        if (t.ttype in (Keyword, DML)) or str(t.ttype).startswith("Token.Keyword"):
+            val = t.value.upper()
+            if val == "SELECT":
+                saw_select = True
+            elif val == "FROM":
+                before_from = False
+            elif saw_select and before_from and val == "INTO":
+                return False, "SELECT INTO is not allowed"
+
+    mid_semicolon = any(t.ttype is Punctuation and t.value == ";" for t in flat)
+    if mid_semicolon and not sql_query.strip().endswith(";"):
+        return False, "Semicolons in the middle of the query are not allowed"
+
+    sql_up = sql_query.upper()
+    for pat in LEGACY_FROM_LIKE_PATTERNS:
+        for m in pat.finditer(sql_up):
+            parts = split_object_name(m.group("obj"))
+            if len(parts) >= 2 and (parts[0] in DISALLOWED_SCHEMAS or parts[0].startswith("PG_")):
+                return False, f"Access to schema '{parts[0]}' is not allowed"
+            if len(parts) == 1 and any(parts[0].startswith(p) for p in DISALLOWED_TABLE_PREFIXES):
+                return False, f"Access to table '{parts[0]}' is not allowed"
+    return True, None
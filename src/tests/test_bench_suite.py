@@ -0,0 +1,80 @@
+import contextlib
+import io
+import json
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, os.path.join(parent_dir, "benchmarks"))
+
+import bench_suite
+from bench_suite import compare, measure, run
+
+def make_run(medians: dict, commit: str = "abc1234") -> dict:
+    return {
+        "commit": commit,
+        "created_at": "2026-10-17T00:00:00+00:00",
+        "results": [
+            {"benchmark": benchmark, "size": size, "median_ms": median_ms}
+            for (benchmark, size), median_ms in medians.items()
+        ]
+    }
+
+def test_measure_runs_at_least_five_times():
+    calls = []
+    durations = measure(lambda: calls.append(1), min_seconds=0)
+
+    # One warm-up call that isn't timed, then the timed runs
+    assert len(durations) == 5 and len(calls) == 6
+    assert all(duration >= 0 for duration in durations)
+
+def test_compare_counts_regressions_over_the_threshold():
+    baseline = make_run({("validate_sql[cte]", 1024): 1.0, ("serialization", 100): 2.0, ("system_prompt", 10): 0.0})
+    current = make_run({
+        ("validate_sql[cte]", 1024): 1.2,
+        ("serialization", 100): 2.1,
+        ("system_prompt", 10): 0.5,
+        ("parse_records", 100): 9.0
+    })
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        regressions = compare(baseline, current, threshold=0.1)
+
+    # Only the 20% slowdown is over 10%; a zero baseline and a case missing from it are not compared
+    assert regressions == 1
+    lines = output.getvalue().splitlines()
+    assert lines[1] == "Compared with abc1234 (2026-10-17T00:00:00+00:00):"
+    assert [line.split()[0] for line in lines[3:]] == ["validate_sql[cte]", "serialization", "system_prompt"]
+    assert lines[3].endswith("+20.0%  REGRESSION") and lines[4].endswith("+5.0%")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert compare(baseline, current, threshold=0.25) == 0
+
+def test_run_reports_every_case():
+    previous = dict(bench_suite.DEFAULT_SIZES)
+    bench_suite.DEFAULT_SIZES.update({"validate_sql": [256], "serialization": [10, 20]})
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = run(["validate_sql", "serialization"], min_seconds=0)
+    finally:
+        bench_suite.DEFAULT_SIZES.update(previous)
+
+    assert [(result["benchmark"], result["size"]) for result in report["results"]] == [
+        ("validate_sql[in_list]", 256), ("validate_sql[cte]", 256), ("serialization", 10), ("serialization", 20)
+    ]
+    assert all(result["runs"] >= 5 and 0 <= result["best_ms"] <= result["median_ms"] for result in report["results"])
+    assert report["json_backend"] == bench_suite.JSON_BACKEND and report["min_seconds"] == 0
+
+    # The report is saved as JSON and compared with itself without regressions
+    report = json.loads(json.dumps(report))
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert compare(report, report, threshold=0.0) == 0
+
+if __name__ == "__main__":
+    test_measure_runs_at_least_five_times()
+    test_compare_counts_regressions_over_the_threshold()
+    test_run_reports_every_case()
+    print("All benchmark suite tests passed.")
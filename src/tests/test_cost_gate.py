@@ -0,0 +1,68 @@
+import json
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from cost_gate import CostGate, summarize_plan
+from rds_client import plan_result
+
+# EXPLAIN (FORMAT JSON) of a cross join between tickets and messages
+CROSS_JOIN_PLAN = {
+    "Node Type": "Nested Loop", "Join Type": "Inner", "Total Cost": 2500125.5, "Plan Rows": 50000000,
+    "Plans": [
+        {"Node Type": "Seq Scan", "Relation Name": "tickets", "Alias": "t", "Total Cost": 120.0, "Plan Rows": 5000},
+        {
+            "Node Type": "Materialize", "Total Cost": 300.5, "Plan Rows": 10000,
+            "Plans": [
+                {"Node Type": "Seq Scan", "Relation Name": "messages", "Alias": "m", "Total Cost": 250.0, "Plan Rows": 10000}
+            ]
+        }
+    ]
+}
+
+def test_summarize_plan():
+    summary = summarize_plan(CROSS_JOIN_PLAN)
+
+    assert summary["total_cost"] == 2500125.5 and summary["plan_rows"] == 50000000
+    assert [node["Node Type"] for node in summary["hot_nodes"]] == ["Nested Loop", "Seq Scan", "Seq Scan"]
+    assert summary["hot_nodes"][0]["Self Cost"] == 2499705.0
+    assert summary["hot_nodes"][1]["Relation Name"] == "messages"
+    assert "Plans" not in summary["hot_nodes"][0]
+
+def test_thresholds():
+    summary = summarize_plan(CROSS_JOIN_PLAN)
+
+    assert not CostGate().enabled
+    assert CostGate(max_cost=1e7).check(summary) is None
+    assert "estimated cost" in CostGate(max_cost=1e6).check(summary)
+    reason = CostGate(max_cost=1e6, max_rows=1e6).check(summary)
+    assert "estimated cost" in reason and "rows" in reason
+
+def test_plans_are_cached_per_normalized_query():
+    gate = CostGate(max_cost=1e6)
+    gate.put("SELECT * FROM tickets t, messages m;", summarize_plan(CROSS_JOIN_PLAN))
+
+    assert gate.get("select *  from TICKETS t, MESSAGES m") is not None
+    assert gate.get("SELECT * FROM tickets") is None
+    assert gate.stats()["hits"] == 1 and gate.stats()["misses"] == 1
+
+    expired = CostGate(max_cost=1e6, ttl_seconds=0)
+    expired.put("SELECT 1", summarize_plan(CROSS_JOIN_PLAN))
+    assert expired.get("SELECT 1") is None
+
+def test_plan_result():
+    plan_text = json.dumps([{"Plan": CROSS_JOIN_PLAN}])
+
+    assert plan_result([{"QUERY PLAN": plan_text}])["plan"]["Node Type"] == "Nested Loop"
+    assert plan_result([[[{"Plan": CROSS_JOIN_PLAN}]]])["plan"]["Total Cost"] == 2500125.5
+    assert not plan_result([])["success"]
+
+if __name__ == "__main__":
+    test_summarize_plan()
+    test_thresholds()
+    test_plans_are_cached_per_normalized_query()
+    test_plan_result()
+    print("All cost gate tests passed.")
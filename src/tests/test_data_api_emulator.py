@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from botocore.exceptions import ClientError
+
+from data_api_emulator import DataAPIEmulator
+from rds_client import RDSClient
+
+ARNS = {"resourceArn": "arn:cluster", "secretArn": "arn:secret", "database": "postgres"}
+
+# Returns an emulator loaded from schema.sql with the ticket priorities, and a client using it
+def build_client(**settings) -> tuple[DataAPIEmulator, RDSClient]:
+    emulator = DataAPIEmulator(**settings)
+    emulator.batch_execute_statement(
+        sql="INSERT INTO ticket_priorities (id, name, sort_order) VALUES (:id, :name, :sort_order)",
+        parameterSets=[
+            [{"name": "id", "value": {"longValue": i}}, {"name": "name", "value": {"stringValue": name}},
+             {"name": "sort_order", "value": {"longValue": i * 10}}]
+            for i, name in enumerate(["Low", "Normal", "High"], start=1)
+        ],
+        **ARNS
+    )
+    client = RDSClient(cluster_arn="arn:cluster", secret_arn="arn:secret", client=emulator)
+    return emulator, client
+
+def test_responses_are_shaped_like_the_data_api():
+    emulator, client = build_client()
+    sql_query = "SELECT id, name FROM ticket_priorities WHERE sort_order > :min_order ORDER BY id"
+
+    result = client.execute_query(sql_query, parameters={"min_order": 10})
+    assert result["success"] and result["data"] == [{"id": 2, "name": "Normal"}, {"id": 3, "name": "High"}]
+
+    result = client.execute_query(sql_query, parameters={"min_order": 10}, result_format="columns")
+    assert result["data"] == [[2, "Normal"], [3, "High"]] and result["columns"] == ["id", "name"]
+
+    response = emulator.execute_statement(sql="SELECT id FROM ticket_priorities WHERE id = 1", **ARNS)
+    assert response["records"] == [[{"longValue": 1}]] and "formattedRecords" not in response
+
+    result = client.execute_query("SELECT missing_column FROM tickets")
+    assert not result["success"] and result["error_code"] == "BadRequestException"
+    assert "missing_column" in result["error"]
+
+def test_transactions_and_generated_fields():
+    emulator, client = build_client()
+    insert = "INSERT INTO message_types (id, name) VALUES (:id, :name) RETURNING id"
+    parameters = [{"name": "id", "value": {"longValue": 7}}, {"name": "name", "value": {"stringValue": "ai"}}]
+
+    transaction_id = emulator.begin_transaction(**ARNS)["transactionId"]
+    response = emulator.batch_execute_statement(sql=insert, parameterSets=[parameters], transactionId=transaction_id, **ARNS)
+    assert response["updateResults"] == [{"generatedFields": [{"longValue": 7}]}]
+    emulator.rollback_transaction(transactionId=transaction_id, **ARNS)
+    assert client.execute_query("SELECT * FROM message_types")["data"] == []
+
+    transaction_id = emulator.begin_transaction(**ARNS)["transactionId"]
+    emulator.execute_statement(sql=insert, parameters=parameters, transactionId=transaction_id, **ARNS)
+    emulator.commit_transaction(transactionId=transaction_id, **ARNS)
+    assert client.execute_query("SELECT * FROM message_types")["data"] == [{"id": 7, "name": "ai"}]
+
+    try:
+        emulator.commit_transaction(transactionId=transaction_id, **ARNS)
+        assert False, "the transaction is already committed"
+    except ClientError as error:
+        assert error.response["Error"]["Code"] == "TransactionNotFoundException"
+
+def test_statement_timeout_at_the_deadline():
+    emulator, client = build_client()
+    slow_query = (
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 100000000) SELECT COUNT(*) FROM n"
+    )
+    start = time.monotonic()
+    result = client.execute_query(slow_query, deadline=start + 0.1)
+    assert result["timed_out"] and time.monotonic() - start < 2
+    # The timeout ended with the query's transaction
+    assert client.execute_query("SELECT COUNT(*) AS n FROM ticket_priorities", deadline=time.monotonic() + 5)["data"] == [{"n": 3}]
+
+def test_injected_resume_and_failures():
+    emulator, client = build_client()
+    emulator.pause(resume_seconds=0.2)
+    client.backend.resume_base_delay = 0.05
+    result = client.execute_query("SELECT COUNT(*) AS n FROM ticket_priorities")
+    assert result["success"] and client.backend.resume_retries > 0
+
+    emulator.fail_next("ThrottlingException", "Rate exceeded")
+    result = client.execute_query("SELECT 1 AS n")
+    assert not result["success"] and result["error_code"] == "ThrottlingException"
+    assert client.execute_query("SELECT 1 AS n")["success"]
+
+    emulator.pause(resume_seconds=60)
+    client.backend.resume_timeout = 0.1
+    result = client.execute_query("SELECT 1 AS n")
+    assert result["resuming"] and result["error_code"] == "DatabaseResumingException"
+
+if __name__ == "__main__":
+    test_responses_are_shaped_like_the_data_api()
+    test_transactions_and_generated_fields()
+    test_statement_timeout_at_the_deadline()
+    test_injected_resume_and_failures()
+    print("All Data API emulator tests passed.")
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, os.path.join(parent_dir, "benchmarks"))
+
+import httpx
+from botocore.exceptions import ClientError
+
+from load_test import DEFAULT_TRAFFIC, LatencyDataAPI, is_error, load_traffic, percentile, replay, summarize
+
+def tool_call(name: str, **arguments) -> dict:
+    return {"jsonrpc": "2.0", "id": 1, "method": "tools/call", "params": {"name": name, "arguments": arguments}}
+
+# Answers /tools/call like the adapter: tools named "failing_*" return a failed result, "broken" an HTTP error
+def fake_adapter(request: httpx.Request) -> httpx.Response:
+    name = json.loads(request.content)["params"]["name"]
+    if name == "broken":
+        return httpx.Response(500, json={"detail": "Internal Server Error"})
+    return httpx.Response(200, json={"jsonrpc": "2.0", "id": 1, "result": {"success": not name.startswith("failing_")}})
+
+def test_percentile_is_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+
+    assert percentile(values, 50) == 50.0 and percentile(values, 95) == 95.0 and percentile(values, 99) == 99.0
+    assert percentile(values, 0) == 1.0 and percentile(values, 100) == 100.0
+    assert percentile([0.2], 99) == 0.2 and percentile([], 50) == 0.0
+
+def test_summary_per_tool_and_overall():
+    results = [("execute_sql_query", 0.01 * i, i % 4 == 0) for i in range(1, 21)] + [("fetch_next_page", 0.5, False)]
+    summary = summarize(results, duration=2.0)
+
+    assert summary["execute_sql_query"] == {
+        "requests": 20, "throughput": 10.0, "p50_ms": 100.0, "p95_ms": 190.0, "p99_ms": 200.0, "error_rate": 0.25
+    }
+    assert summary["fetch_next_page"]["requests"] == 1 and summary["fetch_next_page"]["p99_ms"] == 500.0
+    assert summary["all"]["requests"] == 21 and summary["all"]["error_rate"] == round(5 / 21, 4)
+
+def test_replay_counts_failed_results_as_errors():
+    calls = [tool_call("execute_sql_query"), tool_call("failing_query"), tool_call("broken")] * 4
+
+    async def replay_calls(rate: float):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(fake_adapter), base_url="http://adapter") as client:
+            assert not is_error(await client.post("/tools/call", json=calls[0]))
+            return await replay(client, calls, concurrency=3, rate=rate)
+
+    results, duration = asyncio.run(replay_calls(rate=0))
+    assert len(results) == len(calls)
+    assert sorted((name, error) for name, _, error in results) == sorted(
+        [("broken", True), ("execute_sql_query", False), ("failing_query", True)] * 4
+    )
+
+    # With a rate, call i doesn't start before i / rate seconds
+    results, duration = asyncio.run(replay_calls(rate=200))
+    assert duration >= (len(calls) - 1) / 200 and all(latency >= 0 for _, latency, _ in results)
+
+def test_replay_against_the_adapter():
+    import mcp_server
+    from adapter import app
+
+    data_api = LatencyDataAPI(rows=5, latency=0)
+    previous = mcp_server.rds_client.rds_client, mcp_server.connection_success
+    mcp_server.rds_client.rds_client = data_api
+    mcp_server.query_cache.clear()
+    calls = load_traffic(DEFAULT_TRAFFIC)
+
+    async def replay_calls():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://adapter") as client:
+            return await replay(client, calls, concurrency=2, rate=0)
+
+    try:
+        results, duration = asyncio.run(replay_calls())
+        failing = LatencyDataAPI(rows=1, latency=0, error_rate=1.0)
+        try:
+            failing.execute_statement(sql="SELECT 1 AS one")
+            assert False, "the stub should fail every query"
+        except ClientError as error:
+            assert error.response["Error"]["Code"] == "BadRequestException"
+    finally:
+        mcp_server.rds_client.rds_client, mcp_server.connection_success = previous
+        mcp_server.query_cache.clear()
+        mcp_server.nl_cache.clear()
+
+    # The sample traffic has one DELETE, which the validator rejects; every other call succeeds
+    assert len(results) == len(calls)
+    assert [name for name, _, error in results if error] == ["execute_sql_query"]
+    summary = summarize(results, duration)
+    assert set(summary) == {"execute_sql_query", "execute_sql_batch", "query_sql_agent", "all"}
+    assert summary["all"]["requests"] == len(calls) and summary["all"]["error_rate"] == round(1 / len(calls), 4)
+    assert data_api.calls >= len(calls) - 2
+
+if __name__ == "__main__":
+    test_percentile_is_nearest_rank()
+    test_summary_per_tool_and_overall()
+    test_replay_counts_failed_results_as_errors()
+    test_replay_against_the_adapter()
+    print("All load test harness tests passed.")
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import sys
+from contextlib import contextmanager
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import mcp_server
+from data_api_emulator import DataAPIEmulator
+from rds_client import RDSClient
+
+# Rows padded to a known size, enough for any byte budget of the tests
+PADDED_ROWS_SQL = (
+    "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 200) "
+    "SELECT i, '" + "x" * 80 + "' AS padding FROM n ORDER BY i"
+)
+
+# Points the server at a fresh emulator loaded from schema.sql with the ticket priorities, with
+# empty caches and the given settings of mcp_server (restored on exit)
+@contextmanager
+def emulated_server(**settings):
+    emulator = DataAPIEmulator()
+    emulator.batch_execute_statement(
+        sql="INSERT INTO ticket_priorities (id, name, sort_order) VALUES (:id, :name, :sort_order)",
+        parameterSets=[
+            [{"name": "id", "value": {"longValue": i}}, {"name": "name", "value": {"stringValue": name}},
+             {"name": "sort_order", "value": {"longValue": i * 10}}]
+            for i, name in enumerate(["Low", "Normal", "High"], start=1)
+        ],
+        resourceArn="arn:cluster", secretArn="arn:secret", database="postgres"
+    )
+    client = RDSClient(cluster_arn="arn:cluster", secret_arn="arn:secret", client=emulator)
+    previous = {name: getattr(mcp_server, name) for name in list(settings) + ["rds_client", "connection_success"]}
+    for name, value in dict(settings, rds_client=client, connection_success=True).items():
+        setattr(mcp_server, name, value)
+    mcp_server.query_cache.clear()
+    try:
+        yield client
+    finally:
+        for name, value in previous.items():
+            setattr(mcp_server, name, value)
+        mcp_server.query_cache.clear()
+        client.executor.shutdown(wait=True)
+
+def run_batch(sql_queries: list, **arguments) -> dict:
+    return asyncio.run(mcp_server.execute_sql_batch(sql_queries, **arguments))
+
+def test_batch_keeps_query_order_with_failures():
+    sql_queries = [
+        "SELECT name FROM ticket_priorities WHERE id = 3",
+        "DELETE FROM ticket_priorities",
+        "SELECT missing_column FROM ticket_priorities",
+        "SELECT COUNT(*) AS n FROM ticket_priorities",
+    ]
+    with emulated_server():
+        result = run_batch(sql_queries, use_cache=False)
+
+    assert [item["sql_query"] for item in result["results"]] == sql_queries
+    assert [item["success"] for item in result["results"]] == [True, False, False, True]
+    assert result["results"][0]["data"] == [{"name": "High"}]
+    assert result["results"][1]["error_type"] == "sql_validation_error"
+    assert result["results"][2]["error_type"] == "database_error"
+    assert result["results"][3]["data"] == [{"n": 3}]
+    assert result["success"] is False and result["failed_count"] == 2 and result["query_count"] == 4
+
+def test_batch_success_when_every_query_succeeds():
+    with emulated_server():
+        result = run_batch(["SELECT id FROM ticket_priorities ORDER BY id", "SELECT 1 AS one"], format="columns")
+
+    assert result["success"] is True and result["failed_count"] == 0
+    assert result["results"][0]["rows"] == [[1], [2], [3]] and result["results"][1]["columns"] == ["one"]
+
+def test_batch_size_limits():
+    with emulated_server(QUERY_BATCH_MAX_QUERIES=3):
+        for sql_queries in ([], ["SELECT 1"] * 4):
+            result = run_batch(sql_queries)
+            assert result["success"] is False and result["error_type"] == "batch_error"
+            assert result["context"]["query_count"] == len(sql_queries)
+        assert run_batch(["SELECT 1"] * 3)["success"] is True
+
+def test_batch_splits_the_byte_budget():
+    with emulated_server(QUERY_MAX_BYTES=8000) as client:
+        budgets = []
+        execute_query_async = client.execute_query_async
+
+        async def recording_execute(sql_query, **arguments):
+            budgets.append(arguments["max_bytes"])
+            return await execute_query_async(sql_query, **arguments)
+
+        client.execute_query_async = recording_execute
+        whole = run_batch([PADDED_ROWS_SQL], use_cache=False)["results"][0]
+        halves = run_batch([PADDED_ROWS_SQL, PADDED_ROWS_SQL + " DESC"], use_cache=False)["results"]
+
+    assert budgets == [8000, 4000, 4000]
+    assert whole["truncated"] and all(half["truncated"] for half in halves)
+    assert all(half["row_count"] < whole["row_count"] for half in halves)
+    assert halves[1]["data"][0]["i"] == 200
+
+def test_query_pages_follow_the_cursor():
+    with emulated_server():
+        first = asyncio.run(mcp_server.execute_sql_query(
+            "SELECT id, name FROM ticket_priorities", page_size=2, page_key="id"
+        ))
+        second = asyncio.run(mcp_server.fetch_next_page(first["next_cursor"]))
+
+    assert [row["id"] for row in first["data"]] == [1, 2]
+    assert [row["id"] for row in second["data"]] == [3] and second.get("next_cursor") is None
+
+def test_offset_pages_follow_the_query_order():
+    with emulated_server():
+        pages = [asyncio.run(mcp_server.execute_sql_query(
+            "SELECT id, name FROM ticket_priorities ORDER BY name DESC LIMIT 2", page_size=1
+        ))]
+        while pages[-1].get("next_cursor"):
+            pages.append(asyncio.run(mcp_server.fetch_next_page(pages[-1]["next_cursor"])))
+
+        payload, signature = pages[0]["next_cursor"].split(".")
+        forged = asyncio.run(mcp_server.fetch_next_page(payload[:-2] + "x" + payload[-1] + "." + signature))
+
+    assert [page["data"] for page in pages] == [[{"id": 2, "name": "Normal"}], [{"id": 1, "name": "Low"}]]
+    assert [page["page"]["mode"] for page in pages] == ["offset", "offset"]
+    assert forged["success"] is False and forged["error_type"] == "pagination_error"
+
+def test_invalidating_a_table_drops_its_cached_results():
+    def run_query(sql_query: str) -> dict:
+        return asyncio.run(mcp_server.execute_sql_query(sql_query))
+
+    with emulated_server():
+        run_query("SELECT name FROM ticket_priorities WHERE id = 1")
+        run_query("SELECT 1 AS one")
+        assert run_query("select name from TICKET_PRIORITIES where id = 1")["cache"] == "hit"
+
+        result = mcp_server.invalidate_cached_tables(["ticket_priorities"])
+        assert result == {"success": True, "tables": ["ticket_priorities"], "invalidated_count": 1}
+        assert run_query("SELECT name FROM ticket_priorities WHERE id = 1")["cache"] == "miss"
+        assert run_query("SELECT 1 AS one")["cache"] == "hit"
+
+if __name__ == "__main__":
+    test_batch_keeps_query_order_with_failures()
+    test_batch_success_when_every_query_succeeds()
+    test_batch_size_limits()
+    test_batch_splits_the_byte_budget()
+    test_query_pages_follow_the_cursor()
+    test_offset_pages_follow_the_query_order()
+    test_invalidating_a_table_drops_its_cached_results()
+    print("All MCP server tests passed.")
@@ -0,0 +1,99 @@
+import io
+import json
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from metrics import EMF_MAX_VALUES, MetricsRegistry, stats_values
+
+def test_prometheus_text_format():
+    metrics = MetricsRegistry()
+    errors = metrics.counter("tool_errors_total", "Failed tool calls", ("tool", "error_type"))
+    latency = metrics.histogram("stage_seconds", "Stage latency", ("stage",), buckets=(0.01, 0.1))
+
+    errors.inc(tool="execute_sql_query", error_type="database_error")
+    errors.inc(tool="execute_sql_query", error_type="database_error")
+    latency.observe(0.005, stage="database")
+    latency.observe(0.05, stage="database")
+    latency.observe(2, stage="database")
+
+    assert metrics.render().splitlines() == [
+        "# HELP tool_errors_total Failed tool calls",
+        "# TYPE tool_errors_total counter",
+        'tool_errors_total{tool="execute_sql_query",error_type="database_error"} 2',
+        "# HELP stage_seconds Stage latency",
+        "# TYPE stage_seconds histogram",
+        'stage_seconds_bucket{stage="database",le="0.01"} 1',
+        'stage_seconds_bucket{stage="database",le="0.1"} 2',
+        'stage_seconds_bucket{stage="database",le="+Inf"} 3',
+        'stage_seconds_sum{stage="database"} 2.055',
+        'stage_seconds_count{stage="database"} 3',
+    ]
+    assert latency.totals(stage="database") == (3, 2.055)
+
+def test_label_values_are_escaped():
+    metrics = MetricsRegistry()
+    metrics.counter("calls_total", "Calls", ("tool",)).inc(tool='say "hi"\n')
+    assert 'calls_total{tool="say \\"hi\\"\\n"} 1' in metrics.render()
+
+def test_emf_records():
+    metrics = MetricsRegistry(namespace="Test", emf=True)
+    latency = metrics.histogram("stage_seconds", "Stage latency", ("tool", "stage"))
+    rows = metrics.histogram("result_rows", "Rows", ("tool", "stage"), unit="Count")
+
+    latency.observe(0.25, tool="execute_sql_query", stage="database")
+    rows.observe(10, tool="execute_sql_query", stage="database")
+    for _ in range(EMF_MAX_VALUES + 1):
+        latency.observe(0.5, tool="fetch_next_page", stage="database")
+
+    stream = io.StringIO()
+    assert metrics.flush_emf(stream) == 3
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    first = records[0]
+    directive = first["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Namespace"] == "Test"
+    assert directive["Dimensions"] == [["tool", "stage"]]
+    assert directive["Metrics"] == [{"Name": "stage_seconds", "Unit": "Seconds"}, {"Name": "result_rows", "Unit": "Count"}]
+    assert first["tool"] == "execute_sql_query" and first["stage_seconds"] == 0.25 and first["result_rows"] == 10
+
+    # Values over the CloudWatch limit go to another record
+    assert len(records[1]["stage_seconds"]) == EMF_MAX_VALUES and records[2]["stage_seconds"] == 0.5
+
+    # Flushed values aren't written twice, the totals for /metrics are kept
+    assert metrics.flush_emf(stream) == 0
+    assert latency.totals(tool="fetch_next_page", stage="database")[0] == EMF_MAX_VALUES + 1
+
+def test_emf_disabled():
+    metrics = MetricsRegistry()
+    metrics.counter("calls_total", "Calls").inc()
+    stream = io.StringIO()
+    assert metrics.flush_emf(stream) == 0 and stream.getvalue() == ""
+
+def test_gauges_read_stats():
+    metrics = MetricsRegistry(emf=True)
+    stats = {"enabled": True, "entries": 2, "max_cost": None, "queue_wait": {"count": 3, "avg_ms": 1.5}}
+    metrics.gauge("cache_state", "Cache state", lambda: stats_values(stats), ("stat",))
+
+    assert metrics.render().splitlines() == [
+        "# HELP cache_state Cache state",
+        "# TYPE cache_state gauge",
+        'cache_state{stat="enabled"} 1',
+        'cache_state{stat="entries"} 2',
+        'cache_state{stat="queue_wait_avg_ms"} 1.5',
+        'cache_state{stat="queue_wait_count"} 3',
+    ]
+    stats["entries"] = 5
+    assert 'cache_state{stat="entries"} 5' in metrics.render()
+    assert metrics.emf_records() == []
+
+if __name__ == "__main__":
+    test_prometheus_text_format()
+    test_label_values_are_escaped()
+    test_emf_records()
+    test_emf_disabled()
+    test_gauges_read_stats()
+    print("All metrics tests passed.")
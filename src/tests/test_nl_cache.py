@@ -0,0 +1,98 @@
+import hashlib
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from nl_cache import NLQueryCache
+
+def test_exact_match_fills_literals():
+    cache = NLQueryCache(similarity_threshold=0)
+    cache.put(
+        "Show tickets of organization 101 created after 2024-01-01",
+        "SELECT id FROM tickets WHERE organization_id = 101 AND created_at > '2024-01-01'"
+    )
+
+    hit = cache.get("  show TICKETS of organization 202 created after 2024-03-15?")
+    assert hit["match"] == "exact"
+    assert hit["sql_query"] == "SELECT id FROM tickets WHERE organization_id = 202 AND created_at > '2024-03-15'"
+
+def test_similar_question_reuses_sql():
+    cache = NLQueryCache(similarity_threshold=0.7)
+    cache.put("List open tickets assigned to agent 7 sorted by due date", "SELECT id FROM tickets WHERE assignee_id = 7 ORDER BY due_date")
+
+    hit = cache.get("List the open tickets assigned to agent 9, sorted by due date")
+    assert hit["match"] == "similar"
+    assert hit["sql_query"] == "SELECT id FROM tickets WHERE assignee_id = 9 ORDER BY due_date"
+    assert cache.get("Count messages per ticket for agent 9") is None
+
+def test_literal_missing_from_sql_must_match():
+    cache = NLQueryCache(similarity_threshold=0)
+    # "5" is not in the SQL, so the SQL can't be adapted to another value
+    cache.put("Show the top 5 categories", "SELECT name FROM categories ORDER BY ticket_count DESC LIMIT 10")
+
+    assert cache.get("Show the top 5 categories") is not None
+    assert cache.get("Show the top 3 categories") is None
+
+def test_quoted_values_are_escaped():
+    cache = NLQueryCache(similarity_threshold=0)
+    cache.put("Find tickets with subject 'login'", "SELECT id FROM tickets WHERE subject = 'login' AND tags <> '{}'")
+
+    hit = cache.get("Find tickets with subject \"it's broken\"")
+    assert hit["sql_query"] == "SELECT id FROM tickets WHERE subject = 'it''s broken' AND tags <> '{}'"
+
+def test_opposite_questions_are_not_similar():
+    cache = NLQueryCache(similarity_threshold=0.7)
+    cache.put(
+        "List the open tickets assigned to agent 7 in the billing category sorted by due date",
+        "SELECT id FROM tickets WHERE assignee_id = 7 AND category = 'billing' ORDER BY due_date"
+    )
+    assert cache.get("List the open tickets not assigned to agent 7 in the billing category sorted by due date") is None
+    assert cache.get("List the open tickets assigned to agent 7 in the billing category sorted by due date after 5pm") is None
+    assert cache.get("List open tickets assigned to agent 7 in the billing category, sorted by due date") is not None
+
+def test_similarity_is_off_by_default():
+    cache = NLQueryCache()
+    cache.put("List open tickets assigned to agent 7 sorted by due date", "SELECT id FROM tickets WHERE assignee_id = 7 ORDER BY due_date")
+    assert cache.get("List the open tickets assigned to agent 7, sorted by due date") is None
+
+def test_schema_change_misses():
+    def schema_hash(schema: str) -> str:
+        return hashlib.sha256(schema.encode("utf-8")).hexdigest()
+
+    cache = NLQueryCache(similarity_threshold=0.7, schema_hash=schema_hash("CREATE TABLE tickets (id INT);"))
+    cache.put("Count tickets of agent 7", "SELECT COUNT(*) FROM tickets WHERE assignee_id = 7")
+    assert cache.get("count tickets of agent 8") is not None
+
+    cache.schema_hash = schema_hash("CREATE TABLE tickets (id BIGINT, agent_id INT);")
+    assert cache.get("count tickets of agent 8") is None
+    assert cache.get("Count the tickets of agent 8") is None
+    cache.put("Count tickets of agent 7", "SELECT COUNT(*) FROM tickets WHERE agent_id = 7")
+    assert cache.get("count tickets of agent 8")["sql_query"] == "SELECT COUNT(*) FROM tickets WHERE agent_id = 8"
+
+    cache.schema_hash = schema_hash("CREATE TABLE tickets (id INT);")
+    assert cache.get("count tickets of agent 8")["sql_query"] == "SELECT COUNT(*) FROM tickets WHERE assignee_id = 8"
+    assert cache.stats()["misses"] == 2
+
+def test_discard_and_disabled_cache():
+    cache = NLQueryCache()
+    cache.put("Count tickets", "SELECT COUNT(*) FROM tickets")
+    assert cache.discard("count tickets.")
+    assert cache.get("Count tickets") is None
+
+    disabled = NLQueryCache(max_entries=0)
+    assert not disabled.put("Count tickets", "SELECT COUNT(*) FROM tickets")
+    assert disabled.get("Count tickets") is None
+
+if __name__ == "__main__":
+    test_exact_match_fills_literals()
+    test_similar_question_reuses_sql()
+    test_literal_missing_from_sql_must_match()
+    test_quoted_values_are_escaped()
+    test_opposite_questions_are_not_similar()
+    test_similarity_is_off_by_default()
+    test_schema_change_misses()
+    test_discard_and_disabled_cache()
+    print("All natural language cache tests passed.")
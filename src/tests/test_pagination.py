@@ -0,0 +1,176 @@
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from pagination import (
+    start_pagination,
+    pagination_mode,
+    encode_cursor,
+    decode_cursor,
+    build_page_query,
+    paginate_rows
+)
+
+SECRET = b"test-cursor-secret"
+
+def make_rows(start: int, count: int):
+    return [{"id": i, "subject": f"ticket {i}"} for i in range(start, start + count)]
+
+def test_cursor_round_trip():
+    state = start_pagination("SELECT id, subject FROM tickets;", page_size=50, page_key="id")
+    cursor = encode_cursor(state, SECRET)
+
+    assert "SELECT" not in cursor
+    assert decode_cursor(cursor, SECRET) == state
+
+    for bad_cursor in ("", "not a cursor", encode_cursor({"v": 99}, SECRET), cursor[:-4], cursor + "\u00e9"):
+        try:
+            decode_cursor(bad_cursor, SECRET)
+            assert False, f"cursor should be rejected: {bad_cursor!r}"
+        except ValueError:
+            pass
+
+def test_cursors_are_signed():
+    state = start_pagination("SELECT id, subject FROM tickets", page_size=50, page_key="id")
+    cursor = encode_cursor(state, SECRET)
+    payload, signature = cursor.split(".")
+
+    # A cursor with another query (or from a server with another secret) is rejected
+    forged = encode_cursor(dict(state, sql="SELECT * FROM pg_shadow"), SECRET).split(".")[0]
+    for bad_cursor, secret in ((f"{forged}.{signature}", SECRET), (forged, SECRET), (cursor, b"other-secret")):
+        try:
+            decode_cursor(bad_cursor, secret)
+            assert False, f"cursor should be rejected: {bad_cursor!r}"
+        except ValueError as error:
+            assert "signature" in str(error)
+
+def test_keyset_pages():
+    state = start_pagination("SELECT id, subject FROM tickets WHERE status_id = 2 -- open", page_size=2, page_key="id")
+    assert pagination_mode(state) == "keyset"
+
+    page_query, parameters = build_page_query(state)
+    assert page_query.startswith("SELECT * FROM (\nSELECT id, subject FROM tickets WHERE status_id = 2 -- open\n)")
+    assert page_query.endswith(') AS page_source ORDER BY "id" LIMIT 3')
+    assert parameters == {}
+
+    rows, next_state = paginate_rows(state, make_rows(1, 3))
+    assert [row["id"] for row in rows] == [1, 2]
+    assert next_state["after"] == [2]
+
+    page_query, parameters = build_page_query(next_state)
+    assert page_query.endswith(') AS page_source WHERE ("id") > (:page_key_0) ORDER BY "id" LIMIT 3')
+    assert parameters == {"page_key_0": 2}
+
+    rows, next_state = paginate_rows(next_state, make_rows(3, 1))
+    assert len(rows) == 1 and next_state is None
+
+def test_offset_pages():
+    # Queries with their own ordering keep it and are paged by offset, on the query itself so the
+    # ORDER BY orders the rows
+    state = start_pagination("SELECT id FROM tickets ORDER BY created_at DESC;", page_size=10, page_key="id")
+    assert state["key"] == [] and pagination_mode(state) == "offset"
+
+    page_query, _ = build_page_query(state)
+    assert page_query == "SELECT id FROM tickets ORDER BY created_at DESC LIMIT 11"
+
+    _, next_state = paginate_rows(state, make_rows(0, 11))
+    page_query, parameters = build_page_query(next_state)
+    assert page_query == "SELECT id FROM tickets ORDER BY created_at DESC LIMIT 11 OFFSET 10"
+    assert parameters == {}
+
+    # A trailing line comment is kept out of the way of the clauses
+    state = start_pagination("SELECT id FROM tickets ORDER BY id -- oldest first", page_size=5)
+    assert build_page_query(state)[0] == "SELECT id FROM tickets ORDER BY id -- oldest first\nLIMIT 6"
+
+def test_offset_pages_keep_the_query_bounds():
+    def page_queries(sql_query: str, page_size: int) -> list:
+        state = start_pagination(sql_query, page_size=page_size)
+        queries = []
+        for offset in range(0, 30, page_size):
+            queries.append(build_page_query(dict(state, offset=offset))[0])
+        return queries
+
+    assert page_queries("SELECT id FROM tickets ORDER BY id LIMIT 25;", 10) == [
+        "SELECT id FROM tickets ORDER BY id LIMIT 11",
+        "SELECT id FROM tickets ORDER BY id LIMIT 11 OFFSET 10",
+        "SELECT id FROM tickets ORDER BY id LIMIT 5 OFFSET 20",
+    ]
+    assert page_queries("SELECT id FROM tickets ORDER BY id OFFSET 5 ROWS FETCH FIRST 20 ROWS ONLY", 15) == [
+        "SELECT id FROM tickets ORDER BY id LIMIT 16 OFFSET 5",
+        "SELECT id FROM tickets ORDER BY id LIMIT 5 OFFSET 20",
+    ]
+    assert page_queries("SELECT id FROM tickets ORDER BY id LIMIT ALL OFFSET 3 /* skip */", 30) == [
+        "SELECT id FROM tickets ORDER BY id LIMIT 31 OFFSET 3",
+    ]
+
+    # Bounds that aren't plain counts can't be combined with the page's
+    for sql_query in (
+        "SELECT id FROM tickets ORDER BY id LIMIT 10 + 5",
+        "SELECT id FROM tickets ORDER BY id LIMIT (SELECT 5)",
+        "SELECT id FROM tickets ORDER BY id FETCH FIRST 5 ROWS WITH TIES",
+    ):
+        try:
+            start_pagination(sql_query, page_size=10)
+            assert False, f"query bounds should be rejected: {sql_query}"
+        except ValueError as error:
+            assert "plain row count" in str(error)
+
+def test_null_keys_fall_back_to_offsets():
+    state = start_pagination("SELECT closed_at FROM tickets", page_size=1, page_key="closed_at")
+    _, next_state = paginate_rows(state, [{"closed_at": None}, {"closed_at": None}])
+
+    assert next_state["after"] is None and pagination_mode(next_state) == "offset"
+    page_query, _ = build_page_query(next_state)
+    assert page_query.endswith('ORDER BY "closed_at" LIMIT 2 OFFSET 1')
+
+def test_truncated_pages_continue_after_last_row():
+    state = start_pagination("SELECT id, subject FROM tickets", page_size=10, page_key="id")
+    rows, next_state = paginate_rows(state, make_rows(1, 4), truncated=True)
+
+    assert len(rows) == 4
+    assert next_state["after"] == [4] and next_state["offset"] == 4
+
+def test_columnar_keyset_pages():
+    state = start_pagination("SELECT subject, id FROM tickets", page_size=2, page_key="id", result_format="columns")
+    rows = [["first", 10], ["second", 11], ["third", 12]]
+
+    page_rows, next_state = paginate_rows(state, rows, columns=["subject", "id"])
+    assert page_rows == rows[:2] and next_state["after"] == [11]
+    assert decode_cursor(encode_cursor(next_state, SECRET), SECRET)["format"] == "columns"
+
+def test_invalid_settings():
+    for page_size, page_key in ((0, ""), (-5, ""), (10, 'id"; DROP TABLE tickets; --')):
+        try:
+            start_pagination("SELECT id FROM tickets", page_size=page_size, page_key=page_key)
+            assert False, f"settings should be rejected: {page_size}, {page_key!r}"
+        except ValueError:
+            pass
+
+def test_unordered_offset_pages_are_rejected():
+    # Neither a page key nor an ORDER BY (the key is dropped for a query with its own LIMIT)
+    for sql_query, page_key in (
+        ("SELECT id FROM tickets", ""),
+        ("SELECT id FROM tickets LIMIT 500", "id"),
+        ("SELECT id FROM (SELECT id FROM tickets ORDER BY id) AS t", ""),
+    ):
+        try:
+            start_pagination(sql_query, page_size=10, page_key=page_key)
+            assert False, f"unordered query should be rejected: {sql_query}"
+        except ValueError as error:
+            assert "ORDER BY" in str(error)
+    assert start_pagination("SELECT id FROM tickets ORDER BY id LIMIT 500", page_size=10)["key"] == []
+
+if __name__ == "__main__":
+    test_cursor_round_trip()
+    test_cursors_are_signed()
+    test_keyset_pages()
+    test_offset_pages()
+    test_offset_pages_keep_the_query_bounds()
+    test_null_keys_fall_back_to_offsets()
+    test_truncated_pages_continue_after_last_row()
+    test_columnar_keyset_pages()
+    test_invalid_settings()
+    test_unordered_offset_pages_are_rejected()
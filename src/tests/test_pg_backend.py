@@ -0,0 +1,159 @@
+import datetime
+import decimal
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import psycopg2
+
+from pg_backend import PostgresBackend, convert_placeholders, pg_value
+from rds_client import RDSClient
+
+# Error psycopg2 raises when the statement_timeout cancels a query
+class FakeQueryCanceled(psycopg2.Error):
+    pgcode = "57014"
+
+# Minimal stand-ins for a psycopg2 pool, connection and named cursor over canned rows
+class FakeColumn:
+    def __init__(self, name: str, type_code: int):
+        self.name = name
+        self.type_code = type_code
+
+class FakeCursor:
+    def __init__(self, connection, name):
+        self.connection = connection
+        self.name = name
+        self.description = None
+        self.position = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, sql_query, parameters=None):
+        self.connection.executed.append((self.name, sql_query, parameters))
+        if self.name is not None and self.connection.error is not None:
+            raise self.connection.error
+
+    def fetchmany(self, size):
+        self.description = [FakeColumn("id", 23), FakeColumn("created_at", 1114)]
+        self.connection.fetched.append(size)
+        batch = self.connection.rows[self.position:self.position + size]
+        self.position += len(batch)
+        return batch
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.readonly = None
+        self.closed = 0
+        self.executed = []
+        self.fetched = []
+        self.rollbacks = 0
+        self.error = None
+
+    def set_session(self, readonly, autocommit):
+        self.readonly = readonly
+
+    def cursor(self, name=None):
+        return FakeCursor(self, name)
+
+    def rollback(self):
+        self.rollbacks += 1
+
+class FakePool:
+    def __init__(self, connection):
+        self.connection = connection
+        self.returned = 0
+
+    def getconn(self):
+        return self.connection
+
+    def putconn(self, connection, close=False):
+        self.returned += 1
+
+def make_backend(rows, fetch_size=4):
+    connection = FakeConnection(rows)
+    backend = PostgresBackend(dsn="postgresql://localhost/test", fetch_size=fetch_size)
+    backend._pool = FakePool(connection)
+    return backend, connection
+
+def test_convert_placeholders():
+    parameters = {"after": 10, "size": 5}
+    sql_query = (
+        "SELECT id::text, ':after' AS label, \"a:after\" FROM t -- :size\n"
+        "WHERE id > :after AND name LIKE 'x%' AND ts = :missing LIMIT :size"
+    )
+
+    assert convert_placeholders(sql_query, parameters) == (
+        "SELECT id::text, ':after' AS label, \"a:after\" FROM t -- :size\n"
+        "WHERE id > %(after)s AND name LIKE 'x%%' AND ts = :missing LIMIT %(size)s"
+    )
+
+def test_pg_value_matches_data_api():
+    assert pg_value(datetime.datetime(2024, 5, 1, 10, 30)) == "2024-05-01 10:30:00"
+    assert pg_value(datetime.date(2024, 5, 1)) == "2024-05-01"
+    assert pg_value(decimal.Decimal("4.50")) == "4.50"
+    assert pg_value(memoryview(b"\x00\x01")) == "AAE="
+    assert pg_value([decimal.Decimal("1"), None]) == ["1", None]
+
+def test_rows_are_read_within_budget():
+    rows = [(i, datetime.datetime(2024, 5, 1)) for i in range(10)]
+    backend, connection = make_backend(rows)
+
+    result = RDSClient(cluster_arn="", secret_arn="", backend=backend).execute_query("SELECT id, created_at FROM tickets", max_rows=6)
+    assert result["success"] and result["truncated"]
+    assert result["data"][0] == {"id": 0, "created_at": "2024-05-01 00:00:00"}
+    assert result["row_count"] == 6 and result["total_row_count"] is None
+    # Batches stop one row past the budget, the rest of the result is never fetched
+    assert connection.fetched == [4, 3]
+    assert connection.readonly is True and connection.rollbacks == 1
+    assert connection.executed[0][0] is not None
+
+def test_columns_format_and_parameters():
+    backend, connection = make_backend([(1, datetime.datetime(2024, 5, 1))])
+
+    result = backend.execute_query("SELECT id, created_at FROM tickets WHERE id > :after", {"after": 0}, result_format="columns")
+    assert result["data"] == [[1, "2024-05-01 00:00:00"]] and not result["truncated"]
+    assert result["columns"] == ["id", "created_at"]
+    assert result["column_types"] == ["int4", "timestamp"]
+    assert connection.executed[0][1:] == ("SELECT id, created_at FROM tickets WHERE id > %(after)s", {"after": 0})
+
+def test_deadline_sets_statement_timeout():
+    backend, connection = make_backend([(1, datetime.datetime(2024, 5, 1))])
+
+    result = backend.execute_query("SELECT id, created_at FROM tickets", deadline=time.monotonic() + 5)
+    assert result["success"]
+    name, sql_query, parameters = connection.executed[0]
+    assert name is None and sql_query == "SELECT set_config('statement_timeout', %(timeout)s, true)"
+    assert 4000 < int(parameters["timeout"][:-2]) <= 5000
+    assert connection.executed[1][0] is not None and connection.rollbacks == 1
+
+def test_statement_timeout_is_reported():
+    backend, connection = make_backend([])
+    connection.error = FakeQueryCanceled("canceling statement due to statement timeout")
+
+    result = backend.execute_query("SELECT * FROM messages", deadline=time.monotonic() + 5)
+    assert not result["success"] and result["timed_out"]
+    assert result["error_code"] == "57014"
+    # The connection is still usable and goes back to the pool
+    assert connection.rollbacks == 1 and backend._pool.returned == 1
+
+    result = backend.execute_query("SELECT * FROM messages", deadline=time.monotonic() - 1)
+    assert not result["success"] and result["timed_out"]
+    assert len(connection.executed) == 2
+
+if __name__ == "__main__":
+    test_convert_placeholders()
+    test_pg_value_matches_data_api()
+    test_rows_are_read_within_budget()
+    test_columns_format_and_parameters()
+    test_deadline_sets_statement_timeout()
+    test_statement_timeout_is_reported()
+    print("All PostgreSQL backend tests passed.")
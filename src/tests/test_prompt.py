@@ -0,0 +1,96 @@
+import json
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import prompt
+from prompt import (
+    DATABASE_SCHEMA,
+    PROMPT_INSTRUCTIONS,
+    SCHEMA_INDEX,
+    SYSTEM_PROMPT_PREFIX,
+    create_system_prompt,
+    create_error_prompt,
+    create_prompt_blocks
+)
+from sql_agent import SQLAgent
+
+ERROR_CONTEXT = {
+    "error_title": "SQL Validation Failed",
+    "error_message": "Only SELECT queries are allowed",
+    "recovery_steps": ["Ensure you are only requesting data (SELECT operations)"],
+    "common_causes": ["Non-SELECT operations were detected in the query"]
+}
+
+def test_prompts_share_the_static_prefix():
+    system_prompt = create_system_prompt("Count overdue tickets per agent")
+    error_prompt = create_error_prompt("Count overdue tickets per agent", ERROR_CONTEXT, "DELETE FROM tickets")
+
+    assert system_prompt.startswith(SYSTEM_PROMPT_PREFIX) and error_prompt.startswith(SYSTEM_PROMPT_PREFIX)
+    assert "<table_schemas>" in SYSTEM_PROMPT_PREFIX and "Count overdue tickets per agent" not in SYSTEM_PROMPT_PREFIX
+    assert "DELETE FROM tickets" in error_prompt
+    assert system_prompt.endswith("<user_query>\n    Count overdue tickets per agent\n    </user_query>\n    ")
+
+def test_prompt_blocks_mark_the_cache_breakpoint():
+    blocks = create_prompt_blocks("Count overdue tickets per agent")
+    assert blocks[0] == {"type": "text", "text": SYSTEM_PROMPT_PREFIX, "cache_control": {"type": "ephemeral"}}
+    assert "cache_control" not in blocks[1]
+    assert "".join(block["text"] for block in blocks) == create_system_prompt("Count overdue tickets per agent")
+
+    error_blocks = create_prompt_blocks("Count overdue tickets per agent", ERROR_CONTEXT, "DELETE FROM tickets")
+    assert error_blocks[0] == blocks[0]
+    assert "".join(block["text"] for block in error_blocks) == create_error_prompt(
+        "Count overdue tickets per agent", ERROR_CONTEXT, "DELETE FROM tickets"
+    )
+
+def test_cached_block_is_the_same_for_every_question():
+    questions = ["Which message types are used the most?", "Count overdue tickets per priority"]
+    blocks = [create_prompt_blocks(question) for question in questions]
+    assert blocks[0][0] == blocks[1][0] and blocks[0][0]["text"] == SYSTEM_PROMPT_PREFIX
+
+    # Pruned schemas differ per question, so they go after the cached instructions
+    schemas = [SCHEMA_INDEX.prune(question) for question in questions]
+    assert schemas[0] != schemas[1]
+    pruned_blocks = [create_prompt_blocks(question, schema=schema) for question, schema in zip(questions, schemas)]
+    assert pruned_blocks[0][0] == pruned_blocks[1][0]
+    assert pruned_blocks[0][0] == {"type": "text", "text": PROMPT_INSTRUCTIONS, "cache_control": {"type": "ephemeral"}}
+    assert "<table_schemas>" not in PROMPT_INSTRUCTIONS and SYSTEM_PROMPT_PREFIX.startswith(PROMPT_INSTRUCTIONS)
+    for question, schema, question_blocks in zip(questions, schemas, pruned_blocks):
+        assert schema in question_blocks[1]["text"] and "cache_control" not in question_blocks[1]
+        assert "".join(block["text"] for block in question_blocks) == create_system_prompt(question, schema)
+
+def test_bundled_schema_is_sent_whole():
+    # The bundled schema is below the pruning threshold, so its prompt prefix never changes
+    assert len(DATABASE_SCHEMA) < prompt.SCHEMA_PRUNING_MIN_BYTES
+    assert prompt.select_schema("Which message types are used the most?") is DATABASE_SCHEMA
+
+def test_pruned_schema_follows_the_cached_instructions():
+    question = "Which message types are used the most?"
+    previous = prompt.SCHEMA_PRUNING_MIN_BYTES
+    prompt.SCHEMA_PRUNING_MIN_BYTES = len(DATABASE_SCHEMA)
+    try:
+        schema = prompt.select_schema(question)
+        body = json.loads(SQLAgent().build_request_body(question))
+        error_blocks = create_prompt_blocks(question, ERROR_CONTEXT, "DELETE FROM messages")
+    finally:
+        prompt.SCHEMA_PRUNING_MIN_BYTES = previous
+
+    assert schema == SCHEMA_INDEX.prune(question) and len(schema) < len(DATABASE_SCHEMA)
+    cached, uncached = body["messages"][0]["content"]
+    assert cached == {"type": "text", "text": PROMPT_INSTRUCTIONS, "cache_control": {"type": "ephemeral"}}
+    assert uncached["text"].startswith(prompt.create_schema_prompt(schema)) and "cache_control" not in uncached
+    assert uncached["text"].endswith(prompt.create_query_prompt(question))
+    assert error_blocks[0] == cached and "DELETE FROM messages" in error_blocks[1]["text"]
+    assert "".join(block["text"] for block in error_blocks) == create_error_prompt(
+        question, ERROR_CONTEXT, "DELETE FROM messages", schema
+    )
+
+if __name__ == "__main__":
+    test_prompts_share_the_static_prefix()
+    test_prompt_blocks_mark_the_cache_breakpoint()
+    test_cached_block_is_the_same_for_every_question()
+    test_bundled_schema_is_sent_whole()
+    test_pruned_schema_follows_the_cached_instructions()
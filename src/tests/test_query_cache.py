@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from query_cache import QueryCache
+
+def make_result(rows: int = 1):
+    data = [{"id": i, "subject": f"ticket {i}"} for i in range(rows)]
+    return {"success": True, "data": data, "row_count": rows, "columns": ["id", "subject"]}
+
+def test_normalized_sql_shares_entry():
+    cache = QueryCache(ttl_seconds=60)
+    cache.put("SELECT id FROM tickets WHERE subject = 'A  b';", make_result(), tables=["tickets"])
+
+    assert cache.get("select  id\tfrom TICKETS where subject = 'A  b'") is not None
+    assert cache.get("SELECT id FROM tickets WHERE subject = 'a b'") is None
+    assert cache.get("SELECT id -- tickets\nFROM tickets WHERE subject = 'A  b'") is None
+
+def test_literals_keep_their_case():
+    cache = QueryCache(ttl_seconds=60)
+    # The quote after a backslash is part of an E'...' literal, so "A" is literal text too
+    cache.put("SELECT id FROM tickets WHERE subject = E'\\'A'", make_result())
+    cache.put("SELECT $q$A$q$ AS a", make_result())
+
+    assert cache.get("select id from tickets where subject = E'\\'A'") is not None
+    assert cache.get("SELECT id FROM tickets WHERE subject = E'\\'a'") is None
+    assert cache.get("select $q$A$q$ as A") is not None
+    assert cache.get("SELECT $q$a$q$ AS a") is None
+    assert cache.get('SELECT id FROM "Tickets"') is None
+
+def test_variants_are_cached_separately():
+    cache = QueryCache(ttl_seconds=60)
+    cache.put("SELECT id FROM tickets", make_result(), tables=["tickets"], variant="columns")
+
+    assert cache.get("SELECT id FROM tickets") is None
+    assert cache.get("select id from tickets", variant="columns") is not None
+    assert cache.invalidate_tables(["tickets"]) == 1
+
+def test_ttl_expiry():
+    cache = QueryCache(ttl_seconds=0.05)
+    cache.put("SELECT 1", make_result())
+    assert cache.get("SELECT 1") is not None
+    time.sleep(0.06)
+    assert cache.get("SELECT 1") is None
+    assert cache.stats()["entries"] == 0
+
+def test_lru_eviction_by_size():
+    entry_size = QueryCache(max_bytes=10**9)
+    entry_size.put("SELECT 0", make_result(10))
+    size = entry_size.stats()["bytes"]
+
+    cache = QueryCache(ttl_seconds=60, max_bytes=size * 2)
+    cache.put("SELECT 1", make_result(10))
+    cache.put("SELECT 2", make_result(10))
+    assert cache.get("SELECT 1") is not None
+    cache.put("SELECT 3", make_result(10))
+
+    assert cache.get("SELECT 2") is None
+    assert cache.get("SELECT 1") is not None
+    assert cache.get("SELECT 3") is not None
+    assert cache.stats()["evictions"] == 1
+
+def test_table_invalidation():
+    cache = QueryCache(ttl_seconds=60)
+    cache.put("SELECT * FROM tickets t JOIN messages m ON m.ticket_id = t.id", make_result(), tables=["tickets", "messages"])
+    cache.put("SELECT * FROM ticket_statuses", make_result(), tables=["ticket_statuses"])
+
+    assert cache.invalidate_tables(["MESSAGES"]) == 1
+    assert cache.get("SELECT * FROM tickets t JOIN messages m ON m.ticket_id = t.id") is None
+    assert cache.get("SELECT * FROM ticket_statuses") is not None
+    assert cache.invalidate_tables(["tickets"]) == 0
+    assert cache.stats()["entries"] == 1
+
+def test_hits_are_copies():
+    cache = QueryCache(ttl_seconds=60)
+    result = make_result(2)
+    cache.put("SELECT id FROM tickets", result)
+    result["data"].clear()
+
+    hit = cache.get("SELECT id FROM tickets")
+    assert hit == make_result(2)
+    hit["data"][0]["subject"] = "changed"
+    hit["cache"] = "hit"
+    assert cache.get("SELECT id FROM tickets") == make_result(2)
+
+if __name__ == "__main__":
+    test_normalized_sql_shares_entry()
+    test_literals_keep_their_case()
+    test_variants_are_cached_separately()
+    test_ttl_expiry()
+    test_lru_eviction_by_size()
+    test_table_invalidation()
+    test_hits_are_copies()
+    print("All query cache tests passed.")
@@ -0,0 +1,135 @@
+import json
+import os
+import sys
+import threading
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from botocore.exceptions import ClientError
+
+import rate_limiter
+from rate_limiter import RateLimiter, RateLimitTimeout
+from sql_agent import SQLAgent
+
+# Bedrock runtime stand-in that throttles the next `throttle` calls, then answers
+class FakeBedrockClient:
+    def __init__(self, throttle: int = 0):
+        self.throttle = throttle
+        self.calls = 0
+
+    def invoke_model(self, modelId: str, body: str) -> dict:
+        self.calls += 1
+        if self.throttle > 0:
+            self.throttle -= 1
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "Too many requests"}}, "InvokeModel")
+        payload = {
+            "content": [{"type": "text", "text": "<sql_statement>SELECT id FROM tickets</sql_statement>"}],
+            "usage": {"input_tokens": 100, "output_tokens": 20}
+        }
+        return {"body": FakeBody(json.dumps(payload).encode("utf-8"))}
+
+class FakeBody:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def read(self) -> bytes:
+        return self.data
+
+def make_agent(client: FakeBedrockClient, limiter: RateLimiter) -> SQLAgent:
+    agent = SQLAgent(streaming=False, rate_limiter=limiter)
+    agent._bedrock_agent = client
+    return agent
+
+def test_throttled_calls_are_retried():
+    client = FakeBedrockClient(throttle=2)
+    limiter = RateLimiter(base_delay=0.01, max_delay=0.02)
+    agent = make_agent(client, limiter)
+
+    assert agent.generate_sql("List the tickets") == ("SELECT id FROM tickets", None)
+    stats = limiter.stats()
+    assert client.calls == 3
+    assert stats["throttled"] == 2 and stats["retries"] == 2
+    assert stats["in_flight"] == 0
+
+def test_gives_up_after_max_retries():
+    client = FakeBedrockClient(throttle=10)
+    agent = make_agent(client, RateLimiter(max_retries=1, base_delay=0.01))
+
+    sql_query, error = agent.generate_sql("List the tickets")
+    assert sql_query is None
+    assert "ThrottlingException" in error
+    assert client.calls == 2
+
+def test_queue_deadline():
+    limiter = RateLimiter(max_concurrency=1, queue_timeout=0.05)
+    started, finish = threading.Event(), threading.Event()
+
+    def slow_call():
+        started.set()
+        finish.wait(1)
+
+    thread = threading.Thread(target=limiter.call, args=(slow_call,))
+    thread.start()
+    started.wait(1)
+    try:
+        limiter.call(lambda: None)
+        assert False, "expected RateLimitTimeout"
+    except RateLimitTimeout:
+        pass
+    finish.set()
+    thread.join()
+
+    assert limiter.call(lambda: "done") == "done"
+    assert limiter.stats()["rejected"] == 1
+
+def test_token_budget_delays_calls():
+    # 100 tokens per second, the first call empties the bucket
+    limiter = RateLimiter(tokens_per_minute=6000)
+    limiter.call(lambda: None, tokens=6000)
+
+    start = time.monotonic()
+    limiter.call(lambda: None, tokens=10)
+    assert time.monotonic() - start >= 0.08
+    assert limiter.stats()["queue_wait"]["max_ms"] >= 80
+
+def test_throttling_lowers_rate():
+    limiter = RateLimiter(requests_per_minute=600, base_delay=0.001)
+    agent = make_agent(FakeBedrockClient(throttle=1), limiter)
+
+    agent.generate_sql("List the tickets")
+    assert limiter.stats()["rate_factor"] < 1.0
+
+# Stands in for the time module of the rate limiter, recording the calls in flight at every backoff
+class SleepSpy:
+    monotonic = staticmethod(time.monotonic)
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+        self.in_flight = []
+
+    def sleep(self, seconds: float) -> None:
+        self.in_flight.append(self.limiter.in_flight)
+        time.sleep(seconds)
+
+def test_backoff_frees_the_slot():
+    limiter = RateLimiter(max_concurrency=1, base_delay=0.01)
+    agent = make_agent(FakeBedrockClient(throttle=2), limiter)
+    spy = SleepSpy(limiter)
+    rate_limiter.time = spy
+    try:
+        assert agent.generate_sql("List the tickets")[0] == "SELECT id FROM tickets"
+    finally:
+        rate_limiter.time = time
+    assert spy.in_flight == [0, 0]
+
+if __name__ == "__main__":
+    test_throttled_calls_are_retried()
+    test_gives_up_after_max_retries()
+    test_queue_deadline()
+    test_token_budget_delays_calls()
+    test_throttling_lowers_rate()
+    test_backoff_frees_the_slot()
+    print("All rate limiter tests passed.")
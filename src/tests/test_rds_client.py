@@ -0,0 +1,249 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from botocore.exceptions import ClientError
+
+from rds_client import RDSClient, parse_records, parse_field_records, field_value
+
+# Stands in for the boto3 rds-data client, answering every statement after a delay
+class SlowDataAPI:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.statements = []
+        self.begins = 0
+        self.rollbacks = []
+
+    def begin_transaction(self, **request):
+        self.begins += 1
+        return {"transactionId": "tx-1"}
+
+    def rollback_transaction(self, **request):
+        self.rollbacks.append(request["transactionId"])
+        return {"transactionStatus": "Rollback Complete"}
+
+    def execute_statement(self, **request):
+        self.statements.append(request)
+        time.sleep(self.delay)
+        return {"formattedRecords": json.dumps([{"sql": request["sql"]}])}
+
+# Cancels every query like a statement_timeout firing
+class TimingOutDataAPI(SlowDataAPI):
+    def execute_statement(self, **request):
+        if not request["sql"].startswith("SELECT set_config"):
+            raise ClientError(
+                {"Error": {"Code": "BadRequestException", "Message": "ERROR: canceling statement due to statement timeout"}},
+                "ExecuteStatement"
+            )
+        return super().execute_statement(**request)
+
+# Rejects the first `resuming` statements like an Aurora Serverless cluster that is resuming
+class ResumingDataAPI:
+    def __init__(self, resuming: int, error_code: str = "DatabaseResumingException"):
+        self.resuming = resuming
+        self.error_code = error_code
+        self.calls = 0
+
+    def execute_statement(self, **request):
+        self.calls += 1
+        if self.resuming > 0:
+            self.resuming -= 1
+            raise ClientError({"Error": {"Code": self.error_code, "Message": "The database is resuming"}}, "ExecuteStatement")
+        return {"formattedRecords": json.dumps([{"sql": request["sql"]}])}
+
+def make_client(delay: float, **kwargs) -> RDSClient:
+    client = RDSClient(cluster_arn="arn:cluster", secret_arn="arn:secret", db_name="test", **kwargs)
+    client.rds_client = SlowDataAPI(delay)
+    return client
+
+def test_parse_records_without_budgets():
+    records = [{"id": 1, "subject": "Login fails, \"urgent\""}, {"id": 2, "subject": None}]
+
+    assert parse_records(json.dumps(records)) == (records, False)
+    assert parse_records(" [ ] ") == ([], False)
+
+def test_parse_records_stops_at_budgets():
+    records = [{"id": i, "body": "x" * 100} for i in range(50)]
+    formatted_records = json.dumps(records)
+
+    rows, truncated = parse_records(formatted_records, max_rows=10)
+    assert rows == records[:10] and truncated
+
+    rows, truncated = parse_records(formatted_records, max_rows=50)
+    assert rows == records and not truncated
+
+    row_bytes = len(json.dumps(records[0]))
+    rows, truncated = parse_records(formatted_records, max_bytes=row_bytes * 3)
+    assert rows == records[:3] and truncated
+
+    # A row larger than the whole budget isn't returned at all
+    rows, truncated = parse_records(formatted_records, max_bytes=10)
+    assert rows == [] and truncated
+
+def test_parse_records_rejects_malformed_json():
+    for formatted_records in ("", "{}", "[{\"id\": 1}", "[{\"id\": 1} {\"id\": 2}]", "[{\"id\": 1},]"):
+        try:
+            parse_records(formatted_records)
+            assert False, f"records should be rejected: {formatted_records!r}"
+        except ValueError:
+            pass
+
+def test_parse_field_records():
+    records = [
+        [{"longValue": 1}, {"stringValue": "open"}, {"isNull": True}, {"booleanValue": True}],
+        [{"longValue": 2}, {"doubleValue": 1.5}, {"arrayValue": {"stringValues": ["a", "b"]}}, {"blobValue": b"\x00\x01"}],
+    ]
+
+    rows, truncated = parse_field_records(records)
+    assert rows == [[1, "open", None, True], [2, 1.5, ["a", "b"], "AAE="]] and not truncated
+    assert field_value({"arrayValue": {"arrayValues": [{"longValues": [1]}, {"longValues": [2, 3]}]}}) == [[1], [2, 3]]
+
+    assert parse_field_records(records, max_rows=1) == ([[1, "open", None, True]], True)
+    assert parse_field_records(records, max_bytes=5) == ([], True)
+
+def test_data_api_client_is_created_on_first_use():
+    client = RDSClient(cluster_arn="arn:cluster", secret_arn="arn:secret", db_name="test")
+    assert client.backend._rds_client is None
+
+    assert client.rds_client is client.rds_client
+    assert client.rds_client.meta.service_model.service_name == "rds-data"
+
+def test_async_queries_overlap():
+    client = make_client(0.2, max_concurrency=4)
+
+    async def run_queries():
+        return await asyncio.gather(*(client.execute_query_async(f"SELECT {i}") for i in range(4)))
+
+    start = time.perf_counter()
+    results = asyncio.run(run_queries())
+    elapsed = time.perf_counter() - start
+
+    assert [result["data"] for result in results] == [[{"sql": f"SELECT {i}"}] for i in range(4)]
+    assert elapsed < 0.6, f"queries should run concurrently ({elapsed:.2f}s)"
+
+def test_async_query_timeout():
+    client = make_client(0.5, max_concurrency=1, query_timeout=0.05)
+    result = asyncio.run(client.execute_query_async("SELECT 1"))
+
+    assert not result["success"] and result["error_code"] == "QueryTimeout" and result["timed_out"]
+    client.executor.shutdown(wait=True)
+
+def test_deadline_sets_statement_timeout():
+    client = make_client(0)
+    result = asyncio.run(client.execute_query_async("SELECT 1", deadline=time.monotonic() + 5))
+    assert result["success"]
+
+    data_api = client.rds_client
+    timeout, query = data_api.statements
+    assert timeout["sql"] == "SELECT set_config('statement_timeout', :timeout, true)"
+    assert 4000 < int(timeout["parameters"][0]["value"]["stringValue"][:-2]) <= 5000
+    assert timeout["transactionId"] == query["transactionId"] == "tx-1"
+    assert data_api.rollbacks == ["tx-1"]
+
+    # Without a deadline or timeout the query runs on its own
+    client.execute_query("SELECT 1")
+    assert "transactionId" not in data_api.statements[-1]
+
+def test_distant_deadline_is_a_single_call():
+    client = make_client(0)
+    # The Data API cancels the statement at its own call timeout before this deadline
+    result = asyncio.run(client.execute_query_async("SELECT 1", deadline=time.monotonic() + 60))
+    assert result["success"]
+
+    data_api = client.rds_client
+    assert len(data_api.statements) == 1 and data_api.begins == 0 and data_api.rollbacks == []
+    assert "transactionId" not in data_api.statements[0]
+
+def test_default_settings_make_a_single_call():
+    import mcp_server
+
+    client = mcp_server.rds_client
+    previous = client.rds_client
+    client.rds_client = SlowDataAPI(0)
+    try:
+        # A query and the EXPLAIN of the cost gate (the stub's records aren't a plan, only the calls count)
+        assert asyncio.run(client.execute_query_async("SELECT 1", deadline=mcp_server.current_deadline()))["success"]
+        asyncio.run(client.explain_query_async("SELECT 1", deadline=mcp_server.current_deadline()))
+        data_api = client.rds_client
+    finally:
+        client.rds_client = previous
+    assert len(data_api.statements) == 2 and data_api.begins == 0
+    assert all("transactionId" not in statement for statement in data_api.statements)
+
+def test_statement_timeout_is_reported():
+    client = RDSClient(cluster_arn="arn:cluster", secret_arn="arn:secret", db_name="test", query_timeout=5)
+    client.rds_client = TimingOutDataAPI(0)
+
+    result = asyncio.run(client.execute_query_async("SELECT * FROM messages"))
+    assert not result["success"] and result["timed_out"]
+    assert result["error_code"] == "BadRequestException"
+    assert client.rds_client.rollbacks == ["tx-1"]
+
+    # A deadline that already passed doesn't start the query at all
+    result = asyncio.run(client.execute_query_async("SELECT 1", deadline=time.monotonic() - 1))
+    assert not result["success"] and result["timed_out"]
+    assert len(client.rds_client.statements) == 1
+
+def make_resuming_client(data_api: ResumingDataAPI, **kwargs) -> RDSClient:
+    client = RDSClient(cluster_arn="arn:cluster", secret_arn="arn:secret", db_name="test", **kwargs)
+    client.backend.resume_base_delay = 0.01
+    client.backend.resume_max_delay = 0.02
+    client.rds_client = data_api
+    return client
+
+def test_resuming_database_is_retried():
+    data_api = ResumingDataAPI(resuming=3)
+    client = make_resuming_client(data_api)
+
+    result = client.execute_query("SELECT 1")
+    assert result["success"] and data_api.calls == 4
+    assert client.backend.resume_retries == 3
+
+def test_resume_gives_up_at_deadline():
+    client = make_resuming_client(ResumingDataAPI(resuming=1000, error_code="BadRequestException"), resume_timeout=0.1)
+
+    result = client.execute_query("SELECT 1")
+    assert not result["success"] and result["resuming"]
+    assert result["error_code"] == "BadRequestException"
+
+def test_sql_errors_are_not_retried():
+    data_api = ResumingDataAPI(resuming=1, error_code="DatabaseErrorException")
+    client = make_resuming_client(data_api)
+
+    result = client.execute_query("SELECT missing FROM tickets")
+    assert not result["success"] and "resuming" not in result
+    assert data_api.calls == 1
+
+def test_prewarm_runs_once():
+    data_api = ResumingDataAPI(resuming=2)
+    client = make_resuming_client(data_api)
+
+    future = client.prewarm()
+    assert future is not None
+    assert future.result(timeout=5) == (True, None)
+    # The database answered just now, no need to wake it up again
+    assert client.prewarm() is None
+    assert data_api.calls == 3
+
+if __name__ == "__main__":
+    test_parse_records_without_budgets()
+    test_parse_records_stops_at_budgets()
+    test_parse_records_rejects_malformed_json()
+    test_parse_field_records()
+    test_data_api_client_is_created_on_first_use()
+    test_async_queries_overlap()
+    test_async_query_timeout()
+    test_deadline_sets_statement_timeout()
+    test_distant_deadline_is_a_single_call()
+    test_default_settings_make_a_single_call()
+    test_statement_timeout_is_reported()
+    test_resuming_database_is_retried()
+    test_resume_gives_up_at_deadline()
+    test_sql_errors_are_not_retried()
+    test_prewarm_runs_once()
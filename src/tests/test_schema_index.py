@@ -0,0 +1,49 @@
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from prompt import DATABASE_SCHEMA
+from schema_index import SchemaIndex
+
+def test_schema_is_parsed():
+    index = SchemaIndex(DATABASE_SCHEMA)
+
+    assert list(index.tables) == [
+        "ticket_categories", "ticket_priorities", "ticket_statuses", "tickets", "message_types", "messages"
+    ]
+    tickets = index.tables["tickets"]
+    assert tickets.text.startswith("-- Tickets table (main table)") and tickets.text.endswith(");")
+    assert "custom_fields" in tickets.columns and "PRIMARY" not in tickets.columns
+    assert tickets.columns["subject"] == "Brief description of the issue"
+    assert {"ticket_statuses", "ticket_priorities", "ticket_categories"} <= tickets.references
+    assert index.graph["messages"] == {"tickets", "message_types"}
+
+def test_relevant_tables_include_join_paths():
+    index = SchemaIndex(DATABASE_SCHEMA)
+
+    assert index.relevant_tables("Which message types are used the most?") == ["message_types", "messages"]
+    # Messages only reach priorities through tickets
+    tables = index.relevant_tables("Count messages per priority")
+    assert {"ticket_priorities", "tickets", "messages"} <= set(tables)
+    assert "ticket_categories" not in tables
+    assert index.relevant_tables("hello") == []
+
+def test_pruned_schema_keeps_matching_notes():
+    index = SchemaIndex(DATABASE_SCHEMA)
+    schema = index.prune("Which message types are used the most?")
+
+    assert "CREATE TABLE IF NOT EXISTS messages" in schema
+    assert "CREATE TABLE IF NOT EXISTS tickets" not in schema
+    assert "JOIN message_types mt ON m.type_id = mt.id" in schema
+    assert "ts.category = 'open'" not in schema and "tickets.status_id" not in schema
+
+    # Questions that match nothing get the whole schema
+    assert index.prune("hello") is DATABASE_SCHEMA
+
+if __name__ == "__main__":
+    test_schema_is_parsed()
+    test_relevant_tables_include_join_paths()
+    test_pruned_schema_keeps_matching_notes()
@@ -0,0 +1,58 @@
+import importlib.util
+import json
+import os
+import sys
+from datetime import date
+from decimal import Decimal
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+import serialization
+from serialization import dumps, dumps_bytes, loads
+
+# Loads a separate copy of the serialization module as if orjson wasn't installed
+def load_without_orjson():
+    spec = importlib.util.spec_from_file_location("serialization_without_orjson", serialization.__file__)
+    module = importlib.util.module_from_spec(spec)
+    previous = sys.modules.get("orjson", None)
+    sys.modules["orjson"] = None
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        if previous is None:
+            del sys.modules["orjson"]
+        else:
+            sys.modules["orjson"] = previous
+    return module
+
+def test_results_are_serialized_compactly():
+    result = {"success": True, "data": [{"id": 1, "subject": "Connexion échouée"}], "columns": ["id", "subject"]}
+
+    assert dumps(result) == '{"success":true,"data":[{"id":1,"subject":"Connexion échouée"}],"columns":["id","subject"]}'
+    assert loads(dumps_bytes(result)) == result
+
+def test_unsupported_values_are_written_as_strings():
+    result = {"amount": Decimal("12.50"), "big": 2 ** 70}
+
+    parsed = json.loads(dumps(result))
+    assert parsed["amount"] == "12.50"
+    assert parsed["big"] == 2 ** 70
+    assert json.loads(dumps({"day": date(2024, 5, 1)}))["day"] == "2024-05-01"
+
+def test_standard_library_fallback():
+    fallback = load_without_orjson()
+    assert fallback.JSON_BACKEND == "json" and fallback.orjson is None
+
+    result = {"success": True, "data": [{"id": 1, "subject": "Connexion échouée", "amount": Decimal("12.50")}], "big": 2 ** 70}
+    assert fallback.dumps(result) == (
+        '{"success":true,"data":[{"id":1,"subject":"Connexion échouée","amount":"12.50"}],"big":1180591620717411303424}'
+    )
+    assert fallback.dumps_bytes(result) == dumps_bytes(result)
+    assert fallback.loads(fallback.dumps_bytes({"day": date(2024, 5, 1)})) == {"day": "2024-05-01"}
+
+if __name__ == "__main__":
+    test_results_are_serialized_compactly()
+    test_unsupported_values_are_written_as_strings()
+    test_standard_library_fallback()
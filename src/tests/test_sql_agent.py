@@ -0,0 +1,155 @@
+import json
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from botocore.exceptions import ClientError
+
+from sql_agent import SQLAgent, SQLStatementParser, extract_sql
+
+COMPLETION = "Here you go:\n<sql_statement>\nSELECT id FROM tickets;\n</sql_statement>\nThis query lists the tickets."
+
+# Streams the completion in small chunks and records how many were read
+class StreamingClient:
+    def __init__(self, completion: str, chunk_chars: int = 5):
+        self.chunks = [completion[i:i + chunk_chars] for i in range(0, len(completion), chunk_chars)]
+        self.sent = 0
+        self.closed = False
+
+    def invoke_model_with_response_stream(self, modelId: str, body: str) -> dict:
+        return {"body": self}
+
+    def __iter__(self):
+        yield {"chunk": {"bytes": json.dumps({"type": "message_start", "message": {"usage": {"input_tokens": 10}}})}}
+        for chunk in self.chunks:
+            self.sent += 1
+            yield {"chunk": {"bytes": json.dumps({"type": "content_block_delta", "delta": {"text": chunk}})}}
+
+    def close(self):
+        self.closed = True
+
+# Client of a role that may call invoke_model but not invoke_model_with_response_stream
+class NonStreamingClient:
+    def __init__(self, completion: str):
+        self.completion = completion
+        self.stream_calls = 0
+        self.calls = 0
+
+    def invoke_model_with_response_stream(self, modelId: str, body: str) -> dict:
+        self.stream_calls += 1
+        raise ClientError(
+            {"Error": {"Code": "AccessDeniedException", "Message": "not authorized to perform: bedrock:InvokeModelWithResponseStream"}},
+            "InvokeModelWithResponseStream"
+        )
+
+    def invoke_model(self, modelId: str, body: str) -> dict:
+        self.calls += 1
+        payload = {"content": [{"type": "text", "text": self.completion}], "usage": {"input_tokens": 10, "output_tokens": 20}}
+        return {"body": ResponseBody(json.dumps(payload).encode("utf-8"))}
+
+class ResponseBody:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def read(self) -> bytes:
+        return self.data
+
+def test_extract_sql():
+    assert extract_sql(COMPLETION) == "SELECT id FROM tickets;"
+    assert extract_sql("<sql_statement>SELECT 1") == "SELECT 1"
+    assert extract_sql("  SELECT 1\n") == "SELECT 1"
+
+def test_parser_handles_tags_split_across_chunks():
+    for chunk_chars in range(1, len(COMPLETION) + 1):
+        parser = SQLStatementParser()
+        chunks = [COMPLETION[i:i + chunk_chars] for i in range(0, len(COMPLETION), chunk_chars)]
+        done = [parser.feed(chunk) for chunk in chunks]
+        assert parser.sql_query() == "SELECT id FROM tickets;"
+        assert done.index(True) == (COMPLETION.find("</sql_statement>") + len("</sql_statement>") - 1) // chunk_chars
+
+def test_streaming_stops_after_sql_statement():
+    client = StreamingClient(COMPLETION)
+    agent = SQLAgent(streaming=True)
+    agent._bedrock_agent = client
+
+    sql_query, error = agent.generate_sql("List the tickets")
+    assert error is None
+    assert sql_query == "SELECT id FROM tickets;"
+    assert client.closed
+    assert client.sent < len(client.chunks)
+
+def test_streaming_without_closing_tag():
+    agent = SQLAgent(streaming=True)
+    agent._bedrock_agent = StreamingClient("<sql_statement>\nSELECT id FROM tickets")
+
+    assert agent.generate_sql("List the tickets") == ("SELECT id FROM tickets", None)
+
+def test_streaming_access_denied_falls_back_to_invoke_model():
+    client = NonStreamingClient(COMPLETION)
+    agent = SQLAgent(streaming=True)
+    agent._bedrock_agent = client
+
+    assert agent.generate_sql("List the tickets") == ("SELECT id FROM tickets;", None)
+    assert agent.generate_sql("List the open tickets") == ("SELECT id FROM tickets;", None)
+    assert client.stream_calls == 1 and client.calls == 2
+    assert agent.streaming is False
+
+def test_rewrite_adds_limit():
+    agent = SQLAgent(max_limit=100)
+    assert agent.rewrite_sql("SELECT id FROM tickets") == ("SELECT id FROM tickets LIMIT 100", "Added LIMIT 100")
+    assert agent.rewrite_sql("SELECT id FROM tickets;\n") == ("SELECT id FROM tickets LIMIT 100;\n", "Added LIMIT 100")
+    assert agent.rewrite_sql("SELECT id FROM tickets; -- all tickets")[0] == "SELECT id FROM tickets LIMIT 100; -- all tickets"
+    assert agent.rewrite_sql("SELECT id FROM tickets -- all tickets")[0] == "SELECT id FROM tickets -- all tickets\nLIMIT 100"
+    assert agent.rewrite_sql("SELECT id FROM tickets OFFSET 20")[0] == "SELECT id FROM tickets OFFSET 20 LIMIT 100"
+
+def test_rewrite_only_touches_the_outer_query():
+    agent = SQLAgent(max_limit=100)
+    sql_query = (
+        "WITH recent AS (SELECT * FROM tickets ORDER BY created_at DESC LIMIT 5000)\n"
+        "SELECT DISTINCT ON (status) status, id, row_number() OVER (ORDER BY id) AS n\n"
+        "FROM recent ORDER BY status, id;"
+    )
+    rewritten, change = agent.rewrite_sql(sql_query)
+    assert change == "Added LIMIT 100"
+    assert rewritten == sql_query[:-1] + " LIMIT 100;"
+
+def test_rewrite_lowers_large_limits():
+    agent = SQLAgent(max_limit=100)
+    assert agent.rewrite_sql("SELECT id FROM tickets ORDER BY id LIMIT 5000 OFFSET 10") == (
+        "SELECT id FROM tickets ORDER BY id LIMIT 100 OFFSET 10", "Lowered LIMIT 5000 to 100"
+    )
+    assert agent.rewrite_sql("select id from tickets limit all")[0] == "select id from tickets limit 100"
+    assert agent.rewrite_sql("SELECT id FROM tickets FETCH FIRST 500 ROWS ONLY")[0] == "SELECT id FROM tickets FETCH FIRST 100 ROWS ONLY"
+    assert agent.rewrite_sql("SELECT id FROM tickets LIMIT 10;") == ("SELECT id FROM tickets LIMIT 10;", None)
+    assert agent.rewrite_sql("SELECT id FROM tickets FETCH FIRST ROW ONLY")[1] is None
+
+    rewritten, change = agent.rewrite_sql("SELECT id FROM tickets LIMIT (SELECT count(*) FROM users)")
+    assert rewritten == "SELECT * FROM (\nSELECT id FROM tickets LIMIT (SELECT count(*) FROM users)\n) AS limited_query LIMIT 100"
+    assert change == "Wrapped the query in LIMIT 100"
+
+    # An expression that starts with a small number isn't a small count
+    for sql_query in ("SELECT id FROM tickets LIMIT 10 + 5000", "SELECT id FROM tickets LIMIT 10 -- ten\n* 500"):
+        rewritten, change = agent.rewrite_sql(sql_query)
+        assert rewritten == f"SELECT * FROM (\n{sql_query}\n) AS limited_query LIMIT 100"
+        assert change == "Wrapped the query in LIMIT 100"
+    assert agent.rewrite_sql("SELECT id FROM tickets LIMIT 10 /* ten */ OFFSET 5") == (
+        "SELECT id FROM tickets LIMIT 10 /* ten */ OFFSET 5", None
+    )
+
+def test_rewrite_disabled():
+    assert SQLAgent(max_limit=0).rewrite_sql("SELECT id FROM tickets") == ("SELECT id FROM tickets", None)
+
+if __name__ == "__main__":
+    test_extract_sql()
+    test_parser_handles_tags_split_across_chunks()
+    test_streaming_stops_after_sql_statement()
+    test_streaming_without_closing_tag()
+    test_streaming_access_denied_falls_back_to_invoke_model()
+    test_rewrite_adds_limit()
+    test_rewrite_only_touches_the_outer_query()
+    test_rewrite_lowers_large_limits()
+    test_rewrite_disabled()
+    print("All SQL agent tests passed.")
@@ -1,12 +1,18 @@
 import csv
 import os
+import random
 import sys
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
+import sqlparse
+import sqlparse.exceptions
+
 from sql_agent import SQLAgent
+from sql_validator import normalize_sql, validate_sql
+from tests.legacy_validator import legacy_validate_sql
 
 def load_test_cases(csv_file_path: str):
     test_cases = []
@@ -73,8 +79,150 @@ def test_sql_validator():
             print(f"Expected: {failure['expected']}, Got: {failure['actual']}")
             print(f"Error: {failure['error']}")
             print(f"Notes: {failure['notes']}")
-    
-    return results
+
+    assert results['failed'] == 0, results['failures']
+
+# Respells a query (whose literals are plain '...' strings) in lower case with more whitespace,
+# outside of its literals
+def respell(query: str) -> str:
+    pieces = query.split("'")
+    pieces[::2] = [piece.lower().replace(" ", "\t ") for piece in pieces[::2]]
+    return "  " + "'".join(pieces) + "\n"
+
+def test_validation_memo_matches_fresh_validation():
+    sql_agent = SQLAgent()
+    fresh_agent = SQLAgent(validation_cache_size=0)
+    test_cases = load_test_cases('sql_validation_tests.csv')
+
+    for test_case in test_cases:
+        query = test_case['query']
+        expected = fresh_agent.validate_sql(query)
+        assert sql_agent.validate_sql(query) == expected
+        assert sql_agent.validate_sql(query) == expected
+        assert sql_agent.validate_sql(respell(query)) == expected
+
+    # One miss per distinct fingerprint ("SeLeCt 1" and "select 1" share one), every other call is a hit
+    distinct = len({SQLAgent.fingerprint_sql(test_case['query']) for test_case in test_cases})
+    info = sql_agent.validation_cache_info()
+    assert info['misses'] == distinct
+    assert info['hits'] == 3 * len(test_cases) - distinct
+
+    # Line breaks end "--" comments, so they must not share a fingerprint with plain spaces
+    assert sql_agent.validate_sql("SELECT 1 -- note\n; DROP TABLE tickets")[0] is False
+    assert sql_agent.validate_sql("SELECT 1 -- note ; DROP TABLE tickets")[0] is True
+
+    # Literals keep their case and whitespace
+    sql_agent.validate_sql("SELECT id FROM tickets WHERE subject = 'A  b'")
+    misses = sql_agent.validation_cache_info()['misses']
+    sql_agent.validate_sql("select id from tickets where subject = 'a b'")
+    assert sql_agent.validation_cache_info()['misses'] == misses + 1
+
+def test_validation_memo_keeps_lookalike_whitespace_apart():
+    sql_agent = SQLAgent()
+    fresh_agent = SQLAgent(validation_cache_size=0)
+    # "# " starts a comment, "#\t" doesn't: the second query has a second statement
+    queries = ["SELECT 1 # ; DROP TABLE x", "SELECT 1 #\t; DROP TABLE x"]
+    for query in queries + queries[::-1]:
+        assert sql_agent.validate_sql(query) == fresh_agent.validate_sql(query)
+    assert sql_agent.validate_sql(queries[1]) == (False, "Multiple statements are not allowed")
+
+# Whitespace, comments, literals and keyword case the lexer is sensitive to, for the random
+# respellings compared by test_normalized_queries_keep_their_verdict
+RESPELL_FRAGMENTS = [
+    "Select", "fRoM", "GO", "go", "GO 2", "$A$", "$a$", "x$A$", "e'\\''", "'\\'", "#\t", "# ", "# +", "--+x\n",
+    "/*+ h */", "[a b]", "`Q`", "'A'", "\"A\"", "pg_Catalog.PG_class", "E", "union all", "END IF", "BEGIN", "a#"
+]
+
+def test_normalized_queries_keep_their_verdict():
+    rng = random.Random(20240612)
+    fragments = FUZZ_FRAGMENTS + RESPELL_FRAGMENTS
+    for _ in range(5000):
+        query = "".join(
+            rng.choice(fragments) + rng.choice(["", " ", "\t", "\n", "  ", "\r", "\r\n"])
+            for _ in range(rng.randint(1, 12))
+        )
+        assert validate_sql(normalize_sql(query)) == validate_sql(query), query
+
+    for test_case in load_test_cases('sql_validation_tests.csv'):
+        query = test_case['query']
+        assert normalize_sql(respell(query).strip()) == normalize_sql(query)
+
+    assert normalize_sql("SELECT  Id\tFROM T WHERE s = E'\\'A' -- Note\n") == "select id from t where s = E'\\'A' -- Note\n"
+
+def test_validation_memo_is_bounded():
+    sql_agent = SQLAgent(validation_cache_size=2)
+    for i in range(5):
+        sql_agent.validate_sql(f"SELECT {i}")
+    assert sql_agent.validation_cache_info()['size'] == 2
+
+def test_large_queries_are_validated_in_one_pass():
+    sql_agent = SQLAgent(validation_cache_size=0)
+    in_list = ", ".join(str(100000 + i) for i in range(15000))
+    query = f"SELECT t.id, t.subject FROM tickets t JOIN ticket_statuses s ON s.id = t.status_id WHERE t.id IN ({in_list});"
+
+    assert len(query) > 100 * 1024
+    assert sql_agent.validate_sql(query) == (True, None)
+    assert sql_agent.extract_tables(query) == {"tickets", "ticket_statuses"}
+
+    is_valid, error = sql_agent.validate_sql(query[:-1] + " AND EXISTS (SELECT 1 FROM pg_catalog.pg_roles);")
+    assert is_valid is False
+    assert error == "Access to schema 'PG_CATALOG' is not allowed"
+
+def test_backslashes_only_escape_quotes_in_e_strings():
+    # With standard_conforming_strings on, a backslash is just a character in '...' and "..."
+    assert validate_sql("SELECT 'a\\'; DELETE FROM tickets; SELECT 'b'") == (False, "Multiple statements are not allowed")
+    assert validate_sql('SELECT "a\\"; DELETE FROM tickets; SELECT "b"') == (False, "Multiple statements are not allowed")
+    assert validate_sql("SELECT 'a\\' FROM tickets") == (True, None)
+
+    # E'...' literals do escape quotes, in either case of the prefix
+    assert validate_sql("SELECT E'a\\'; DELETE FROM tickets; SELECT b'") == (True, None)
+    assert validate_sql("SELECT e'\\\\'; DELETE FROM tickets") == (False, "Multiple statements are not allowed")
+    assert validate_sql("SELECT name'\\'; DELETE FROM tickets") == (False, "Multiple statements are not allowed")
+
+# Pieces the random queries compared with the sqlparse baseline are made of: keywords the
+# validator looks for, literals and comments that may hide them, and stray punctuation
+FUZZ_FRAGMENTS = [
+    "SELECT", "WITH", "AS", "id", "FROM", "tickets", "t", ",", "(", ")", ";", "WHERE", "=", "1", "*", "ORDER BY",
+    "LIMIT", "JOIN", "ON", "ONLY", "LATERAL", "INTO", "UNION", "INSERT", "DELETE", "DROP", "SET", "COPY", "EXPLAIN",
+    "pg_catalog.pg_class", "information_schema.tables", "pg_stat_activity", "'a;b'", "E'\\''", "'\\'", "\"x\"", "'", "\"",
+    "$$x$$", "$1", "::int", "--c\n", "/* c */", "#", "\t", "\n"
+]
+
+# The lexer replaced the sqlparse validator (kept in tests/legacy_validator.py). On random
+# queries it may only differ from it in three ways, all accepted:
+# - it rejects a query the baseline accepted (it reads FROM/JOIN targets the baseline's regexes miss)
+# - it accepts a malformed SELECT the baseline rejected because sqlparse couldn't tell the statement
+#   type ("UNKNOWN", e.g. "SELECT ::int"); such queries have no other statement type and the
+#   database rejects them
+# - it ends a '...' literal at a quote after a backslash, where sqlparse reads an escaped quote
+def test_divergences_from_the_sqlparse_baseline():
+    rng = random.Random(20240611)
+    compared = 0
+    for _ in range(3000):
+        query = " ".join(rng.choice(FUZZ_FRAGMENTS) for _ in range(rng.randint(1, 10)))
+        if rng.random() < 0.5:
+            query = "SELECT " + query
+        try:
+            expected = legacy_validate_sql(query)
+        except sqlparse.exceptions.SQLParseError:
+            continue
+        compared += 1
+        is_valid, _ = validate_sql(query)
+        if is_valid and not expected[0] and "\\'" not in query:
+            statements = [s for s in sqlparse.parse(query) if s.tokens and not s.is_whitespace]
+            assert expected[1] == "Only SELECT queries are allowed", (query, expected)
+            assert [s.get_type() for s in statements] == ["UNKNOWN"], query
+    assert compared > 2500
+
+    assert legacy_validate_sql("SELECT ::int")[0] is False
+    assert validate_sql("SELECT ::int") == (True, None)
 
 if __name__ == "__main__":
-    test_sql_validator()
\ No newline at end of file
+    test_sql_validator()
+    test_validation_memo_matches_fresh_validation()
+    test_validation_memo_keeps_lookalike_whitespace_apart()
+    test_normalized_queries_keep_their_verdict()
+    test_validation_memo_is_bounded()
+    test_large_queries_are_validated_in_one_pass()
+    test_backslashes_only_escape_quotes_in_e_strings()
+    test_divergences_from_the_sqlparse_baseline()
\ No newline at end of file
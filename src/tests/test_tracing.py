@@ -0,0 +1,63 @@
+import asyncio
+import os
+import re
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from tracing import Trace, current_trace, span, start_trace
+
+def test_spans_are_recorded_in_the_current_trace():
+    async def handle_request():
+        trace = start_trace(request_id="req-1", trace_id="Root=1-abc")
+        with span("validation"):
+            pass
+        # Spans of concurrent tasks land in the trace of the request that started them
+        async def query():
+            with span("database"):
+                await asyncio.sleep(0.01)
+        await asyncio.gather(query(), query())
+        return trace
+
+    trace = asyncio.run(handle_request())
+    assert [s.name for s in trace.spans] == ["validation", "database", "database"]
+    assert trace.durations()["database"] >= 0.02
+
+    timings = trace.timings()
+    assert timings["request_id"] == "req-1" and timings["trace_id"] == "Root=1-abc"
+    assert [s["name"] for s in timings["spans"]] == ["validation", "database", "database"]
+    assert timings["spans"][1]["start_ms"] >= timings["spans"][0]["start_ms"]
+
+def test_server_timing_header():
+    trace = Trace(request_id="req-2")
+    trace.cold_start = 0.25
+    with_trace = current_trace.set(trace)
+    try:
+        with span("database"):
+            time.sleep(0.002)
+        with span("serialization"):
+            pass
+    finally:
+        current_trace.reset(with_trace)
+
+    headers = trace.headers()
+    assert headers["X-Request-Id"] == "req-2"
+    assert re.fullmatch(
+        r'database;dur=\d+\.\d\d, serialization;dur=\d+\.\d\d, init;dur=250\.00;desc="cold start", total;dur=\d+\.\d\d',
+        headers["Server-Timing"]
+    ), headers["Server-Timing"]
+
+def test_span_without_trace():
+    assert current_trace.get() is None
+    with span("validation"):
+        pass
+    assert Trace().request_id != Trace().request_id
+
+if __name__ == "__main__":
+    test_spans_are_recorded_in_the_current_trace()
+    test_server_timing_header()
+    test_span_without_trace()
+    print("All tracing tests passed.")
@@ -0,0 +1,95 @@
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+# Time the module was loaded, the first trace of the process reports the time since then as the
+# cold start (imports and client setup before the first request)
+PROCESS_STARTED = time.perf_counter()
+_cold_start_pending = True
+
+# A finished span of a trace: its name, start offset from the trace start and duration, in seconds
+class Span:
+    __slots__ = ("name", "start", "duration")
+
+    def __init__(self, name: str, start: float, duration: float):
+        self.name = name
+        self.start = start
+        self.duration = duration
+
+# Timings of one request: the spans recorded while it is handled, identified by the request ID
+# (returned to the client) and the trace ID of the caller (e.g. the X-Ray trace of API Gateway)
+class Trace:
+    __slots__ = ("request_id", "trace_id", "started", "cold_start", "spans")
+
+    def __init__(self, request_id: Optional[str] = None, trace_id: Optional[str] = None):
+        global _cold_start_pending
+        self.request_id = request_id or uuid.uuid4().hex
+        self.trace_id = trace_id
+        self.started = time.perf_counter()
+        self.cold_start = None
+        if _cold_start_pending:
+            _cold_start_pending = False
+            self.cold_start = self.started - PROCESS_STARTED
+        self.spans: List[Span] = []
+
+    # Seconds since the trace started
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    # Returns the total duration of the spans per name, in the order the names first appeared
+    def durations(self) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration
+        return totals
+
+    # Returns the Server-Timing header value: the duration of each kind of span, the cold start
+    # (first request of the process only) and the total time so far, in milliseconds
+    def server_timing(self) -> str:
+        entries = [f"{name};dur={duration * 1000:.2f}" for name, duration in self.durations().items()]
+        if self.cold_start is not None:
+            entries.append(f'init;dur={self.cold_start * 1000:.2f};desc="cold start"')
+        entries.append(f"total;dur={self.elapsed() * 1000:.2f}")
+        return ", ".join(entries)
+
+    # Returns the timings block of a response: every span with its start offset and duration
+    def timings(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "trace_id": self.trace_id,
+            "cold_start_ms": round(self.cold_start * 1000, 3) if self.cold_start is not None else None,
+            "elapsed_ms": round(self.elapsed() * 1000, 3),
+            "spans": [
+                {"name": span.name, "start_ms": round(span.start * 1000, 3), "duration_ms": round(span.duration * 1000, 3)}
+                for span in self.spans
+            ]
+        }
+
+    # Returns the response headers carrying the request ID and the timings
+    def headers(self) -> Dict[str, str]:
+        return {"X-Request-Id": self.request_id, "Server-Timing": self.server_timing()}
+
+# Trace of the request being handled (None outside of a traced request)
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+# Starts the trace of a request in the current context and returns it
+def start_trace(request_id: Optional[str] = None, trace_id: Optional[str] = None) -> Trace:
+    trace = Trace(request_id, trace_id)
+    current_trace.set(trace)
+    return trace
+
+# Records the with block as a span of the current trace (does nothing outside of a traced request)
+@contextmanager
+def span(name: str):
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        trace.spans.append(Span(name, start - trace.started, end - start))